@@ -1,5 +1,6 @@
 from .auth import router as auth_router
 from .game import router as game_router
 from .room import router as room_router
+from .stats import router as stats_router
 
-__all__ = ["auth_router", "game_router", "room_router"]
+__all__ = ["auth_router", "game_router", "room_router", "stats_router"]
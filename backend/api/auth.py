@@ -2,11 +2,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import Optional
 from datetime import datetime, timedelta
+import hashlib
 import os
+import time
 from jose import JWTError, jwt
 
 from models.user import UserCreate, User, UserUpdate
-from services.auth_service import UserService
+from services.auth_service import UserService, PasswordHasherBusy, token_cache
 
 router = APIRouter()
 
@@ -17,31 +19,56 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def password_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"},
+    )
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def authenticate_token(token: str) -> Optional[User]:
+    """
+    Resolve a bearer token to its user, or None if it is invalid.
+    Verified tokens are cached by digest until they expire, so repeat requests
+    and reconnect storms skip both the signature check and the user lookup.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    user = token_cache.get(digest)
+    if user is not None:
+        return user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
 
-    user = await UserService.get_user_by_email(email)
+    user = await UserService.resolve_user(email)
     if user is None:
-        raise credentials_exception
+        return None
+
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        token_cache.set(digest, user, ttl=expires_at - time.time())
+    return user
 
-    return User(**user.model_dump(exclude={"hashed_password"}))
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    user = await authenticate_token(token)
+    if user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
 
 @router.post("/register")
 async def register(user: UserCreate):
@@ -51,11 +78,17 @@ async def register(user: UserCreate):
         return {"access_token": access_token, "token_type": "bearer"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PasswordHasherBusy:
+        raise password_busy_exception()
 
 @router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await UserService.get_user_by_email(form_data.username)
-    if not user or not UserService.verify_password(form_data.password, user.hashed_password):
+    try:
+        password_ok = user is not None and await UserService.verify_password(form_data.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise password_busy_exception()
+    if not password_ok:
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password",
@@ -74,7 +107,10 @@ async def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user)
 ):
-    updated_user = await UserService.update_user(current_user.id, user_update)
+    try:
+        updated_user = await UserService.update_user(current_user.id, user_update)
+    except PasswordHasherBusy:
+        raise password_busy_exception()
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
     return User(**updated_user.model_dump(exclude={"hashed_password"}))
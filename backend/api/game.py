@@ -1,29 +1,41 @@
 from typing import List, Optional
 from models.game import Game
-from services.game_service import GameService
-from fastapi import APIRouter, HTTPException
+from core.etag import RenderedJSON
+from services.game_catalog import game_catalog
+from fastapi import APIRouter, HTTPException, Request
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Bodies and ETags are rendered once per catalog snapshot, so these endpoints only
+# pick the right bytes, or answer 304 when the client already has them
+
+EMPTY_LIST = RenderedJSON.of([])
+
 @router.get("/games", response_model=List[Game])
-async def get_games(category: Optional[str] = None):
+async def get_games(request: Request, category: Optional[str] = None):
     logger.debug("Getting games with category: %s", category)
-    return await GameService.get_games(category)
+    catalog = await game_catalog.get()
+    if category:
+        rendered = catalog.games_by_category_body.get(category, EMPTY_LIST)
+    else:
+        rendered = catalog.games_body
+    return rendered.respond(request)
 
 @router.get("/games/{game_id}", response_model=Game)
-async def get_game(game_id: str):
+async def get_game(request: Request, game_id: str):
     logger.debug("Getting game with ID: %s", game_id)
-    game = await GameService.get_game(game_id)
-    if not game:
+    catalog = await game_catalog.get()
+    rendered = catalog.game_bodies.get(game_id)
+    if rendered is None:
         logger.warning("Game not found: %s", game_id)
         raise HTTPException(status_code=404, detail="Game not found")
-    return game
+    return rendered.respond(request)
 
 @router.get("/categories", response_model=List[str])
-async def get_categories():
+async def get_categories(request: Request):
     logger.debug("Getting game categories")
-    return await GameService.get_categories()
-
+    catalog = await game_catalog.get()
+    return catalog.categories_body.respond(request)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Header
-from api.auth import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Header, Request, Response
+from api.auth import get_current_user, authenticate_token
+from core.etag import make_etag, etag_matches, not_modified
 from services.game_service import GameService
 from models.room import Room, RoomCreate
 from services.room_service import RoomService
+from services.chat_service import ChatService
+from api.ws_commands import RoomSession, handle_message, hello_frame, receive_message
+from services.presence_service import presence_tracker
+from models.chat import ChatPage
 from models.user import User
-from core.websocket import manager
-from datetime import datetime
+from core.websocket import manager, ROOM_SNAPSHOT
+from core.serialization import MSGPACK_SUBPROTOCOL, negotiate_subprotocol
 from typing import List, Optional
 import logging
 
@@ -13,6 +18,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Rooms are per-user data that change often: cache privately, always revalidate
+ROOM_CACHE_CONTROL = "private, no-cache"
+
 @router.post("/rooms", response_model=Room)
 async def create_room(
     room_data: RoomCreate,
@@ -38,13 +46,24 @@ async def create_room(
 @router.get("/rooms/{room_code}", response_model=Room)
 async def get_room(
     room_code: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
     try:
         logger.info("Getting room %s for user %s", room_code, current_user.id)
+        # Revalidations are answered from the room version alone, before loading and enriching the room
+        if request.headers.get("if-none-match"):
+            version = await RoomService.get_room_version(room_code)
+            if version is not None:
+                etag = make_etag("room", *version)
+                if etag_matches(request, etag):
+                    return not_modified(etag, ROOM_CACHE_CONTROL)
         room = await RoomService.get_room(room_code)
         if not room:
             raise HTTPException(status_code=404, detail="Room not found")
+        response.headers["ETag"] = make_etag("room", room.id, room.version)
+        response.headers["Cache-Control"] = ROOM_CACHE_CONTROL
         return room
     except Exception as e:
         logger.error("Error getting room: %s", str(e))
@@ -59,14 +78,6 @@ async def join_room(
         logger.info("👤 User %s (%s) attempting to join room %s", current_user.id, current_user.nickname, room_code)
         room = await RoomService.join_room(room_code, current_user)
         logger.info("✅ Join successful. Room now has %s players", len(room.players))
-        
-        # Broadcast room update to all connected clients
-        await manager.broadcast(room_code, {
-            "type": "room_update",
-            "room": room.model_dump(),
-            "timestamp": datetime.now().isoformat()
-        })
-        
         return room
     except ValueError as e:
         logger.error("❌ Join failed: %s", str(e))
@@ -95,14 +106,6 @@ async def leave_room(
     try:
         logger.info("👋 User %s leaving room %s", current_user.id, room_code)
         room = await RoomService.leave_room(room_code, current_user)
-        
-        # Broadcast room update to all connected clients
-        await manager.broadcast(room_code, {
-            "type": "room_update",
-            "room": room.model_dump(),
-            "timestamp": datetime.now().isoformat()
-        })
-            
         return room
     except ValueError as e:
         logger.error("❌ Validation error in leave_room: %s", str(e))
@@ -120,25 +123,11 @@ async def start_game(
         logger.info("Starting game in room %s", room_code)
         room = await RoomService.start_game(room_code, current_user)
         
-        # Get the game state which contains player roles
+        # The service has already broadcast game_started to the room
         game_state = room.game_state
         if not game_state or 'players' not in game_state:
             raise ValueError("Game state not properly initialized")
             
-        # Create a mapping of user_id to their role info
-        role_mapping = {
-            player['user_id']: player['role_info']
-            for player in game_state['players']
-        }
-        
-        # Broadcast game started event with full game state to all players
-        await manager.broadcast(room_code, {
-            "type": "game_started",
-            "game_type": room.game_type,
-            "room_code": room.code,
-            "game_state": game_state
-        })
-            
         return room
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -146,11 +135,23 @@ async def start_game(
         logger.error("❌ Error in start_game endpoint: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_token_from_query(websocket: WebSocket) -> Optional[str]:
-    token = websocket.query_params.get("token")
-    if not token:
-        raise HTTPException(status_code=403, detail="No token provided")
-    return token
+@router.get("/rooms/{room_code}/chat", response_model=ChatPage)
+async def get_chat_history(
+    room_code: str,
+    before: Optional[str] = None,
+    limit: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Chat messages of a room, newest page first; follow next_cursor for older pages"""
+    room = await RoomService.get_room(room_code, enrich=False)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not any(p.user_id == str(current_user.id) for p in room.players):
+        raise HTTPException(status_code=403, detail="User not in room")
+    try:
+        return await ChatService.get_history(room_code, before, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.websocket("/ws/{room_id}")
 async def websocket_endpoint(
@@ -159,24 +160,23 @@ async def websocket_endpoint(
 ):
     logger.info("WebSocket connection attempt for room: %s", room_id)
     try:
-        # Accept the connection first
-        await websocket.accept()
-        logger.debug("WebSocket connection accepted for room: %s", room_id)
+        # Authenticate before accepting, so bad tokens are refused during the handshake
+        token = websocket.query_params.get("token")
+        user = await authenticate_token(token) if token else None
+        if not user:
+            logger.warning("Invalid or missing token, refusing connection")
+            await websocket.close(code=4003)
+            return
+
+        websocket.user_id = str(user.id)
+        logger.info("WebSocket authenticated for user: %s", user.nickname)
+
+        # Clients that offer the MessagePack subprotocol get binary frames, everyone else JSON
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        logger.debug("WebSocket connection accepted for room: %s (%s)", room_id, subprotocol or "json")
         
         try:
-            # Get token from query params
-            token = await get_token_from_query(websocket)
-            
-            # Validate token and get user
-            user = await get_current_user(token)
-            if not user:
-                logger.warning("Invalid token, closing connection")
-                await websocket.close(code=4002)
-                return
-                
-            websocket.user_id = str(user.id)
-            logger.info("WebSocket authenticated for user: %s", user.nickname)
-            
             # Get room to validate it exists
             room = await RoomService.get_room(room_id)
             if not room:
@@ -184,30 +184,38 @@ async def websocket_endpoint(
                 await websocket.close(code=4004)
                 return
                 
+            session = RoomSession(
+                websocket, room_id, user,
+                is_member=any(p.user_id == websocket.user_id for p in room.players)
+            )
+
             # Add to manager's connections
-            await manager.connect(websocket, room_id)
+            await manager.connect(websocket, room_id, websocket.user_id, binary=subprotocol == MSGPACK_SUBPROTOCOL)
             
             # Send initial state
-            await websocket.send_json({
-                "type": "room_update",
-                "room": room.model_dump(),
-                "timestamp": datetime.now().isoformat()
-            })
+            await session.send(hello_frame())
+            await session.send(RoomService.room_update_frame(room), ROOM_SNAPSHOT)
+            await session.send(presence_tracker.presence_frame(room_id, presence_tracker.snapshot(room_id)))
+            if room.room_state == "in_game":
+                # Rejoining a running game: the room only carries the public state
+                view = await RoomService.get_player_view(room_id, websocket.user_id)
+                if view:
+                    await session.send(RoomService.role_assigned_frame(room_id, websocket.user_id, view))
             
             try:
                 while True:
-                    data = await websocket.receive_text()
+                    data = await receive_message(websocket)
                     logger.debug("Received message: %s", data)
+                    manager.touch(websocket)
+                    await handle_message(session, data)
                     
             except WebSocketDisconnect:
                 logger.info("WebSocket disconnected for room: %s", room_id)
                 manager.disconnect(websocket, room_id)
                 
-        except HTTPException as e:
-            logger.error("HTTP error in WebSocket: %s", str(e))
-            await websocket.close(code=4003)
         except Exception as e:
             logger.error("Error in WebSocket connection: %s", str(e))
+            manager.disconnect(websocket, room_id)
             await websocket.close(code=4000)
             
     except Exception as e:
@@ -225,29 +233,8 @@ async def restart_game(
 ):
     try:
         logger.info("🔄 Attempting to restart game for room: %s", room_code)
-        room = await RoomService.restart_game(room_code, current_user)
-        
-        # Broadcast game ended event to all players
-        await manager.broadcast(
-            room_code,
-            {
-                "type": "game_ended",
-                "event": "restart",
-                "room_code": room.code
-            }
-        )
-        
-        # Broadcast room update
-        await manager.broadcast(
-            room_code,
-            {
-                "type": "room_update",
-                "room": room.model_dump(),
-                "timestamp": datetime.now().isoformat()
-            }
-        )
-            
-        return room
+        # The service broadcasts game_ended and the reset room
+        return await RoomService.restart_game(room_code, current_user)
     except ValueError as e:
         logger.error("❌ Validation error in restart_game: %s", str(e))
         raise HTTPException(status_code=400, detail=str(e))
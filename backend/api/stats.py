@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+from api.auth import get_current_user
+from core.websocket import manager
+from core.ws_protocol import compression_stats
+from models.user import User
+from services.room_code_allocator import room_code_allocator
+from services.live_room_store import live_rooms
+from services.game_catalog import game_catalog
+from services.chat_service import chat_writer, chat_rate_limiter
+from services.presence_service import presence_tracker
+from services.auth_service import user_cache, token_cache, password_hasher
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats(current_user: User = Depends(get_current_user)):
+    """Runtime counters of this worker's caches and connections"""
+    return {
+        "connections": manager.stats(),
+        "compression": compression_stats(),
+        "user_cache": user_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "room_codes": room_code_allocator.stats(),
+        "live_rooms": live_rooms.stats(),
+        "game_catalog": game_catalog.stats(),
+        "presence": presence_tracker.stats(),
+        "chat": {**chat_writer.stats(), "rate_limited": chat_rate_limiter.limited},
+    }
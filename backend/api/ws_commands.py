@@ -0,0 +1,181 @@
+"""
+Commands clients send over the room WebSocket, so lobby actions reuse the
+socket's connect-time authentication instead of an HTTP request each.
+
+Client -> server:  {"type": "<command>", "id": "<request id>", ...arguments}
+Server -> client:  {"type": "ack", "id": ..., "command": ..., ...result}
+               or  {"type": "error", "id": ..., "command": ..., "code": ..., "detail": ...}
+
+Clients also answer the server's {"type": "ping"} heartbeats with {"type": "pong"},
+which gets no ack.
+
+When the last player leaves, the room is deleted and its sockets are dropped
+before the command returns, so that "leave" is answered by the room_deleted
+broadcast instead of an ack.
+
+A client may send "v" with every message; messages for any other protocol
+version are refused. The server announces its version in a hello frame on connect.
+
+Messages are JSON text frames, or MessagePack binary frames in both directions
+on sockets that negotiated the "buzz.msgpack" subprotocol.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from fastapi import WebSocket, WebSocketDisconnect
+from core.serialization import decode_message, encode_frame
+from core.websocket import manager, CRITICAL, ROOM_SNAPSHOT
+from models.user import User
+from services.room_service import RoomService
+from services.chat_service import ChatService, ChatRateLimited
+from services.mafia_engine import MafiaEngine
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+
+
+class CommandError(Exception):
+    """A command failed in a way the client can act on; becomes an error frame"""
+
+    def __init__(self, code: str, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+class RoomSession:
+    """One authenticated socket in a room, and who is behind it"""
+
+    def __init__(self, websocket: WebSocket, room_id: str, user: User, is_member: bool):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.user = user
+        self.user_id = str(user.id)
+        self.is_member = is_member
+
+    async def send(self, message: Any, kind: str = CRITICAL):
+        # Through the socket's send queue, so replies stay in order with broadcasts
+        manager.send(self.websocket, message, kind)
+
+    async def require_member(self):
+        if not self.is_member:
+            # Joined over HTTP after this socket connected?
+            room = await RoomService.get_room(self.room_id, enrich=False)
+            self.is_member = bool(room) and any(p.user_id == self.user_id for p in room.players)
+        if not self.is_member:
+            raise CommandError("not_member", "User not in room")
+
+
+Command = Callable[[RoomSession, dict], Awaitable[Optional[dict]]]
+
+
+async def _ready(session: RoomSession, message: dict) -> dict:
+    room = await RoomService.toggle_ready(session.room_id, session.user)
+    return {"version": room.version}
+
+
+async def _leave(session: RoomSession, message: dict) -> dict:
+    room = await RoomService.leave_room(session.room_id, session.user)
+    session.is_member = False
+    return {"version": room.version}
+
+
+async def _start(session: RoomSession, message: dict) -> dict:
+    room = await RoomService.start_game(session.room_id, session.user)
+    return {"version": room.version}
+
+
+async def _restart(session: RoomSession, message: dict) -> dict:
+    room = await RoomService.restart_game(session.room_id, session.user)
+    return {"version": room.version}
+
+
+async def _chat(session: RoomSession, message: dict) -> dict:
+    await session.require_member()
+    chat_message = await ChatService.post_message(session.room_id, session.user, message.get("text"))
+    return {"message_id": chat_message.id}
+
+
+async def _vote(session: RoomSession, message: dict) -> dict:
+    """Mafia: vote to eliminate a player during the day"""
+    await session.require_member()
+    return await MafiaEngine.act(session.room_id, session.user, "day", message.get("target"))
+
+
+async def _night_action(session: RoomSession, message: dict) -> dict:
+    """Mafia: the acting roles' night move (kill, protect or investigate, depending on the role)"""
+    await session.require_member()
+    return await MafiaEngine.act(session.room_id, session.user, "night", message.get("target"))
+
+
+async def _sync(session: RoomSession, message: dict) -> Optional[dict]:
+    """Resend the full room, e.g. after the client missed a room_patch version"""
+    room = await RoomService.get_room(session.room_id)
+    if not room:
+        raise CommandError("not_found", "Room not found")
+    await session.send(RoomService.room_update_frame(room), ROOM_SNAPSHOT)
+    return {"version": room.version}
+
+
+COMMANDS: Dict[str, Command] = {
+    "ready": _ready,
+    "leave": _leave,
+    "start": _start,
+    "restart": _restart,
+    "chat": _chat,
+    "vote": _vote,
+    "night_action": _night_action,
+    "sync": _sync,
+}
+
+
+def hello_frame() -> str:
+    return encode_frame({"type": "hello", "protocol": PROTOCOL_VERSION, "commands": list(COMMANDS)})
+
+
+async def receive_message(websocket: WebSocket) -> Union[str, bytes]:
+    """Wait for the next text or binary message on a socket"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    text = message.get("text")
+    return text if text is not None else message.get("bytes", b"")
+
+
+async def handle_message(session: RoomSession, data: Union[str, bytes]):
+    """Run one client message and answer it with an ack or an error frame"""
+    request_id, command = None, None
+    try:
+        try:
+            message = decode_message(data)
+        except ValueError as e:
+            raise CommandError("bad_request", str(e))
+        if not isinstance(message, dict):
+            raise CommandError("bad_request", "Message must be an object")
+
+        request_id, command = message.get("id"), message.get("type")
+        if command == "pong":
+            # Heartbeat reply: receiving it already counted as activity, nothing to answer
+            return
+        if message.get("v", PROTOCOL_VERSION) != PROTOCOL_VERSION:
+            raise CommandError("unsupported_version", f"Server speaks protocol version {PROTOCOL_VERSION}")
+        handler = COMMANDS.get(command)
+        if handler is None:
+            raise CommandError("unknown_command", f"Unknown command: {command}")
+
+        try:
+            result = await handler(session, message)
+        except ChatRateLimited as e:
+            raise CommandError("rate_limited", str(e))
+        except ValueError as e:
+            # The same validation errors the HTTP endpoints answer with 400
+            raise CommandError("invalid", str(e))
+        await session.send({"type": "ack", "id": request_id, "command": command, **(result or {})})
+
+    except CommandError as e:
+        await session.send({"type": "error", "id": request_id, "command": command, "code": e.code, "detail": e.detail})
+    except Exception as e:
+        logger.error("Error handling %s command in room %s: %s", command, session.room_id, str(e))
+        await session.send({
+            "type": "error", "id": request_id, "command": command, "code": "internal", "detail": "Internal server error"
+        })
@@ -0,0 +1,296 @@
+from typing import Awaitable, Callable, Dict, Optional, Set
+from datetime import datetime
+from core.config import settings
+import asyncio
+import fcntl
+import logging
+import os
+import struct
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Called with (channel, payload) for every message published by another worker
+Handler = Callable[[str, bytes], Awaitable[None]]
+
+
+class Backplane:
+    """
+    Carries messages published on one worker to the subscribers on every other worker.
+    Publishers deliver to their own local sockets directly; the backplane only
+    handles the cross-process hop, and only for channels this worker subscribed to.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, payload: bytes):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str):
+        self.handlers.pop(channel, None)
+
+    async def _dispatch(self, channel: str, payload: bytes):
+        handler = self.handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            await handler(channel, payload)
+        except Exception as e:
+            logger.error("Error handling backplane message on %s: %s", channel, str(e))
+
+
+class MemoryBackplane(Backplane):
+    """Single-process backplane: every subscriber is local, so there is nothing to forward"""
+
+    async def publish(self, channel: str, payload: bytes):
+        pass
+
+
+# Unix socket wire format: op (1 byte), channel length, payload length, channel, payload
+_HEADER = struct.Struct("!cII")
+_SUBSCRIBE = b"S"
+_UNSUBSCRIBE = b"U"
+_PUBLISH = b"P"
+
+
+async def _read_message(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_HEADER.size)
+    op, channel_len, payload_len = _HEADER.unpack(header)
+    channel = (await reader.readexactly(channel_len)).decode()
+    payload = await reader.readexactly(payload_len) if payload_len else b""
+    return op, channel, payload
+
+
+def _pack_message(op: bytes, channel: str, payload: bytes = b"") -> bytes:
+    channel_bytes = channel.encode()
+    return _HEADER.pack(op, len(channel_bytes), len(payload)) + channel_bytes + payload
+
+
+class UnixSocketBroker:
+    """Tiny fan-out broker listening on a Unix socket, hosted by one of the workers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.clients: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        logger.info("Backplane broker listening on %s", self.path)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in tuple(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels: Set[str] = set()
+        self.clients.add(writer)
+        try:
+            while True:
+                op, channel, payload = await _read_message(reader)
+                if op == _SUBSCRIBE:
+                    self.subscribers.setdefault(channel, set()).add(writer)
+                    channels.add(channel)
+                elif op == _UNSUBSCRIBE:
+                    self._remove(channel, writer)
+                    channels.discard(channel)
+                elif op == _PUBLISH:
+                    message = _pack_message(_PUBLISH, channel, payload)
+                    for subscriber in tuple(self.subscribers.get(channel, ())):
+                        if subscriber is not writer:
+                            subscriber.write(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for channel in channels:
+                self._remove(channel, writer)
+            self.clients.discard(writer)
+            writer.close()
+
+    def _remove(self, channel: str, writer: asyncio.StreamWriter):
+        subscribers = self.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscribers[channel]
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Backplane for workers on the same host. The first worker to take the lock
+    file hosts the broker; the others connect to it, and take over if it goes away.
+    """
+
+    def __init__(self, path: str, retry_seconds: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.broker: Optional[UnixSocketBroker] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _try_host_broker(self) -> bool:
+        """Take the broker lock without blocking; only the lock holder may bind the socket"""
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self.broker is None and self._try_host_broker():
+                    self.broker = UnixSocketBroker(self.path)
+                    await self.broker.start()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionError) as e:
+                logger.debug("Backplane broker not reachable yet: %s", str(e))
+                await asyncio.sleep(self.retry_seconds)
+                continue
+
+            self.writer = writer
+            for channel in self.handlers:
+                writer.write(_pack_message(_SUBSCRIBE, channel))
+            logger.info("Connected to backplane broker at %s", self.path)
+            try:
+                while True:
+                    op, channel, payload = await _read_message(reader)
+                    if op == _PUBLISH:
+                        await self._dispatch(channel, payload)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("Lost connection to backplane broker, reconnecting")
+            finally:
+                self.writer = None
+                writer.close()
+            await asyncio.sleep(self.retry_seconds)
+
+    def _send(self, message: bytes):
+        if self.writer is not None:
+            self.writer.write(message)
+
+    async def publish(self, channel: str, payload: bytes):
+        self._send(_pack_message(_PUBLISH, channel, payload))
+
+    async def subscribe(self, channel: str, handler: Handler):
+        if channel not in self.handlers:
+            self._send(_pack_message(_SUBSCRIBE, channel))
+        await super().subscribe(channel, handler)
+
+    async def unsubscribe(self, channel: str):
+        if channel in self.handlers:
+            self._send(_pack_message(_UNSUBSCRIBE, channel))
+        await super().unsubscribe(channel)
+
+
+class MongoChangeStreamBackplane(Backplane):
+    """
+    Backplane for workers spread over several hosts, using a change stream on a
+    short-lived events collection (expired by a TTL index, see core.migrations).
+    Requires MongoDB to run as a replica set.
+    """
+
+    def __init__(self, collection_name: str = "room_events", retry_seconds: float = 2.0):
+        super().__init__()
+        self.collection_name = collection_name
+        self.retry_seconds = retry_seconds
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        from core.mongodb import mongodb
+        return mongodb.db[self.collection_name]
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "fullDocument.origin": {"$ne": self.origin}
+        }}]
+        while True:
+            try:
+                async with self.collection.watch(pipeline) as stream:
+                    logger.info("Watching %s change stream for backplane messages", self.collection_name)
+                    async for change in stream:
+                        event = change["fullDocument"]
+                        # Rooms without local sockets are filtered here rather than in the
+                        # pipeline, since subscriptions change far more often than streams
+                        if event["channel"] in self.handlers:
+                            await self._dispatch(event["channel"], bytes(event["payload"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Backplane change stream failed: %s", str(e))
+                await asyncio.sleep(self.retry_seconds)
+
+    async def publish(self, channel: str, payload: bytes):
+        await self.collection.insert_one({
+            "channel": channel,
+            "payload": payload,
+            "origin": self.origin,
+            "created_at": datetime.utcnow()
+        })
+
+
+def create_backplane(kind: Optional[str] = None) -> Backplane:
+    """Build the backplane selected by BROADCAST_BACKPLANE"""
+    kind = kind or settings.BROADCAST_BACKPLANE
+    if kind == "memory":
+        return MemoryBackplane()
+    if kind == "unix":
+        return UnixSocketBackplane(settings.BACKPLANE_SOCKET_PATH)
+    if kind == "mongo":
+        return MongoChangeStreamBackplane()
+    raise ValueError(f"Unknown broadcast backplane: {kind}")
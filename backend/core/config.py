@@ -8,6 +8,15 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Password hashing Settings
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    
+    # User cache Settings
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    TOKEN_CACHE_SIZE: int = 10000
+    
     # MongoDB Settings
     MONGODB_URL: str = os.getenv("MONGODB_URL")
     MONGODB_DB: str = os.getenv("MONGODB_DB")
@@ -15,6 +24,43 @@ class Settings(BaseSettings):
     # API Settings
     API_URL: str = os.getenv("API_URL", "http://localhost:8000")
     
+    # Game Catalog Settings
+    GAME_CATALOG_REFRESH_SECONDS: float = 300.0  # catalog reload interval when change streams are unavailable
+    
+    # Room Settings
+    ROOM_CODE_MAX_FILL_RATIO: float = 0.5  # switch to longer codes above this share in use
+    LIVE_ROOMS_ENABLED: bool = False  # keep active rooms in memory, see services/live_room_store.py
+    ROOM_FLUSH_INTERVAL_SECONDS: float = 0.5
+    LIVE_ROOM_IDLE_SECONDS: float = 600.0
+    ROOM_SNAPSHOT_CACHE_SIZE: int = 10000  # last broadcast room state, used to build room_patch diffs
+    
+    # Chat Settings
+    CHAT_MESSAGE_MAX_LENGTH: int = 500
+    CHAT_RATE_LIMIT_MESSAGES: int = 5  # burst of messages a user may send per room...
+    CHAT_RATE_LIMIT_SECONDS: float = 5.0  # ...refilled over this many seconds
+    CHAT_RETENTION_SECONDS: int = 86400  # chat_messages TTL, applied by migration v2 (collMod to change it later)
+    CHAT_FLUSH_INTERVAL_SECONDS: float = 0.5  # how long a message may wait for its batched insert
+    CHAT_FLUSH_BATCH_SIZE: int = 500  # insert early once this many messages are waiting
+    CHAT_HISTORY_PAGE_SIZE: int = 50
+    
+    # WebSocket Settings
+    WS_SEND_TIMEOUT_SECONDS: float = 2.0  # a socket whose writer cannot send one frame in this long is evicted
+    WS_SEND_QUEUE_SIZE: int = 64  # frames queued per socket before the overflow policy applies
+    WS_SEND_OVERFLOW_POLICY: str = "drop"  # "drop": shed superseded/droppable frames first; "disconnect": close at once
+    BROADCAST_COALESCE_SECONDS: float = 0.02  # merge room updates queued within this window; 0 = one loop tick
+    BROADCAST_BACKPLANE: str = "memory"  # "memory", "unix" or "mongo"
+    BACKPLANE_SOCKET_PATH: str = "/tmp/buzz-backplane.sock"
+    WS_PING_INTERVAL_SECONDS: float = 15.0  # server pings every socket this often; clients answer with pong
+    WS_IDLE_TIMEOUT_SECONDS: float = 45.0  # close sockets that sent nothing (not even a pong) for this long
+    WS_DEFLATE_LEVEL: int = 6  # zlib level for permessage-deflate (needs the core.ws_protocol protocol)
+    WS_DEFLATE_MEM_LEVEL: int = 5  # zlib memLevel: compression state memory per socket, 1-9
+    WS_DEFLATE_WINDOW_BITS: int = 12  # LZ77 window of 2^N bytes, 9-15, for both directions
+    WS_DEFLATE_CONTEXT_TAKEOVER: bool = False  # per-socket window (smaller frames) vs compress each broadcast once
+    
+    # Presence Settings
+    PRESENCE_GRACE_SECONDS: float = 30.0  # how long a disconnected player stays "away" before leaving the lobby
+    PRESENCE_BROADCAST_INTERVAL_SECONDS: float = 1.0  # presence changes are batched into one frame per room this often
+    
     # CORS Settings
     CORS_ORIGINS: list[str] = [
         "http://localhost:3000",
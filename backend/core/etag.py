@@ -0,0 +1,54 @@
+from typing import Any, Optional
+from dataclasses import dataclass
+from fastapi import Request, Response
+from core.serialization import dumps
+import hashlib
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the parts that identify a representation, e.g. (room id, version)"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag from the bytes of a representation"""
+    return make_etag(hashlib.sha256(body).hexdigest()[:32])
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match names this ETag (weak comparison, RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
+
+
+@dataclass(frozen=True)
+class RenderedJSON:
+    """A JSON response body encoded once, with its ETag"""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, data: Any) -> "RenderedJSON":
+        body = dumps(data).encode()
+        return cls(body=body, etag=content_etag(body))
+
+    def respond(self, request: Request, cache_control: str = "no-cache") -> Response:
+        """304 if the client already holds this body, otherwise the body itself"""
+        if etag_matches(request, self.etag):
+            return not_modified(self.etag, cache_control)
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers={"ETag": self.etag, "Cache-Control": cache_control}
+        )
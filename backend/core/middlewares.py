@@ -23,6 +23,7 @@ class StaticFilesCORSMiddleware(BaseHTTPMiddleware):
                 "Access-Control-Expose-Headers": "Content-Length, Content-Range",
                 "Cross-Origin-Resource-Policy": "cross-origin",
                 "Cross-Origin-Opener-Policy": "same-origin",
-                "Cache-Control": "public, max-age=3600"
             })
+            # Keep the caching policy chosen by the static files app (immutable for hashed assets)
+            response.headers.setdefault("Cache-Control", "public, max-age=3600")
         return response 
\ No newline at end of file
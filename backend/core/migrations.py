@@ -0,0 +1,138 @@
+from typing import Awaitable, Callable, List, Tuple
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from core.mongodb import mongodb
+from core.config import settings
+import asyncio
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_STATE_ID = "schema"
+LOCK_TIMEOUT = timedelta(minutes=5)
+# How often the lock holder refreshes locked_at, well within LOCK_TIMEOUT
+LOCK_HEARTBEAT_SECONDS = 30.0
+
+
+class MigrationLockLost(Exception):
+    """Raised when another worker took over the migration lock while this one held it"""
+
+
+async def _v1_initial_indexes(db):
+    await db.rooms.create_index([("code", ASCENDING)], unique=True, name="code_unique")
+    await db.rooms.create_index([("players.user_id", ASCENDING)], name="players_user_id")
+    await db.users.create_index([("email", ASCENDING)], unique=True, name="email_unique")
+    await db.games.create_index([("category", ASCENDING)], name="category")
+    await db.room_events.create_index([("created_at", ASCENDING)], expireAfterSeconds=60, name="created_at_ttl")
+
+
+async def _v2_chat_messages(db):
+    await db.chat_messages.create_index(
+        [("room_code", ASCENDING), ("_id", DESCENDING)], name="room_code_id"
+    )
+    await db.chat_messages.create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=settings.CHAT_RETENTION_SECONDS, name="created_at_ttl"
+    )
+    # Chat used to be an (always empty) array embedded in every room
+    await db.rooms.update_many({"chat_history": {"$exists": True}}, {"$unset": {"chat_history": ""}})
+
+
+# Ordered list of (version, description, step). Steps must be idempotent:
+# a worker that dies halfway through leaves the version unchanged and the
+# next startup re-runs the step from the beginning.
+MIGRATIONS: List[Tuple[int, str, Callable[..., Awaitable[None]]]] = [
+    (1, "unique rooms.code and users.email, multikey players.user_id, games.category, room_events TTL",
+     _v1_initial_indexes),
+    (2, "chat_messages history index and TTL, drop rooms.chat_history", _v2_chat_messages),
+]
+
+
+async def _acquire_lock(db, owner: str) -> bool:
+    """Take the migration lock, or steal it if its holder went quiet for too long"""
+    now = datetime.utcnow()
+    try:
+        state = await db.migrations.find_one_and_update(
+            {"_id": MIGRATIONS_STATE_ID, "$or": [
+                {"locked_by": None},
+                {"locked_at": {"$lt": now - LOCK_TIMEOUT}}
+            ]},
+            {"$set": {"locked_by": owner, "locked_at": now}, "$setOnInsert": {"version": 0}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The state document exists and someone else holds the lock
+        return False
+    return state is not None and state.get("locked_by") == owner
+
+
+async def _renew_lock(db, owner: str) -> bool:
+    """Refresh locked_at so the lock does not look stale; False if it is no longer ours"""
+    result = await db.migrations.update_one(
+        {"_id": MIGRATIONS_STATE_ID, "locked_by": owner},
+        {"$set": {"locked_at": datetime.utcnow()}}
+    )
+    return result.matched_count == 1
+
+
+async def _heartbeat(db, owner: str, interval: float):
+    """Keep the lock fresh while steps run, however long a single step (e.g. an index build) takes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await _renew_lock(db, owner):
+                logger.error("Lost the migration lock to another worker")
+                return
+        except Exception as e:
+            logger.error("Error renewing the migration lock: %s", str(e))
+
+
+async def run_migrations(poll_seconds: float = 0.5):
+    """
+    Bring the database up to the latest schema version.
+    Safe to call from every worker at startup: one worker applies the pending
+    steps under a lock while the others wait for it to finish.
+    """
+    db = mongodb.db
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+    while True:
+        state = await db.migrations.find_one({"_id": MIGRATIONS_STATE_ID}) or {}
+        if state.get("version", 0) >= latest:
+            logger.info("Database schema is up to date at version %d", state.get("version", 0))
+            return
+        if await _acquire_lock(db, owner):
+            break
+        logger.info("Waiting for another worker to finish database migrations")
+        await asyncio.sleep(poll_seconds)
+
+    heartbeat = asyncio.create_task(_heartbeat(db, owner, LOCK_HEARTBEAT_SECONDS))
+    try:
+        state = await db.migrations.find_one({"_id": MIGRATIONS_STATE_ID})
+        current = state.get("version", 0)
+        pending = [m for m in MIGRATIONS if m[0] > current]
+        logger.info(
+            "Migrating database from version %d to %d: %s",
+            current, latest, "; ".join(f"v{version}: {description}" for version, description, _ in pending)
+        )
+        for version, description, step in pending:
+            await step(db)
+            # Only while the lock is still ours: a worker that took it over is applying the steps itself
+            now = datetime.utcnow()
+            result = await db.migrations.update_one(
+                {"_id": MIGRATIONS_STATE_ID, "locked_by": owner},
+                {"$set": {"version": version, "applied_at": now, "locked_at": now}}
+            )
+            if result.matched_count != 1:
+                raise MigrationLockLost(f"Another worker took over the migration lock during v{version}")
+            logger.info("Applied migration v%d: %s", version, description)
+    finally:
+        heartbeat.cancel()
+        await db.migrations.update_one(
+            {"_id": MIGRATIONS_STATE_ID, "locked_by": owner},
+            {"$set": {"locked_by": None, "locked_at": None}}
+        )
@@ -0,0 +1,52 @@
+from typing import Any, List
+
+
+def _escape(key: Any) -> str:
+    """Escape a key for use as a JSON Pointer reference token (RFC 6901)"""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[dict]:
+    """
+    Compute a JSON Patch (RFC 6902) that turns old into new, using only
+    add, remove and replace operations. Dicts and lists are walked so the
+    patch only carries the values that actually changed.
+    """
+    if type(old) is type(new) and old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[dict] = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        # Skip the unchanged head and tail, so removing one player mid-list is one op
+        start = 0
+        while start < len(old) and start < len(new) and old[start] == new[start]:
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+            old_end -= 1
+            new_end -= 1
+
+        ops = []
+        common = min(old_end, new_end) - start
+        for index in range(start, start + common):
+            ops.extend(diff(old[index], new[index], f"{path}/{index}"))
+        for index in range(start + common, new_end):
+            ops.append({"op": "add", "path": f"{path}/{index}", "value": new[index]})
+        # Remove from the back so earlier indices stay valid while applying
+        for index in range(old_end - 1, start + common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+        return ops
+
+    return [{"op": "replace", "path": path, "value": new}]
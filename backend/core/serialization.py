@@ -0,0 +1,106 @@
+from typing import Any, Iterable, Optional, Union
+from datetime import datetime, date
+from enum import Enum
+from uuid import UUID
+from bson.objectid import ObjectId
+from pydantic import BaseModel
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, stdlib json is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional, without it sockets only speak JSON
+    msgpack = None
+
+# A message as handed to the connection manager: either a dict still to be
+# encoded, or a frame that was already encoded once for every recipient.
+Frame = Union[dict, str, bytes]
+
+# WebSocket subprotocol a client offers to get MessagePack binary frames instead of JSON text
+MSGPACK_SUBPROTOCOL = "buzz.msgpack"
+
+
+def _default(obj: Any) -> Any:
+    """Encode the types our documents carry that JSON does not know about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(message: Any) -> str:
+    """Encode a message to JSON text"""
+    if orjson is not None:
+        return orjson.dumps(message, default=_default).decode()
+    return json.dumps(message, default=_default, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode JSON text"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_frame(message: Frame) -> str:
+    """Return the text frame for a message, encoding it only if it is not encoded yet"""
+    if isinstance(message, str):
+        return message
+    if isinstance(message, (bytes, bytearray)):
+        return bytes(message).decode()
+    return dumps(message)
+
+
+class EncodedFrame:
+    """
+    One frame as it goes out to every recipient: the JSON text, and the same
+    message as MessagePack, packed the first time a msgpack socket sends it.
+    Either encoding is produced at most once however many sockets get the frame.
+    """
+
+    __slots__ = ("text", "_packed")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._packed: Optional[bytes] = None
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(loads(self.text))
+        return self._packed
+
+
+def negotiate_subprotocol(offered: Iterable[str]) -> Optional[str]:
+    """Pick the subprotocol to accept from those a client offered, None for plain JSON"""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def decode_message(data: Union[str, bytes]) -> Any:
+    """Decode a client message: JSON in a text frame, MessagePack in a binary one"""
+    if isinstance(data, str):
+        try:
+            return loads(data)
+        except ValueError:
+            raise ValueError("Message is not valid JSON")
+    if msgpack is None:
+        raise ValueError("Binary messages are not supported")
+    try:
+        return msgpack.unpackb(data)
+    except Exception:
+        raise ValueError("Message is not valid MessagePack")
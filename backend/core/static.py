@@ -0,0 +1,137 @@
+from typing import Dict, List, Optional
+from pathlib import Path
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+import json
+import logging
+import mimetypes
+import os
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+# Fingerprinted copies written by scripts/build_static.py, served under /static/assets/
+ASSETS_PREFIX = "assets/"
+MANIFEST_PATH = STATIC_DIR / ASSETS_PREFIX / "manifest.json"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+# Content-Encoding -> file suffix, in order of preference
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class StaticManifest:
+    """
+    Maps source paths under static/ (e.g. "images/games/mafia.webp") to their
+    content-hashed copies, and records which precompressed variants and
+    resized image variants exist. Without a manifest (build step not run)
+    every path resolves to itself and has no variants.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, str] = {}
+        self.encodings: Dict[str, List[str]] = {}
+        self.variants: Dict[str, List[dict]] = {}
+        self.loaded = False
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            logger.warning("No static asset manifest at %s, serving unhashed files", self.path)
+            data = {}
+        self.files = data.get("files", {})
+        self.encodings = data.get("encodings", {})
+        self.variants = data.get("variants", {})
+        self.loaded = True
+
+    def resolve(self, path: str) -> str:
+        """Hashed path for a source path relative to static/, or the path itself if it was not fingerprinted"""
+        if not self.loaded:
+            self.load()
+        return self.files.get(path, path)
+
+    def encodings_for(self, path: str) -> List[str]:
+        if not self.loaded:
+            self.load()
+        return self.encodings.get(path, [])
+
+    def variants_for(self, path: str) -> List[dict]:
+        if not self.loaded:
+            self.load()
+        return self.variants.get(path, [])
+
+
+static_manifest = StaticManifest(MANIFEST_PATH)
+
+
+def asset_path(path: str) -> str:
+    """Resolve a /static/... URL path to its fingerprinted /static/assets/... path"""
+    if not path.startswith("/static/"):
+        return path
+    return "/static/" + static_manifest.resolve(path[len("/static/"):])
+
+
+def asset_variants(path: str) -> List[dict]:
+    """Resized copies of a /static/... image as {"path", "width", "type"} dicts, smallest first"""
+    if not path.startswith("/static/"):
+        return []
+    return [
+        {**variant, "path": "/static/" + variant["path"]}
+        for variant in static_manifest.variants_for(path[len("/static/"):])
+    ]
+
+
+class HashedStaticFiles(StaticFiles):
+    """
+    StaticFiles that marks fingerprinted assets as immutable and serves their
+    precompressed variants to clients that accept them. Range and conditional
+    requests are handled by Starlette's FileResponse as usual.
+    """
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        hashed = relative.startswith(ASSETS_PREFIX)
+        request_headers = Headers(scope=scope)
+
+        encodings = static_manifest.encodings_for(relative) if hashed else []
+
+        response = None
+        if encodings and "range" not in request_headers:
+            response = self._precompressed_response(full_path, encodings, request_headers, status_code)
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if hashed else DEFAULT_CACHE_CONTROL
+        if encodings:
+            response.headers["Vary"] = "Accept-Encoding"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _precompressed_response(
+        self, full_path: os.PathLike, encodings: List[str], request_headers: Headers, status_code: int
+    ) -> Optional[Response]:
+        accepted = {part.split(";")[0].strip() for part in request_headers.get("accept-encoding", "").split(",")}
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            if encoding in encodings and encoding in accepted:
+                variant = str(full_path) + suffix
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    stat_result=os.stat(variant),
+                    media_type=mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+                )
+                response.headers["Content-Encoding"] = encoding
+                return response
+        return None
@@ -1,53 +1,674 @@
-from typing import Dict, Set
+from typing import Any, Callable, Deque, Dict, Set, Optional, Tuple, List, Union
+from collections import deque
+from dataclasses import dataclass
 from fastapi import WebSocket
-from collections import defaultdict
+from core.config import settings
+from core.serialization import EncodedFrame, Frame, encode_frame
+from core.backplane import Backplane, MemoryBackplane
+import asyncio
 import logging
+import sys
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
-class ConnectionManager:
+
+@dataclass
+class BroadcastStats:
+    """Outcome of a single fan-out to the sockets of a room"""
+    sent: int = 0  # sockets the frame was queued for
+    failed: int = 0  # sockets closed because their queue overflowed
+    slowest: float = 0.0  # seconds the slowest of those sockets has taken over a single send
+
+
+# How a frame may be treated when a socket's outbound queue is full
+CRITICAL = "critical"  # never dropped: game_started, role_assigned, acks, chat, ...
+DROPPABLE = "droppable"  # may be dropped outright, e.g. heartbeat pings
+ROOM_PATCH = "room_patch"  # may be dropped; the client notices the version gap and asks to sync
+ROOM_SNAPSHOT = "room_snapshot"  # a full room_update, superseding every room frame queued before it
+
+# Close code for sockets whose outbound queue overflowed
+WS_CLOSE_SLOW_CONSUMER = 4009
+
+
+@dataclass(frozen=True)
+class OutboundFrame:
+    """A message tagged with how it may be treated when a socket falls behind"""
+    message: Frame
+    kind: str = CRITICAL
+
+
+@dataclass
+class SendQueueStats:
+    dropped: int = 0  # frames shed from full queues
+    overflows: int = 0  # sockets closed because nothing could be shed
+    failed: int = 0  # sockets closed because a write failed or timed out
+    slowest: float = 0.0  # seconds spent on the slowest successful send
+
+
+class Connection:
+    """
+    The outbound side of one socket: a bounded queue of encoded frames drained
+    by a writer task, so producers queue a frame and return instead of waiting
+    on the network. A binary socket (one that negotiated MessagePack) is sent
+    each frame's packed encoding instead of its JSON text.
+
+    When the queue is full and `shed` is set, room frames superseded by a newer
+    full room_update go first, then the oldest droppable frame. Critical frames
+    are never shed; enqueue returns False when nothing could make room, and the
+    caller closes the socket.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        room_id: str,
+        user_id: str,
+        max_queue: int,
+        shed: bool,
+        send_timeout: float,
+        stats: SendQueueStats,
+        on_error: Callable[["Connection", Exception], None],
+        binary: bool = False
+    ):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.user_id = user_id
+        self.binary = binary
+        self.max_queue = max_queue
+        self.shed = shed
+        self.send_timeout = send_timeout
+        self.stats = stats
+        self.queue: Deque[Tuple[EncodedFrame, str]] = deque()
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.slowest = 0.0  # seconds spent on this socket's slowest successful send
+        self._on_error = on_error
+        self._draining = False
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, frame: EncodedFrame, kind: str = CRITICAL) -> bool:
+        """Queue a frame, returning False if the queue overflowed"""
+        self.queue.append((frame, kind))
+        if len(self.queue) > self.max_queue and not (self.shed and self._shed()):
+            return False
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._wakeup.set()
+        return True
+
+    def _shed(self) -> bool:
+        """Make room by dropping frames the client can do without, oldest first"""
+        kinds = [kind for _, kind in self.queue]
+        if ROOM_SNAPSHOT in kinds:
+            newest = len(kinds) - 1 - kinds[::-1].index(ROOM_SNAPSHOT)
+            superseded = {i for i in range(newest) if kinds[i] in (ROOM_PATCH, ROOM_SNAPSHOT)}
+            if superseded:
+                self.queue = deque(item for i, item in enumerate(self.queue) if i not in superseded)
+                self._count_dropped(len(superseded))
+                return True
+        for i, kind in enumerate(kinds):
+            if kind in (DROPPABLE, ROOM_PATCH):
+                del self.queue[i]
+                self._count_dropped(1)
+                return True
+        return False
+
+    def _count_dropped(self, count: int):
+        self.dropped += count
+        self.stats.dropped += count
+
+    async def _write_loop(self):
+        while True:
+            if not self.queue:
+                if self._draining:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            frame, _ = self.queue.popleft()
+            started = time.monotonic()
+            try:
+                if self.binary:
+                    send = self.websocket.send_bytes(frame.packed)
+                else:
+                    send = self.websocket.send_text(frame.text)
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+            except Exception as e:
+                self._on_error(self, e)
+                return
+            self.sent += 1
+            elapsed = time.monotonic() - started
+            if elapsed > self.slowest:
+                self.slowest = elapsed
+                self.stats.slowest = max(self.stats.slowest, elapsed)
+
+    def drain_and_close(self):
+        """Stop the writer once the frames already queued are sent"""
+        self._draining = True
+        self._wakeup.set()
+
+    def close(self):
+        """Stop the writer; frames still queued are discarded"""
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self.queue.clear()
+
+    def stats_entry(self) -> dict:
+        return {
+            "room": self.room_id,
+            "user": self.user_id,
+            "binary": self.binary,
+            "depth": len(self.queue),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "slowest_send_seconds": self.slowest
+        }
+
+
+class ConnectionRegistry:
+    """
+    Local sockets indexed as room -> user -> sockets, plus user -> rooms.
+    Empty entries are dropped as soon as their last socket leaves, so the
+    registry only ever holds rooms and users that are connected right now.
+    """
+
     def __init__(self):
-        self.connections: Dict[str, Set[WebSocket]] = defaultdict(set)
-        
-    async def connect(self, websocket: WebSocket, room_id: str):
-        if room_id not in self.connections:
-            self.connections[room_id] = set()
-        self.connections[room_id].add(websocket)
-        logger.debug("Added connection to room %s", room_id)
-    
-    def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.connections:
-            self.connections[room_id].discard(websocket)
-            logger.debug("Removed connection from room %s", room_id)
-    
-    async def broadcast(self, room_id: str, message: dict):
-        if room_id in self.connections:
-            disconnected = set()
-            for connection in self.connections[room_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error("Error broadcasting: %s", str(e))
-                    disconnected.add(connection)
-            
-            # Clean up disconnected clients
-            for connection in disconnected:
-                self.disconnect(connection, room_id)
-
-    async def send_to_user(self, room_id: str, user_id: str, message: dict):
-        """Send a message to a specific user in a room"""
-        if room_id in self.connections:
-            for websocket in self.connections[room_id]:
-                try:
-                    if getattr(websocket, "user_id", None) == user_id:
-                        await websocket.send_json(message)
-                        logger.debug("Sent message to user %s", user_id)
-                        return
-                except Exception as e:
-                    logger.error("Error sending to user: %s", str(e))
-                    self.connections[room_id].discard(websocket)
-
-        logger.error("⚠️ Could not send message to user %s in room %s", user_id, room_id)
+        self.rooms: Dict[str, Dict[str, Set[WebSocket]]] = {}
+        self.user_rooms: Dict[str, Set[str]] = {}
+        self.sockets: Dict[WebSocket, Tuple[str, str]] = {}
+
+    def add(self, websocket: WebSocket, room_id: str, user_id: str) -> bool:
+        """Register a socket, returning True if it is the room's first local socket"""
+        first_in_room = room_id not in self.rooms
+        self.rooms.setdefault(room_id, {}).setdefault(user_id, set()).add(websocket)
+        self.user_rooms.setdefault(user_id, set()).add(room_id)
+        self.sockets[websocket] = (room_id, user_id)
+        return first_in_room
+
+    def remove(self, websocket: WebSocket) -> Optional[str]:
+        """Unregister a socket, returning its room if that room has no local sockets left"""
+        entry = self.sockets.pop(websocket, None)
+        if entry is None:
+            return None
+        room_id, user_id = entry
+        users = self.rooms[room_id]
+        user_sockets = users[user_id]
+        user_sockets.discard(websocket)
+        if not user_sockets:
+            del users[user_id]
+            rooms = self.user_rooms[user_id]
+            rooms.discard(room_id)
+            if not rooms:
+                del self.user_rooms[user_id]
+        if not users:
+            del self.rooms[room_id]
+            return room_id
+        return None
+
+    def remove_room(self, room_id: str) -> List[WebSocket]:
+        """Forget every socket of a room, returning them"""
+        sockets = list(self.room_sockets(room_id))
+        for websocket in sockets:
+            self.remove(websocket)
+        return sockets
+
+    def room_sockets(self, room_id: str):
+        for user_sockets in self.rooms.get(room_id, {}).values():
+            yield from user_sockets
+
+    def user_sockets(self, room_id: str, user_id: str) -> Set[WebSocket]:
+        return self.rooms.get(room_id, {}).get(user_id, set())
+
+    def has_room(self, room_id: str) -> bool:
+        return room_id in self.rooms
+
+    def stats(self) -> dict:
+        """Connection counts and a rough estimate of the registry's own memory footprint"""
+        containers = [self.rooms, self.user_rooms, self.sockets]
+        containers.extend(self.rooms.values())
+        containers.extend(self.user_rooms.values())
+        for users in self.rooms.values():
+            containers.extend(users.values())
+        return {
+            "rooms": len(self.rooms),
+            "users": len(self.user_rooms),
+            "connections": len(self.sockets),
+            "registry_bytes": sum(sys.getsizeof(c) for c in containers)
+        }
+
+
+ROOM_CHANNEL_PREFIX = "room:"
+# Every worker announces here which users have sockets on it, in every room
+PRESENCE_CHANNEL = "presence"
+
+# Builds one message from every item queued for a key during a coalescing window,
+# or returns None when there is nothing worth sending (e.g. every change was already sent)
+FrameBuilder = Callable[[List[Any]], Optional[Union[Frame, OutboundFrame]]]
+
+# How many of the deepest send queues /stats lists
+DEEPEST_QUEUES_REPORTED = 10
+
+# Close code for sockets reaped after WS_IDLE_TIMEOUT_SECONDS without a message
+WS_CLOSE_IDLE = 4008
+
+# Called with (room_id, user_id, online, local) when a user's first socket in a
+# room connects (online=True) or their last one goes away (online=False), on any
+# worker; local is True when the socket was one of this worker's
+PresenceHandler = Callable[[str, str, bool, bool], None]
+
+
+@dataclass
+class CoalesceStats:
+    submitted: int = 0  # items queued with broadcast_coalesced
+    sent: int = 0  # frames actually broadcast for them
+    duplicates: int = 0  # windows whose builder found nothing new to send
+
+    @property
+    def saved(self) -> int:
+        return self.submitted - self.sent
+
+
+@dataclass
+class HeartbeatStats:
+    pings: int = 0  # ping frames sent
+    reaped: int = 0  # sockets closed for being idle
+    failed: int = 0  # sockets evicted because a ping could not be sent
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        send_timeout: Optional[float] = None,
+        backplane: Optional[Backplane] = None,
+        coalesce_window: Optional[float] = None,
+        ping_interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        overflow_policy: Optional[str] = None
+    ):
+        self.registry = ConnectionRegistry()
+        self.send_timeout = send_timeout if send_timeout is not None else settings.WS_SEND_TIMEOUT_SECONDS
+        self.backplane = backplane or MemoryBackplane()
+        self.coalesce_window = coalesce_window if coalesce_window is not None else settings.BROADCAST_COALESCE_SECONDS
+        self.coalesce_stats = CoalesceStats()
+        self._pending: Dict[str, Dict[str, Tuple[List[Any], FrameBuilder]]] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        self.ping_interval = ping_interval if ping_interval is not None else settings.WS_PING_INTERVAL_SECONDS
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.WS_IDLE_TIMEOUT_SECONDS
+        self.heartbeat_stats = HeartbeatStats()
+        self.last_seen: Dict[WebSocket, float] = {}  # monotonic time of each socket's last inbound message
+        self._presence_handlers: List[PresenceHandler] = []
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.queue_size = queue_size if queue_size is not None else settings.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or settings.WS_SEND_OVERFLOW_POLICY
+        if self.overflow_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown WS_SEND_OVERFLOW_POLICY: {self.overflow_policy}")
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.queue_stats = SendQueueStats()
+        self.worker_id = uuid.uuid4().hex
+        self.remote_users: Dict[Tuple[str, str], Set[str]] = {}  # (room, user) -> other workers with sockets for it
+
+    async def start(self, backplane: Optional[Backplane] = None):
+        """Start relaying broadcasts between workers through the given backplane"""
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.start()
+        await self.backplane.subscribe(PRESENCE_CHANNEL, self._on_presence_message)
+        if self.ping_interval > 0:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for room_id in list(self._pending):
+            await self.flush_room(room_id)
+        # The other workers must not keep counting our users as connected
+        for room_id, users in self.registry.rooms.items():
+            for user_id in users:
+                await self._publish_presence(room_id, user_id, False)
+        await self.backplane.stop()
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+    def add_presence_handler(self, handler: PresenceHandler):
+        self._presence_handlers.append(handler)
+
+    def _notify_presence(self, room_id: str, user_id: str, online: bool, local: bool = True):
+        for handler in self._presence_handlers:
+            try:
+                handler(room_id, user_id, online, local)
+            except Exception as e:
+                logger.error("Error in presence handler: %s", str(e))
+
+    def is_online(self, room_id: str, user_id: str) -> bool:
+        """Whether a user has a socket in a room on this or any other worker"""
+        return bool(self.registry.user_sockets(room_id, user_id)) or (room_id, user_id) in self.remote_users
+
+    def _local_presence_change(self, room_id: str, user_id: str, online: bool):
+        """A user's first local socket in a room connected, or their last one went away"""
+        asyncio.create_task(self._publish_presence(room_id, user_id, online))
+        if (room_id, user_id) not in self.remote_users:
+            self._notify_presence(room_id, user_id, online)
+
+    async def _publish_presence(self, room_id: str, user_id: str, online: bool):
+        payload = "\n".join((self.worker_id, room_id, user_id, "1" if online else "0")).encode()
+        try:
+            await self.backplane.publish(PRESENCE_CHANNEL, payload)
+        except Exception as e:
+            logger.error("Error publishing presence for room %s: %s", room_id, str(e))
+
+    async def _on_presence_message(self, channel: str, payload: bytes):
+        worker_id, room_id, user_id, online = payload.decode().split("\n")
+        if worker_id == self.worker_id:
+            return
+        key = (room_id, user_id)
+        was_online = self.is_online(room_id, user_id)
+        if online == "1":
+            self.remote_users.setdefault(key, set()).add(worker_id)
+        else:
+            workers = self.remote_users.get(key)
+            if workers is not None:
+                workers.discard(worker_id)
+                if not workers:
+                    del self.remote_users[key]
+        if was_online != self.is_online(room_id, user_id):
+            self._notify_presence(room_id, user_id, not was_online, local=False)
+
+    def touch(self, websocket: WebSocket):
+        """Record that a socket is alive; call for every message received on it"""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = time.monotonic()
+
+    async def connect(self, websocket: WebSocket, room_id: str, user_id: Optional[str] = None, binary: bool = False):
+        """Register a socket; binary sockets get MessagePack frames instead of JSON text"""
+        if user_id is None:
+            user_id = getattr(websocket, "user_id", "")
+        first_user_socket = not self.registry.user_sockets(room_id, user_id)
+        first_local_socket = self.registry.add(websocket, room_id, user_id)
+        self.connections[websocket] = Connection(
+            websocket, room_id, user_id,
+            max_queue=self.queue_size,
+            shed=self.overflow_policy == "drop",
+            send_timeout=self.send_timeout,
+            stats=self.queue_stats,
+            on_error=self._on_send_error,
+            binary=binary
+        )
+        self.last_seen[websocket] = time.monotonic()
+        logger.debug("Added connection for user %s to room %s", user_id, room_id)
+        if first_user_socket:
+            self._local_presence_change(room_id, user_id, True)
+        if first_local_socket:
+            # Only listen for rooms this worker actually has sockets for
+            await self.backplane.subscribe(ROOM_CHANNEL_PREFIX + room_id, self._on_backplane_message)
+
+    def disconnect(self, websocket: WebSocket, room_id: Optional[str] = None):
+        entry = self.registry.sockets.get(websocket)
+        emptied_room = self.registry.remove(websocket)
+        self.last_seen.pop(websocket, None)
+        connection = self.connections.pop(websocket, None)
+        if connection is not None:
+            connection.close()
+        logger.debug("Removed connection from room %s", room_id)
+        if entry is not None and not self.registry.user_sockets(*entry):
+            self._local_presence_change(*entry, False)
+        if emptied_room is not None:
+            asyncio.create_task(self._unsubscribe_if_empty(emptied_room))
+
+    def drop_room(self, room_id: str):
+        """
+        Forget a deleted room; its sockets get no further messages, but frames
+        already queued (such as room_deleted) are still delivered before their
+        writers stop
+        """
+        self._pending.pop(room_id, None)
+        task = self._flush_tasks.pop(room_id, None)
+        if task is not None:
+            task.cancel()
+        users = set(self.registry.rooms.get(room_id, {}))
+        sockets = self.registry.remove_room(room_id)
+        for websocket in sockets:
+            self.last_seen.pop(websocket, None)
+            connection = self.connections.pop(websocket, None)
+            if connection is not None:
+                connection.drain_and_close()
+        for user_id in users:
+            self._local_presence_change(room_id, user_id, False)
+        if sockets:
+            asyncio.create_task(self._unsubscribe_if_empty(room_id))
+
+    def stats(self) -> dict:
+        connections = list(self.connections.values())
+        deepest = sorted(connections, key=lambda c: len(c.queue), reverse=True)[:DEEPEST_QUEUES_REPORTED]
+        return {
+            **self.registry.stats(),
+            "remote_users": len(self.remote_users),
+            "send_queues": {
+                "max_frames": self.queue_size,
+                "overflow_policy": self.overflow_policy,
+                "queued": sum(len(c.queue) for c in connections),
+                "max_depth": max((c.max_depth for c in connections), default=0),
+                "dropped": self.queue_stats.dropped,
+                "overflow_disconnects": self.queue_stats.overflows,
+                "send_failures": self.queue_stats.failed,
+                "slowest_send_seconds": self.queue_stats.slowest,
+                "binary_connections": sum(1 for c in connections if c.binary),
+                "deepest": [c.stats_entry() for c in deepest if c.queue]
+            },
+            "coalescing": {
+                "window_seconds": self.coalesce_window,
+                "submitted": self.coalesce_stats.submitted,
+                "sent": self.coalesce_stats.sent,
+                "duplicates": self.coalesce_stats.duplicates,
+                "frames_saved": self.coalesce_stats.saved
+            },
+            "heartbeat": {
+                "ping_interval_seconds": self.ping_interval,
+                "idle_timeout_seconds": self.idle_timeout,
+                "pings": self.heartbeat_stats.pings,
+                "reaped": self.heartbeat_stats.reaped,
+                "failed": self.heartbeat_stats.failed
+            }
+        }
+
+    async def _unsubscribe_if_empty(self, room_id: str):
+        # A socket may have joined again between the disconnect and this task running
+        if not self.registry.has_room(room_id):
+            await self.backplane.unsubscribe(ROOM_CHANNEL_PREFIX + room_id)
+
+    async def _publish(self, room_id: str, frame: str, kind: str, user_id: Optional[str] = None):
+        """Forward a frame to the other workers; the envelope names the target user, if any, and the frame kind"""
+        payload = (user_id or "").encode() + b"\n" + kind.encode() + b"\n" + frame.encode()
+        try:
+            await self.backplane.publish(ROOM_CHANNEL_PREFIX + room_id, payload)
+        except Exception as e:
+            logger.error("Error publishing to backplane for room %s: %s", room_id, str(e))
+
+    async def _on_backplane_message(self, channel: str, payload: bytes):
+        room_id = channel[len(ROOM_CHANNEL_PREFIX):]
+        user_id, kind, frame = payload.split(b"\n", 2)
+        encoded = EncodedFrame(frame.decode())
+        if user_id:
+            self._send_local_user(room_id, user_id.decode(), encoded, kind.decode())
+        else:
+            self._fanout(room_id, encoded, kind.decode())
+
+    def _evict(self, websocket: WebSocket, room_id: str, code: int = 1011):
+        """Drop a socket from the room and close it without blocking the caller"""
+        self.disconnect(websocket, room_id)
+        asyncio.create_task(self._close_quietly(websocket, code))
+
+    async def _close_quietly(self, websocket: WebSocket, code: int = 1011):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def _on_send_error(self, connection: Connection, error: Exception):
+        if isinstance(error, asyncio.TimeoutError):
+            logger.warning("Evicting slow socket in room %s after %.2fs", connection.room_id, self.send_timeout)
+        else:
+            logger.error("Error sending to socket in room %s: %s", connection.room_id, str(error))
+        self.queue_stats.failed += 1
+        self._evict(connection.websocket, connection.room_id)
+
+    def _enqueue(self, connection: Connection, frame: EncodedFrame, kind: str) -> bool:
+        """Queue a frame for one socket, closing the socket if its queue overflowed"""
+        if connection.enqueue(frame, kind):
+            return True
+        logger.warning(
+            "Closing slow consumer in room %s: %d frames queued", connection.room_id, len(connection.queue)
+        )
+        self.queue_stats.overflows += 1
+        self._evict(connection.websocket, connection.room_id, WS_CLOSE_SLOW_CONSUMER)
+        return False
+
+    async def _heartbeat_loop(self):
+        frame = encode_frame({"type": "ping"})
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.heartbeat(frame)
+            except Exception as e:
+                logger.error("Error in WebSocket heartbeat: %s", str(e))
+
+    def heartbeat(self, frame: str):
+        """Close sockets that went quiet for longer than the idle timeout and ping the rest"""
+        ping = EncodedFrame(frame)
+        cutoff = time.monotonic() - self.idle_timeout
+        for websocket, (room_id, _) in list(self.registry.sockets.items()):
+            if self.last_seen.get(websocket, 0.0) < cutoff:
+                logger.info("Reaping idle socket in room %s", room_id)
+                self.heartbeat_stats.reaped += 1
+                self._evict(websocket, room_id, WS_CLOSE_IDLE)
+                continue
+            connection = self.connections.get(websocket)
+            if connection is not None and self._enqueue(connection, ping, DROPPABLE):
+                self.heartbeat_stats.pings += 1
+            else:
+                self.heartbeat_stats.failed += 1
+
+    def send(self, websocket: WebSocket, message: Frame, kind: str = CRITICAL) -> bool:
+        """Queue a message for one socket, behind everything already queued for it"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            logger.debug("Dropping message for a socket that is not connected")
+            return False
+        return self._enqueue(connection, EncodedFrame(encode_frame(message)), kind)
+
+    async def broadcast(self, room_id: str, message: Union[Frame, OutboundFrame], kind: str = CRITICAL) -> BroadcastStats:
+        """
+        Send a message to every socket in a room, on this worker and, through the
+        backplane, on every other worker. The message is encoded once and the same
+        frame is queued for every socket. Returns the stats for the local sockets.
+        """
+        # Coalesced updates queued before this message must not arrive after it
+        await self.flush_room(room_id)
+        if isinstance(message, OutboundFrame):
+            message, kind = message.message, message.kind
+        return await self._broadcast_frame(room_id, encode_frame(message), kind)
+
+    def broadcast_coalesced(self, room_id: str, key: str, item: Any, build: FrameBuilder):
+        """
+        Queue an item for a coalesced broadcast to a room. Items queued under the
+        same key within BROADCAST_COALESCE_SECONDS are turned into one message by
+        build, which runs once when the window closes and may return None when
+        the items hold nothing new (builders compare versions, since frames carry
+        timestamps and never repeat byte for byte).
+        """
+        pending = self._pending.setdefault(room_id, {})
+        items, _ = pending.get(key, ([], build))
+        items.append(item)
+        pending[key] = (items, build)
+        self.coalesce_stats.submitted += 1
+        if room_id not in self._flush_tasks:
+            self._flush_tasks[room_id] = asyncio.create_task(self._flush_later(room_id))
+
+    async def _flush_later(self, room_id: str):
+        await asyncio.sleep(self.coalesce_window)
+        self._flush_tasks.pop(room_id, None)
+        await self.flush_room(room_id)
+
+    async def flush_room(self, room_id: str):
+        """Send the coalesced messages queued for a room right away"""
+        pending = self._pending.pop(room_id, None)
+        if pending is None:
+            return
+        task = self._flush_tasks.pop(room_id, None)
+        if task is not None:
+            task.cancel()
+
+        for key, (items, build) in pending.items():
+            try:
+                message = build(items)
+            except Exception as e:
+                logger.error("Error building coalesced %s message for room %s: %s", key, room_id, str(e))
+                continue
+            if message is None:
+                self.coalesce_stats.duplicates += 1
+                continue
+            kind = CRITICAL
+            if isinstance(message, OutboundFrame):
+                message, kind = message.message, message.kind
+            frame = encode_frame(message)
+            self.coalesce_stats.sent += 1
+            await self._broadcast_frame(room_id, frame, kind)
+
+    async def _broadcast_frame(self, room_id: str, frame: str, kind: str) -> BroadcastStats:
+        stats = self._fanout(room_id, EncodedFrame(frame), kind)
+        await self._publish(room_id, frame, kind)
+        return stats
+
+    def _fanout(self, room_id: str, frame: EncodedFrame, kind: str) -> BroadcastStats:
+        """
+        Queue a frame for every local socket in a room. Nothing here waits on the
+        network: each socket's writer task sends at its own pace, and sockets
+        whose queue overflows are closed. All of them share the one EncodedFrame,
+        so each wire format is encoded once per broadcast.
+        """
+        stats = BroadcastStats()
+        for websocket in list(self.registry.room_sockets(room_id)):
+            connection = self.connections.get(websocket)
+            if connection is not None and self._enqueue(connection, frame, kind):
+                stats.sent += 1
+                stats.slowest = max(stats.slowest, connection.slowest)
+            else:
+                stats.failed += 1
+
+        logger.debug(
+            "Broadcast to room %s: sent=%d failed=%d slowest=%.3fs",
+            room_id, stats.sent, stats.failed, stats.slowest
+        )
+        return stats
+
+    def broadcast_local(self, room_id: str, message: Frame, kind: str = CRITICAL) -> BroadcastStats:
+        """Send a message to this worker's sockets in a room only, for state every worker keeps a copy of"""
+        return self._fanout(room_id, EncodedFrame(encode_frame(message)), kind)
+
+    async def send_to_user(self, room_id: str, user_id: str, message: Frame, kind: str = CRITICAL):
+        """Send a message to every socket of a user in a room, wherever those sockets live"""
+        await self.flush_room(room_id)
+        frame = encode_frame(message)
+        sent = self._send_local_user(room_id, user_id, EncodedFrame(frame), kind)
+        await self._publish(room_id, frame, kind, user_id)
+        if not sent and isinstance(self.backplane, MemoryBackplane):
+            logger.error("⚠️ Could not send message to user %s in room %s", user_id, room_id)
+
+    def _send_local_user(self, room_id: str, user_id: str, frame: EncodedFrame, kind: str) -> bool:
+        sent = False
+        targets = list(self.registry.user_sockets(room_id, user_id))
+        for websocket in targets:
+            connection = self.connections.get(websocket)
+            if connection is not None and self._enqueue(connection, frame, kind):
+                sent = True
+        logger.debug("Sent message to user %s on %d socket(s)", user_id, len(targets))
+        return sent
 
 # Global instance
-manager = ConnectionManager() 
+manager = ConnectionManager()
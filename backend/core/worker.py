@@ -0,0 +1,7 @@
+from uvicorn.workers import UvicornWorker
+
+
+class BuzzUvicornWorker(UvicornWorker):
+    """Gunicorn worker serving WebSockets through the tuned protocol in core.ws_protocol"""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "ws": "core.ws_protocol:BuzzWebSocketProtocol"}
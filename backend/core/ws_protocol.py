@@ -0,0 +1,89 @@
+"""
+uvicorn's sans-I/O websockets protocol with permessage-deflate tuned by the
+WS_DEFLATE_* settings. Select it when starting the server:
+
+    uvicorn main:app --ws core.ws_protocol:BuzzWebSocketProtocol
+
+or, under gunicorn, with the core.worker.BuzzUvicornWorker worker class.
+"""
+from typing import Any, List, Sequence, Tuple
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CONT, CTRL_OPCODES, Frame
+from core.cache import TTLCache
+from core.config import settings
+
+COMPRESSED_FRAME_CACHE_SIZE = 256
+COMPRESSED_FRAME_TTL_SECONDS = 10.0
+
+# (window bits, opcode, payload) -> compressed payload, shared by every socket of this worker
+compressed_frames = TTLCache(COMPRESSED_FRAME_CACHE_SIZE, COMPRESSED_FRAME_TTL_SECONDS)
+
+
+class SharedPerMessageDeflate(PerMessageDeflate):
+    """
+    Without server context takeover every message is compressed from scratch,
+    so its compressed form depends only on the payload: a broadcast frame is
+    compressed by the first socket that sends it and the rest reuse the bytes.
+    """
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES or frame.opcode is CONT or not frame.fin:
+            return super().encode(frame)
+        key = (self.local_max_window_bits, frame.opcode, bytes(frame.data))
+        data = compressed_frames.get(key)
+        if data is None:
+            encoded = super().encode(frame)
+            compressed_frames.set(key, bytes(encoded.data))
+            return encoded
+        return Frame(frame.opcode, data, frame.fin, True, frame.rsv2, frame.rsv3)
+
+
+class SharedPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    def process_request_params(
+        self,
+        params: Sequence[Tuple[str, Any]],
+        accepted_extensions: Sequence[Extension],
+    ) -> Tuple[List[Tuple[str, Any]], PerMessageDeflate]:
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        if extension.local_no_context_takeover:
+            extension = SharedPerMessageDeflate(
+                extension.remote_no_context_takeover,
+                extension.local_no_context_takeover,
+                extension.remote_max_window_bits,
+                extension.local_max_window_bits,
+                extension.compress_settings,
+            )
+        return response_params, extension
+
+
+def deflate_factory() -> ServerPerMessageDeflateFactory:
+    """
+    With context takeover each socket keeps its own compression window, so
+    text repeated across frames (role descriptions, image URLs) compresses
+    better, at the cost of compressing every frame once per socket. Without
+    it a frame is compressed once per worker.
+    """
+    return SharedPerMessageDeflateFactory(
+        server_no_context_takeover=not settings.WS_DEFLATE_CONTEXT_TAKEOVER,
+        server_max_window_bits=settings.WS_DEFLATE_WINDOW_BITS,
+        client_max_window_bits=settings.WS_DEFLATE_WINDOW_BITS,
+        compress_settings={"level": settings.WS_DEFLATE_LEVEL, "memLevel": settings.WS_DEFLATE_MEM_LEVEL},
+    )
+
+
+class BuzzWebSocketProtocol(WebSocketsSansIOProtocol):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.conn.available_extensions = [deflate_factory()]
+
+
+def compression_stats() -> dict:
+    return {
+        "context_takeover": settings.WS_DEFLATE_CONTEXT_TAKEOVER,
+        "level": settings.WS_DEFLATE_LEVEL,
+        "window_bits": settings.WS_DEFLATE_WINDOW_BITS,
+        "shared_frames": compressed_frames.stats()
+    }
@@ -1,10 +1,19 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from api import game_router, auth_router, room_router
+from api import game_router, auth_router, room_router, stats_router
 from core.config import settings
 from core.mongodb import mongodb
+from core.migrations import run_migrations
+from core.websocket import manager
+from core.backplane import create_backplane
+from services.auth_service import UserService, password_hasher
+from services.live_room_store import live_rooms
+from services.game_catalog import game_catalog
+from services.room_code_allocator import room_code_allocator
+from services.chat_service import chat_writer
+from services.presence_service import presence_tracker
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from core.static import HashedStaticFiles, STATIC_DIR
 from core.middlewares import StaticFilesCORSMiddleware
 from pathlib import Path
 
@@ -12,14 +21,29 @@ from pathlib import Path
 async def lifespan(app: FastAPI):
     # Startup
     await mongodb.connect_db()
+    await run_migrations()
+    await game_catalog.start()
+    await room_code_allocator.start()
+    await manager.start(create_backplane())
+    await presence_tracker.start()
+    await UserService.start_cache_invalidation()
+    await live_rooms.start()
+    await chat_writer.start()
     yield
     # Shutdown
+    await chat_writer.stop()
+    await presence_tracker.stop()
+    await live_rooms.stop()
+    await game_catalog.stop()
+    await room_code_allocator.stop()
+    await manager.stop()
+    password_hasher.shutdown()
     await mongodb.close_db()
 
 app = FastAPI(title="Buzz API", lifespan=lifespan)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files; fingerprinted copies under /static/assets are cached as immutable
+app.mount("/static", HashedStaticFiles(directory=STATIC_DIR), name="static")
 
 # General CORS middleware
 app.add_middleware(
@@ -35,3 +59,4 @@ app.add_middleware(
 app.include_router(game_router, tags=["games"])
 app.include_router(auth_router, tags=["auth"])
 app.include_router(room_router, tags=["room"])
+app.include_router(stats_router, tags=["stats"])
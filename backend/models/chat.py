@@ -0,0 +1,23 @@
+from typing import List, Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, field_validator
+
+
+class ChatMessage(BaseModel):
+    id: str  # ObjectId of the stored message; also the history cursor
+    room_code: str
+    user_id: str
+    nickname: str
+    text: str
+    created_at: datetime
+
+    @field_validator("created_at")
+    @classmethod
+    def as_utc(cls, value: datetime) -> datetime:
+        # Mongo hands back naive UTC datetimes
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class ChatPage(BaseModel):
+    messages: List[ChatMessage]  # oldest first
+    next_cursor: Optional[str] = None  # pass as ?before= to get the page of older messages
@@ -1,20 +1,31 @@
-from typing import Annotated, Dict, Optional, Any
+from typing import Annotated, Dict, List, Optional, Any
 from bson.objectid import ObjectId
-from pydantic import BaseModel, Field, BeforeValidator
+from pydantic import BaseModel, Field, BeforeValidator, model_validator
 from core.config import settings
-import os
+from core.static import asset_path, asset_variants
 
 ObjectIdStr = Annotated[str, BeforeValidator(lambda x: str(x) if isinstance(x, ObjectId) else x)]
 
 def get_full_url(path: str) -> str:
-    """Convert a relative path to a full API URL"""
+    """Convert a relative path to a full API URL, pointing static files at their fingerprinted copies"""
     if path.startswith('http'):
         return path
-    # Add version to static paths
-    if path.startswith('/static/'):
-        static_version = os.getenv("STATIC_VERSION", "1")
-        path = path.replace('/static/', f'/static/v{static_version}/')
-    return f"{settings.API_URL}{path}"
+    return f"{settings.API_URL}{asset_path(path)}"
+
+class ImageVariant(BaseModel):
+    """One srcset candidate: a resized copy of an image in a given format"""
+    url: str
+    width: int
+    type: str  # MIME type, e.g. image/avif
+
+def get_image_variants(path: Optional[str]) -> List[ImageVariant]:
+    """Resized copies of a static image, smallest first; empty if none were generated"""
+    if not path:
+        return []
+    return [
+        ImageVariant(url=f"{settings.API_URL}{variant['path']}", width=variant["width"], type=variant["type"])
+        for variant in asset_variants(path)
+    ]
 
 class GameBase(BaseModel):
     name: str
@@ -38,6 +49,22 @@ class Game(GameBase):
     featured: bool = False
     locations: Optional[Dict[str, str]] = None  # Map location names to their image paths
     settings: Dict[str, Any]
+    # srcset candidates for the images above, filled from the static asset manifest
+    thumbnail_variants: List[ImageVariant] = Field(default_factory=list)
+    image_variants: List[ImageVariant] = Field(default_factory=list)
+    location_variants: Optional[Dict[str, List[ImageVariant]]] = None
+
+    @model_validator(mode="after")
+    def add_image_variants(self):
+        if not self.thumbnail_variants:
+            self.thumbnail_variants = get_image_variants(self.thumbnail_url)
+        if not self.image_variants:
+            self.image_variants = get_image_variants(self.image_url)
+        if self.locations and self.location_variants is None:
+            self.location_variants = {
+                name: get_image_variants(path) for name, path in self.locations.items()
+            }
+        return self
 
     def model_dump(self, **kwargs):
         data = super().model_dump(**kwargs)
@@ -23,9 +23,9 @@ class Room(BaseModel):
     players: List[PlayerState]
     game_config: Dict[str, Any]
     host: str
-    chat_history: List[Dict[str, Any]]
     can_start: bool
     game_state: Optional[Dict[str, Any]] = None
+    version: int = 0  # bumped on every change, see room_patch messages
 
     class Config:
         populate_by_name = True
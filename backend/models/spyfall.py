@@ -1,6 +1,7 @@
 from enum import Enum
 from pydantic import BaseModel
 from typing import Optional, List
+from models.game import ImageVariant
 
 class SpyfallRole(str, Enum):
     SPY = "spy"
@@ -10,6 +11,7 @@ class SpyfallRoleInfo(BaseModel):
     role: SpyfallRole
     location: Optional[str] = None
     location_image: Optional[str] = None
+    location_image_variants: List[ImageVariant] = []  # srcset candidates for location_image
     description: str
 
 class SpyfallPlayer(BaseModel):
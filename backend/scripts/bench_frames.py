@@ -0,0 +1,161 @@
+"""
+Compare WebSocket frame encodings by size and CPU time.
+
+Builds the frames a Mafia room sends (the lobby room_update, game_started, the
+in-game room_update, a role_assigned, and all of them in the order one socket
+receives them) and encodes each as JSON and MessagePack, raw and with
+permessage-deflate at several levels and window sizes, with and without
+context takeover. Sizes are payload bytes per frame,
+without the 2-10 byte WebSocket header. CPU is the encoding time per frame;
+the "per broadcast" column multiplies it by the sockets that must run it: once
+per worker without context takeover (frames are compressed once and shared,
+see core.ws_protocol), once per socket with it.
+
+Run from the backend directory:
+
+    python scripts/bench_frames.py --players 10 --sockets 10
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+import zlib
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+# Nothing here talks to MongoDB, but importing the services needs the settings
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB", "buzz")
+
+from bson import ObjectId  # noqa: E402
+from core.serialization import loads, msgpack  # noqa: E402
+from models.room import PlayerState, Room  # noqa: E402
+from services.mafia_service import MafiaService  # noqa: E402
+from services.room_service import RoomService  # noqa: E402
+
+
+def mafia_frames(num_players: int) -> dict:
+    """Frame name -> the encoded frames one socket receives for it"""
+    players = [
+        PlayerState(
+            user_id=str(ObjectId()),
+            nickname=f"player{i}",
+            full_name=f"Player Number {i}",
+            email=f"player{i}@example.com",
+            state="ready"
+        )
+        for i in range(num_players)
+    ]
+    mafia = max(1, num_players // 4)
+    specials = 2 if num_players > 5 else 0
+    room = Room(
+        _id=ObjectId(),
+        code="1234",
+        game_type="mafia",
+        room_state="lobby",
+        num_players=num_players,
+        players=players,
+        game_config={"roles": {
+            "mafia": mafia,
+            "doctor": specials // 2,
+            "police": specials // 2,
+            "civilian": num_players - mafia - specials
+        }},
+        host=players[0].user_id,
+        can_start=True,
+        version=num_players + 1
+    )
+    mafia_players = MafiaService.assign_roles(room)
+    game_state = MafiaService.create_game_state(mafia_players)
+    user_id, view = next(iter(MafiaService.create_player_views(mafia_players).items()))
+    in_game = room.model_copy(update={"room_state": "in_game", "game_state": game_state, "version": room.version + 1})
+    frames = {
+        "room_update (lobby)": [RoomService.room_update_frame(room)],
+        "game_started": [RoomService.game_started_frame(in_game, game_state)],
+        "room_update (in game)": [RoomService.room_update_frame(in_game)],
+        "role_assigned": [RoomService.role_assigned_frame(room.code, user_id, view)],
+    }
+    # What one socket receives around a game start, where context takeover can pay off
+    frames["session (one socket)"] = [
+        frames["room_update (lobby)"][0],
+        frames["game_started"][0],
+        frames["room_update (in game)"][0],
+        frames["role_assigned"][0],
+    ]
+    return frames
+
+
+def deflate(level: int, window_bits: int, context_takeover: bool):
+    """Compress like permessage-deflate: raw deflate, sync flush, trailing 00 00 ff ff dropped"""
+    shared = zlib.compressobj(level, zlib.DEFLATED, -window_bits, 5)
+
+    def compress(data: bytes) -> bytes:
+        compressor = shared if context_takeover else zlib.compressobj(level, zlib.DEFLATED, -window_bits, 5)
+        return (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+    return compress
+
+
+def encoders(levels: list, window_bits: list) -> list:
+    """(name, serialize, compressor factory or None, shared across sockets)"""
+    serializers = [("json", lambda text: text.encode())]
+    if msgpack is not None:
+        serializers.append(("msgpack", lambda text: msgpack.packb(loads(text))))
+    result = []
+    for name, serialize in serializers:
+        result.append((name, serialize, None, True))
+        for bits in window_bits:
+            for level in levels:
+                for takeover in (False, True):
+                    label = f"{name}+deflate l{level} w{bits}{' ctx' if takeover else ''}"
+                    factory = lambda level=level, bits=bits, takeover=takeover: deflate(level, bits, takeover)
+                    result.append((label, serialize, factory, not takeover))
+    return result
+
+
+def measure(frames: list, serialize, factory, repeat: int) -> tuple:
+    """Average bytes and seconds per frame, sending the frames in order to one socket"""
+    size, elapsed = 0, 0.0
+    for _ in range(repeat):
+        compress = factory() if factory is not None else None
+        size = 0
+        started = time.process_time()
+        for text in frames:
+            data = serialize(text)
+            if compress is not None:
+                data = compress(data)
+            size += len(data)
+        elapsed += time.process_time() - started
+    count = len(frames)
+    return size / count, elapsed / (repeat * count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--sockets", type=int, default=10, help="sockets a broadcast goes to")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--levels", default="1,6,9")
+    parser.add_argument("--window-bits", default="12,15")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+    window_bits = [int(bits) for bits in args.window_bits.split(",")]
+    if msgpack is None:
+        print("msgpack is not installed, comparing JSON encodings only")
+
+    for frame_name, frames in mafia_frames(args.players).items():
+        raw = sum(len(text.encode()) for text in frames) / len(frames)
+        print(f"\n{frame_name}: {len(frames)} frame(s), {raw:.0f} bytes of JSON each")
+        print(f"  {'encoding':<32} {'bytes':>7} {'ratio':>6} {'us/frame':>9} {'us/broadcast':>13}")
+        for label, serialize, factory, shared in encoders(levels, window_bits):
+            size, seconds = measure(frames, serialize, factory, args.repeat)
+            per_broadcast = seconds * (1 if shared else args.sockets)
+            print(
+                f"  {label:<32} {size:>7.0f} {size / raw:>6.2f} "
+                f"{seconds * 1e6:>9.1f} {per_broadcast * 1e6:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Fingerprint static assets.
+
+Copies every file under static/images to static/assets/ with a content hash in
+its name (images/games/mafia.webp -> assets/images/games/mafia.3f9a1c0b2d4e.webp),
+writes gzip and, if the brotli package is installed, brotli variants where they
+are meaningfully smaller, and records it all in static/assets/manifest.json,
+which core.static resolves URLs through.
+
+With Pillow installed it also renders every raster image at several widths as
+WebP and, where Pillow supports it, AVIF (images/games/mafia.webp ->
+assets/images/games/mafia.640w.<hash>.avif, ...), listed in the manifest so
+the API can offer them as srcset candidates. Without Pillow that step is skipped.
+
+Run from the backend directory before starting the server:
+
+    python scripts/build_static.py
+
+With --if-changed it does nothing when the manifest is newer than every source
+file, so it can run on every container start.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import gzip
+import hashlib
+import io
+import json
+import shutil
+import sys
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from core.static import ASSETS_PREFIX, STATIC_DIR, MANIFEST_PATH  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+SOURCE_DIRS = ["images"]
+HASH_LENGTH = 12
+# Keep a compressed variant only if it saves at least this share of the bytes;
+# already-compressed formats (webp, jpg, png) never do
+MIN_COMPRESSION_SAVING = 0.1
+
+VARIANT_WIDTHS = [320, 640, 960, 1280]
+RASTER_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+# Pillow format name -> (file suffix, MIME type, encoder options)
+VARIANT_FORMATS = {
+    "AVIF": (".avif", "image/avif", {"quality": 50, "speed": 6}),
+    "WEBP": (".webp", "image/webp", {"quality": 75, "method": 4}),
+}
+
+
+def fingerprint(relative: Path, content: bytes) -> Path:
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return relative.with_name(f"{relative.stem}.{digest}{relative.suffix}")
+
+
+def write_compressed_variants(target: Path, content: bytes) -> list:
+    encodings = []
+    variants = [("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ("br", ".br", lambda data: brotli.compress(data, quality=11)))
+    for encoding, suffix, compress in variants:
+        compressed = compress(content)
+        if len(compressed) <= len(content) * (1 - MIN_COMPRESSION_SAVING):
+            target.with_name(target.name + suffix).write_bytes(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def variant_formats() -> dict:
+    if Image is None:
+        print("Pillow is not installed, skipping responsive image variants")
+        return {}
+    return {
+        name: spec for name, spec in VARIANT_FORMATS.items()
+        if name != "AVIF" or features.check("avif")
+    }
+
+
+def write_image_variants(source: Path, relative: Path, formats: dict) -> list:
+    """Render an image at each variant width no wider than the original, in every format"""
+    variants = []
+    with Image.open(source) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        widths = [width for width in VARIANT_WIDTHS if width < image.width] + [image.width]
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for name, (suffix, mime_type, options) in formats.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, name, **options)
+                content = buffer.getvalue()
+                hashed = Path(ASSETS_PREFIX) / fingerprint(relative.with_name(f"{relative.stem}.{width}w{suffix}"), content)
+                target = STATIC_DIR / hashed
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(content)
+                variants.append({"path": hashed.as_posix(), "width": width, "type": mime_type})
+    return variants
+
+
+def up_to_date() -> bool:
+    """Whether the manifest was written after the last change to any source file"""
+    if not MANIFEST_PATH.exists():
+        return False
+    built_at = MANIFEST_PATH.stat().st_mtime
+    return all(
+        source.stat().st_mtime < built_at
+        for source_dir in SOURCE_DIRS
+        for source in (STATIC_DIR / source_dir).rglob("*")
+    )
+
+
+def build() -> dict:
+    assets_dir = STATIC_DIR / ASSETS_PREFIX
+    if assets_dir.exists():
+        # Empty it rather than remove it: docker-compose mounts a volume there
+        for entry in assets_dir.iterdir():
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+
+    files, encodings, variants = {}, {}, {}
+    formats = variant_formats()
+    rasters = []
+    for source_dir in SOURCE_DIRS:
+        for source in sorted((STATIC_DIR / source_dir).rglob("*")):
+            if not source.is_file():
+                continue
+            relative = source.relative_to(STATIC_DIR)
+            content = source.read_bytes()
+            hashed = Path(ASSETS_PREFIX) / fingerprint(relative, content)
+            target = STATIC_DIR / hashed
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+
+            files[relative.as_posix()] = hashed.as_posix()
+            variant_encodings = write_compressed_variants(target, content)
+            if variant_encodings:
+                encodings[hashed.as_posix()] = variant_encodings
+            if formats and source.suffix.lower() in RASTER_SUFFIXES:
+                rasters.append((source, relative))
+
+    # Encoding dominates the build time, so spread the images over all cores
+    with ProcessPoolExecutor() as pool:
+        jobs = [pool.submit(write_image_variants, source, relative, formats) for source, relative in rasters]
+        for (_, relative), job in zip(rasters, jobs):
+            variants[relative.as_posix()] = job.result()
+
+    manifest = {"files": files, "encodings": encodings, "variants": variants}
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+if __name__ == "__main__":
+    if "--if-changed" in sys.argv[1:] and up_to_date():
+        print(f"Static assets in {MANIFEST_PATH.parent} are up to date")
+        sys.exit(0)
+    manifest = build()
+    print(
+        f"Fingerprinted {len(manifest['files'])} files into {MANIFEST_PATH.parent}, "
+        f"{sum(len(v) for v in manifest['variants'].values())} image variants"
+    )
@@ -1,26 +1,106 @@
-from typing import Optional
+from typing import Callable, Optional
 from uuid import UUID, uuid4
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
-from models.user import UserInDB, UserCreate, UserUpdate
+from models.user import User, UserInDB, UserCreate, UserUpdate
 from core.mongodb import mongodb
+from core.cache import TTLCache
+from core.config import settings
+from core.websocket import manager
+from services.room_service import RoomService
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Authenticated users by email, so resolving the caller does not hit Mongo on every request
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+USER_CACHE_CHANNEL = "cache:users"
+
+# Verified tokens by digest, each kept until the token's own expiry
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 pwd_context = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
     bcrypt__rounds=12
 )
 
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated thread pool so hashing never blocks the event loop.
+    At most `workers` hashes run at once and at most `max_queue` more wait;
+    anything beyond that is rejected with PasswordHasherBusy.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def run(self, func: Callable, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            return func(*args), started, time.perf_counter()
+
+        self.pending += 1
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        finally:
+            self.pending -= 1
+
+        queue_wait, hash_time = started - submitted, finished - started
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.queue_wait_total / self.completed if self.completed else 0.0,
+            "queue_wait_max": self.queue_wait_max,
+            "hash_time_avg": self.hash_time_total / self.completed if self.completed else 0.0,
+            "hash_time_max": self.hash_time_max
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+
 class UserService:
     @staticmethod
-    def hash_password(password: str) -> str:
-        return pwd_context.hash(password)
+    async def hash_password(password: str) -> str:
+        return await password_hasher.run(pwd_context.hash, password)
 
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
 
     @staticmethod
     async def get_user_by_email(email: str) -> Optional[UserInDB]:
@@ -30,6 +110,41 @@ class UserService:
             return UserInDB(**user_doc)
         return None
 
+    @staticmethod
+    async def resolve_user(email: str) -> Optional[User]:
+        """Get the public view of a user, served from the user cache when possible"""
+        user = user_cache.get(email)
+        if user is not None:
+            return user
+        user_db = await UserService.get_user_by_email(email)
+        if user_db is None:
+            return None
+        user = User(**user_db.model_dump(exclude={"hashed_password"}))
+        user_cache.set(email, user)
+        return user
+
+    @staticmethod
+    async def start_cache_invalidation():
+        """Listen for cache invalidations published by other workers"""
+        async def on_invalidate(channel: str, payload: bytes):
+            UserService._forget_user(payload.decode())
+
+        await manager.backplane.subscribe(USER_CACHE_CHANNEL, on_invalidate)
+
+    @staticmethod
+    def _forget_user(email: str):
+        user_cache.pop(email)
+        token_cache.discard_where(lambda digest, user: user.email == email)
+
+    @staticmethod
+    async def invalidate_user(email: str):
+        """Drop a user from the caches on this worker and, if there is a shared channel, on the others"""
+        UserService._forget_user(email)
+        try:
+            await manager.backplane.publish(USER_CACHE_CHANNEL, email.encode())
+        except Exception as e:
+            logger.error("Error publishing user cache invalidation: %s", str(e))
+
     @staticmethod
     async def create_user(user_create: UserCreate) -> UserInDB:
         # Check if email already exists
@@ -43,7 +158,7 @@ class UserService:
             email=user_create.email,
             full_name=user_create.full_name,
             nickname=user_create.nickname,
-            hashed_password=UserService.hash_password(user_create.password)
+            hashed_password=await UserService.hash_password(user_create.password)
         )
 
         # Store user data
@@ -63,7 +178,7 @@ class UserService:
         update_data = user_update.model_dump(exclude_unset=True)
 
         if "password" in update_data:
-            update_data["hashed_password"] = UserService.hash_password(update_data.pop("password"))
+            update_data["hashed_password"] = await UserService.hash_password(update_data.pop("password"))
 
         result = await mongodb.db.users.find_one_and_update(
             {"_id": str(user_id)},
@@ -73,5 +188,12 @@ class UserService:
 
         if result:
             result["id"] = result.pop("_id")
-            return UserInDB(**result)
+            updated_user = UserInDB(**result)
+            await UserService.invalidate_user(updated_user.email)
+
+            # Rooms return their stored player details without a users lookup, so keep them current
+            profile = {key: update_data[key] for key in ("nickname", "full_name") if key in update_data}
+            if profile:
+                await RoomService.update_player_profile(str(user_id), profile)
+            return updated_user
         return None
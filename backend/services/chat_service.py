@@ -0,0 +1,200 @@
+from typing import Dict, List, Optional
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+from core.mongodb import mongodb
+from core.cache import TTLCache
+from core.config import settings
+from core.serialization import encode_frame
+from core.websocket import manager
+from models.chat import ChatMessage, ChatPage
+from models.user import User
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class ChatRateLimited(Exception):
+    """Raised when a user sends chat messages faster than the rate limit allows"""
+
+
+class ChatRateLimiter:
+    """
+    Token bucket per (room, user): a user may send `burst` messages at once,
+    then one more every `period / burst` seconds. Buckets of users who went
+    quiet are forgotten once they would have refilled anyway.
+    """
+
+    def __init__(self, burst: int, period: float, maxsize: int = 100000):
+        self.burst = burst
+        self.rate = burst / period
+        self.buckets = TTLCache(maxsize, period)
+        self.limited = 0
+
+    def allow(self, room_code: str, user_id: str) -> bool:
+        key = (room_code, user_id)
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            self.buckets.set(key, (tokens, now))
+            self.limited += 1
+            return False
+        self.buckets.set(key, (tokens - 1, now))
+        return True
+
+
+class ChatWriter:
+    """
+    Buffers chat messages and stores them with one insert_many per batch, at
+    most `flush_interval` seconds after they were sent (sooner once
+    `batch_size` messages are waiting). Messages are broadcast before they are
+    stored; a failed insert is retried with the next batch.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending: List[dict] = []
+        self.inflight: List[dict] = []  # the batch being inserted right now
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.written = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def add(self, doc: dict):
+        self.pending.append(doc)
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_for(self, room_code: str) -> List[dict]:
+        return [doc for doc in self.inflight + self.pending if doc["room_code"] == room_code]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Error flushing chat messages: %s", str(e))
+
+    async def flush(self):
+        """Insert every buffered message in one batch"""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        self.inflight = batch
+        failed: List[dict] = []
+        try:
+            await mongodb.db.chat_messages.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # An unordered insert stores what it can; a duplicate _id was stored by an earlier try
+            failed = [
+                batch[error["index"]] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY
+            ]
+        except Exception:
+            # Keep the batch for the next flush, ahead of newer messages
+            self.pending[:0] = batch
+            raise
+        finally:
+            self.inflight = []
+        self.flushes += 1
+        self.written += len(batch) - len(failed)
+        logger.debug("Flushed %d chat messages", len(batch) - len(failed))
+        if failed:
+            self.pending[:0] = failed
+            raise RuntimeError(f"{len(failed)} chat messages could not be stored")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushes": self.flushes,
+            "written": self.written
+        }
+
+
+chat_rate_limiter = ChatRateLimiter(settings.CHAT_RATE_LIMIT_MESSAGES, settings.CHAT_RATE_LIMIT_SECONDS)
+chat_writer = ChatWriter(settings.CHAT_FLUSH_INTERVAL_SECONDS, settings.CHAT_FLUSH_BATCH_SIZE)
+
+
+class ChatService:
+    @staticmethod
+    def _message_from_doc(doc: dict) -> ChatMessage:
+        return ChatMessage(id=str(doc["_id"]), **{k: v for k, v in doc.items() if k != "_id"})
+
+    @staticmethod
+    def chat_frame(message: ChatMessage) -> str:
+        return encode_frame({"type": "chat", "message": message.model_dump()})
+
+    @staticmethod
+    async def post_message(room_code: str, user: User, text: str) -> ChatMessage:
+        """Validate, rate limit and broadcast a chat message, queueing it for storage"""
+        text = text.strip() if isinstance(text, str) else ""
+        if not text:
+            raise ValueError("Message is empty")
+        if len(text) > settings.CHAT_MESSAGE_MAX_LENGTH:
+            raise ValueError(f"Message is longer than {settings.CHAT_MESSAGE_MAX_LENGTH} characters")
+        if not chat_rate_limiter.allow(room_code, str(user.id)):
+            raise ChatRateLimited("You are sending messages too fast")
+
+        doc = {
+            "_id": ObjectId(),
+            "room_code": room_code,
+            "user_id": str(user.id),
+            "nickname": user.nickname,
+            "text": text,
+            "created_at": datetime.utcnow()
+        }
+        chat_writer.add(doc)
+        message = ChatService._message_from_doc(doc)
+        await manager.broadcast(room_code, ChatService.chat_frame(message))
+        return message
+
+    @staticmethod
+    async def get_history(room_code: str, before: Optional[str] = None, limit: Optional[int] = None) -> ChatPage:
+        """One page of a room's messages older than the `before` cursor, newest page first"""
+        limit = max(1, min(limit or settings.CHAT_HISTORY_PAGE_SIZE, settings.CHAT_HISTORY_PAGE_SIZE))
+        query: Dict = {"room_code": room_code}
+        if before:
+            try:
+                query["_id"] = {"$lt": ObjectId(before)}
+            except InvalidId:
+                raise ValueError("Invalid cursor")
+
+        # Messages still waiting for their batched insert are part of the history too
+        pending = [
+            doc for doc in chat_writer.pending_for(room_code)
+            if "_id" not in query or doc["_id"] < query["_id"]["$lt"]
+        ]
+        stored = await mongodb.db.chat_messages.find(query).sort("_id", DESCENDING).limit(limit + 1).to_list(None)
+        docs = sorted({doc["_id"]: doc for doc in stored + pending}.values(), key=lambda doc: doc["_id"], reverse=True)
+
+        page, more = docs[:limit], len(docs) > limit
+        return ChatPage(
+            messages=[ChatService._message_from_doc(doc) for doc in reversed(page)],
+            next_cursor=str(page[-1]["_id"]) if more else None
+        )
@@ -0,0 +1,128 @@
+from typing import List, Mapping, Optional, Tuple
+from dataclasses import dataclass
+from types import MappingProxyType
+from models.game import Game, get_full_url
+from core.mongodb import mongodb
+from core.config import settings
+from core.etag import RenderedJSON
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the games collection, with the API responses and their ETags rendered up front"""
+    games: Tuple[Game, ...]
+    by_id: Mapping[str, Game]
+    categories: Tuple[str, ...]
+    location_urls: Mapping[str, Mapping[str, str]]  # game id -> location name -> full image URL
+    games_body: RenderedJSON  # GET /games
+    games_by_category_body: Mapping[str, RenderedJSON]  # GET /games?category=...
+    game_bodies: Mapping[str, RenderedJSON]  # GET /games/{game_id}
+    categories_body: RenderedJSON  # GET /categories
+    loaded_at: float
+
+    @classmethod
+    def build(cls, docs: List[dict]) -> "CatalogSnapshot":
+        games = tuple(Game(**doc) for doc in docs)
+        # model_dump rewrites location paths to full URLs; do it once per game
+        dumped = {game.id: game.model_dump(by_alias=True) for game in games}
+        categories = tuple(sorted({game.category for game in games}))
+        return cls(
+            games=games,
+            by_id=MappingProxyType({game.id: game for game in games}),
+            categories=categories,
+            location_urls=MappingProxyType({
+                game.id: MappingProxyType({
+                    name: get_full_url(path) for name, path in (game.locations or {}).items()
+                })
+                for game in games
+            }),
+            games_body=RenderedJSON.of(list(dumped.values())),
+            games_by_category_body=MappingProxyType({
+                category: RenderedJSON.of([dumped[g.id] for g in games if g.category == category])
+                for category in categories
+            }),
+            game_bodies=MappingProxyType({game_id: RenderedJSON.of(data) for game_id, data in dumped.items()}),
+            categories_body=RenderedJSON.of(list(categories)),
+            loaded_at=time.time()
+        )
+
+
+class GameCatalog:
+    """
+    In-process copy of the game catalog. Loaded at startup and swapped for a new
+    snapshot whenever the games collection changes (change stream) or, where
+    change streams are unavailable, every GAME_CATALOG_REFRESH_SECONDS.
+    Readers always see one complete snapshot and never touch Mongo.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.watching = False
+        self.reloads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def reload(self):
+        docs = await mongodb.db.games.find().to_list(length=None)
+        self.snapshot = CatalogSnapshot.build(docs)
+        self.reloads += 1
+        logger.info("Loaded game catalog: %d games", len(self.snapshot.games))
+
+    async def get(self) -> CatalogSnapshot:
+        """Current snapshot, loading it on first use if startup did not"""
+        if self.snapshot is None:
+            await self.reload()
+        return self.snapshot
+
+    async def _run(self):
+        warned = False
+        while True:
+            try:
+                async with mongodb.db.games.watch() as stream:
+                    self.watching = True
+                    logger.info("Watching games collection for catalog changes")
+                    async for _ in stream:
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not warned:
+                    logger.info("Game catalog change stream unavailable, polling instead: %s", str(e))
+                    warned = True
+            self.watching = False
+
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error("Error reloading game catalog: %s", str(e))
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "games": len(snapshot.games) if snapshot else 0,
+            "reloads": self.reloads,
+            "watching": self.watching,
+            "loaded_at": snapshot.loaded_at if snapshot else None
+        }
+
+
+game_catalog = GameCatalog(settings.GAME_CATALOG_REFRESH_SECONDS)
@@ -1,29 +1,28 @@
 from typing import List, Optional
 from models.game import Game
-from core.mongodb import mongodb
+from services.game_catalog import game_catalog
 
 class GameService:
+    """Catalog reads, served from the in-process snapshot in services/game_catalog.py"""
+
     @staticmethod
     async def get_games(category: Optional[str] = None) -> List[Game]:
-        query = {}
+        catalog = await game_catalog.get()
         if category:
-            query["category"] = category
-        games = await mongodb.db.games.find(query).to_list(length=None)
-        return [Game(**game) for game in games]
+            return [game for game in catalog.games if game.category == category]
+        return list(catalog.games)
 
     @staticmethod
     async def get_game(game_id: str) -> Optional[Game]:
-        game = await mongodb.db.games.find_one({"_id": game_id})
-        if game:
-            return Game(**game)
-        return None
+        catalog = await game_catalog.get()
+        return catalog.by_id.get(game_id)
 
     @staticmethod
     async def get_categories() -> List[str]:
-        categories = await mongodb.db.games.distinct("category")
-        return categories
+        catalog = await game_catalog.get()
+        return list(catalog.categories)
 
     @staticmethod
     async def get_featured_games() -> List[Game]:
-        featured_games = await mongodb.db.games.find({"featured": True}).to_list(length=None)
-        return [Game(**game) for game in featured_games]
+        catalog = await game_catalog.get()
+        return [game for game in catalog.games if game.featured]
@@ -0,0 +1,205 @@
+from typing import Any, Callable, Dict, List, Optional
+from bson import encode
+from bson.raw_bson import RawBSONDocument
+from pymongo import DeleteOne, ReplaceOne
+from core.mongodb import mongodb
+from core.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LiveRoom:
+    """Compact in-memory copy of a room document"""
+
+    __slots__ = (
+        "id", "code", "game_type", "room_state", "num_players", "players",
+        "game_config", "host", "can_start", "game_state",
+        "player_views", "phase_state", "version", "touched_at"
+    )
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, **fields: Any):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        if self.players is None:
+            self.players = []
+        if self.version is None:
+            self.version = 0
+        self.touched_at = time.monotonic()
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "LiveRoom":
+        fields = dict(doc)
+        fields["id"] = fields.pop("_id")
+        return cls(**fields)
+
+    def to_doc(self) -> dict:
+        doc = {name: getattr(self, name) for name in self.FIELDS}
+        doc["_id"] = doc.pop("id")
+        return doc
+
+    def set(self, **fields: Any):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def find_player(self, user_id: str) -> Optional[dict]:
+        return next((p for p in self.players if p["user_id"] == user_id), None)
+
+
+class LiveRoomStore:
+    """
+    Optional authoritative store for active rooms (LIVE_ROOMS_ENABLED).
+
+    Each worker keeps the rooms it serves in memory and applies lobby mutations
+    there, with no Mongo round trip. Changed rooms are written to the rooms
+    collection in batches at most ROOM_FLUSH_INTERVAL_SECONDS later, so a crash
+    loses at most the changes since the last flush. A room that is not in
+    memory (e.g. after a restart) is recovered from Mongo on first access.
+
+    Every room must be served by a single worker, so run one worker or route
+    requests and sockets for a room to the same worker.
+    """
+
+    def __init__(self, enabled: bool, flush_interval: float, idle_seconds: float):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.rooms: Dict[str, LiveRoom] = {}
+        self.dirty: set = set()
+        self.deleted: Dict[str, Any] = {}  # code -> _id of rooms deleted since the last flush
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_writes = 0
+        self.recovered = 0
+
+    async def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            await self.flush()
+
+    async def get(self, code: str) -> Optional[LiveRoom]:
+        """Get a live room, recovering it from Mongo if this worker does not hold it yet"""
+        room = self.rooms.get(code)
+        if room is not None:
+            room.touched_at = time.monotonic()
+            return room
+        if code in self.deleted:
+            return None
+
+        # Concurrent callers share one load instead of each reading the document
+        pending = self._loading.get(code)
+        if pending is not None:
+            return await pending
+        pending = asyncio.get_running_loop().create_future()
+        self._loading[code] = pending
+        try:
+            doc = await mongodb.db.rooms.find_one({"code": code})
+            room = None
+            if doc is not None and code not in self.deleted:
+                room = self.rooms.setdefault(code, LiveRoom.from_doc(doc))
+                self.recovered += 1
+            pending.set_result(room)
+            return room
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # waiters get the error; don't warn if there were none
+            raise
+        finally:
+            del self._loading[code]
+
+    def put(self, doc: dict) -> LiveRoom:
+        """Hold a room that was just inserted into Mongo"""
+        room = LiveRoom.from_doc(doc)
+        self.rooms[room.code] = room
+        return room
+
+    def update(self, code: str, mutation: Callable[[LiveRoom], None], bump_version: bool = True):
+        """
+        Apply a mutation to a room already loaded with get() and schedule its write.
+        Pass bump_version=False for changes that clients never see.
+        """
+        room = self.rooms[code]
+        mutation(room)
+        if bump_version:
+            room.version += 1
+        room.touched_at = time.monotonic()
+        self.dirty.add(code)
+
+    def delete(self, code: str):
+        room = self.rooms.pop(code, None)
+        self.dirty.discard(code)
+        if room is not None:
+            self.deleted[code] = room.id
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._evict_idle()
+            except Exception as e:
+                logger.error("Error flushing live rooms: %s", str(e))
+
+    async def flush(self):
+        """Write every changed or deleted room to Mongo in one batch"""
+        if not self.dirty and not self.deleted:
+            return
+        dirty, self.dirty = self.dirty, set()
+        deleted, self.deleted = self.deleted, {}
+
+        # Encode now: the driver serializes off the event loop, while rooms keep changing
+        operations: List = [
+            ReplaceOne({"_id": self.rooms[code].id}, RawBSONDocument(encode(self.rooms[code].to_doc())))
+            for code in dirty if code in self.rooms
+        ]
+        operations.extend(DeleteOne({"_id": room_id}) for room_id in deleted.values())
+        try:
+            await mongodb.db.rooms.bulk_write(operations, ordered=False)
+        except Exception:
+            # Keep the changes queued for the next flush
+            self.dirty |= {code for code in dirty if code in self.rooms}
+            for code, room_id in deleted.items():
+                self.deleted.setdefault(code, room_id)
+            raise
+        self.flushes += 1
+        self.flushed_writes += len(operations)
+        logger.debug("Flushed %d live room writes", len(operations))
+
+    def _evict_idle(self):
+        """Forget rooms that are written out and have not been touched for a while"""
+        cutoff = time.monotonic() - self.idle_seconds
+        for code in [c for c, room in self.rooms.items() if room.touched_at < cutoff and c not in self.dirty]:
+            del self.rooms[code]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rooms": len(self.rooms),
+            "dirty": len(self.dirty),
+            "pending_deletes": len(self.deleted),
+            "recovered": self.recovered,
+            "flushes": self.flushes,
+            "flushed_writes": self.flushed_writes
+        }
+
+
+live_rooms = LiveRoomStore(
+    settings.LIVE_ROOMS_ENABLED,
+    settings.ROOM_FLUSH_INTERVAL_SECONDS,
+    settings.LIVE_ROOM_IDLE_SECONDS
+)
@@ -0,0 +1,240 @@
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+from core.mongodb import mongodb
+from core.serialization import encode_frame
+from core.websocket import manager
+from models.user import User
+from services.mafia_service import MafiaService
+from services.room_service import RoomService
+from services.live_room_store import live_rooms
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tries at taking a leaving player out of a stored game while actions keep landing
+REMOVE_PLAYER_ATTEMPTS = 5
+
+
+class MafiaEngine:
+    """
+    Runs the day/night cycle of a Mafia game.
+
+    Votes and night actions are tallied in the room's server-only phase_state
+    (never sent to clients): each one is a single conditional $set/$inc, or an
+    in-place change in live mode, however many players the room has. The
+    action that brings `pending` to zero resolves the phase; the room then gets
+    one phase_resolved frame with the outcome, followed by the usual room change
+    carrying the new public game state, and each police officer privately
+    learns what they investigated.
+
+    A player who leaves the room mid-game is taken out of the phase state
+    too, so the phase never waits for someone who is gone.
+    """
+
+    @staticmethod
+    def outcome_frame(room_code: str, outcome: dict) -> str:
+        return encode_frame({"type": "game_update", "event": "phase_resolved", "room_code": room_code, **outcome})
+
+    @staticmethod
+    def investigation_frame(room_code: str, user_id: str, result: dict) -> str:
+        return encode_frame({
+            "type": "game_update",
+            "event": "investigation_result",
+            "room_code": room_code,
+            "player_id": user_id,
+            **result
+        })
+
+    @staticmethod
+    def _record(phase_state: dict, user_id: str, action: str, target: str):
+        """Apply an action to an in-memory phase state, as _action_update does in Mongo"""
+        phase_state["acted"][user_id] = target
+        if action in ("vote", "kill"):
+            phase_state["tally"][target] = phase_state["tally"].get(target, 0) + 1
+        elif action == "protect":
+            phase_state["protected"].append(target)
+        else:
+            phase_state["investigations"][user_id] = target
+        phase_state["pending"] -= 1
+
+    @staticmethod
+    def _action_update(user_id: str, action: str, target: str) -> dict:
+        update = {
+            "$set": {f"phase_state.acted.{user_id}": target},
+            "$inc": {"phase_state.pending": -1}
+        }
+        if action in ("vote", "kill"):
+            update["$inc"][f"phase_state.tally.{target}"] = 1
+        elif action == "protect":
+            update["$push"] = {"phase_state.protected": target}
+        else:
+            update["$set"][f"phase_state.investigations.{user_id}"] = target
+        return update
+
+    @staticmethod
+    def _roles(player_views: Optional[dict]) -> Dict[str, str]:
+        return {user_id: view["role_info"]["role"] for user_id, view in (player_views or {}).items()}
+
+    @staticmethod
+    async def act(room_code: str, user: User, phase: str, target: Optional[str]) -> dict:
+        """Record a day vote ("day") or a night action ("night") against a target player"""
+        user_id = str(user.id)
+        if not target or not isinstance(target, str):
+            raise ValueError("A target player is required")
+        if live_rooms.enabled:
+            return await MafiaEngine._act_live(room_code, user_id, phase, target)
+        return await MafiaEngine._act_stored(room_code, user_id, phase, target)
+
+    @staticmethod
+    async def _act_live(room_code: str, user_id: str, phase: str, target: str) -> dict:
+        live_room = await live_rooms.get(room_code)
+        if not live_room or live_room.room_state != "in_game" or live_room.game_type != "mafia":
+            raise ValueError("No Mafia game is running in this room")
+        phase_state = live_room.phase_state
+        action = MafiaService.check_action(phase_state, phase, user_id, target)
+        round_number = phase_state["round"]
+        # The tallies change nothing clients see, so the room version stays put
+        live_rooms.update(
+            room_code, lambda live: MafiaEngine._record(live.phase_state, user_id, action, target), bump_version=False
+        )
+        if phase_state["pending"] == 0:
+            await MafiaEngine._resolve_live(room_code)
+        return {"round": round_number}
+
+    @staticmethod
+    async def _resolve_live(room_code: str):
+        live_room = await live_rooms.get(room_code)
+        outcome, game_state, next_state, investigations = MafiaService.resolve_phase(
+            live_room.game_state, live_room.phase_state, MafiaEngine._roles(live_room.player_views)
+        )
+
+        def advance(live):
+            live.set(game_state=game_state, phase_state=next_state)
+            for police_id, result in investigations.items():
+                view = live.player_views[police_id]
+                live.player_views[police_id] = {**view, "investigations": view.get("investigations", []) + [result]}
+        live_rooms.update(room_code, advance)
+        await MafiaEngine._announce(await RoomService.get_room(room_code), outcome, investigations)
+
+    @staticmethod
+    async def _act_stored(room_code: str, user_id: str, phase: str, target: str) -> dict:
+        # Only the entries this action depends on, not the whole phase state
+        projection = {
+            "room_state": 1, "game_type": 1,
+            "phase_state.phase": 1, "phase_state.round": 1,
+            f"phase_state.alive.{user_id}": 1, f"phase_state.alive.{target}": 1,
+            f"phase_state.acted.{user_id}": 1
+        }
+        room_doc = await mongodb.db.rooms.find_one({"code": room_code}, projection)
+        if not room_doc or room_doc.get("room_state") != "in_game" or room_doc.get("game_type") != "mafia":
+            raise ValueError("No Mafia game is running in this room")
+        phase_state = room_doc.get("phase_state")
+        if phase_state is not None:
+            phase_state = {"alive": {}, "acted": {}, **phase_state}
+        action = MafiaService.check_action(phase_state, phase, user_id, target)
+        round_number = phase_state["round"]
+
+        # Re-check everything the validation relied on in the write itself
+        recorded = await mongodb.db.rooms.find_one_and_update(
+            {
+                "code": room_code,
+                "phase_state.phase": phase,
+                "phase_state.round": round_number,
+                f"phase_state.alive.{user_id}": phase_state["alive"][user_id],
+                f"phase_state.alive.{target}": phase_state["alive"][target],
+                f"phase_state.acted.{user_id}": {"$exists": False}
+            },
+            MafiaEngine._action_update(user_id, action, target),
+            projection={"phase_state.pending": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if recorded is None:
+            raise ValueError("The game moved on before your action was recorded")
+        if recorded["phase_state"]["pending"] == 0:
+            await MafiaEngine._resolve_stored(room_code, phase, round_number)
+        return {"round": round_number}
+
+    @staticmethod
+    async def _resolve_stored(room_code: str, phase: str, round_number: int):
+        room_doc = await mongodb.db.rooms.find_one(
+            {"code": room_code}, {"game_state": 1, "phase_state": 1, "player_views": 1}
+        )
+        outcome, game_state, next_state, investigations = MafiaService.resolve_phase(
+            room_doc["game_state"], room_doc["phase_state"], MafiaEngine._roles(room_doc.get("player_views"))
+        )
+        update = {"$set": {"game_state": game_state, "phase_state": next_state}, "$inc": {"version": 1}}
+        if investigations:
+            update["$push"] = {
+                f"player_views.{police_id}.investigations": result for police_id, result in investigations.items()
+            }
+        # Only the first resolver matches; a second one finds the phase already moved on
+        room_doc = await mongodb.db.rooms.find_one_and_update(
+            {
+                "code": room_code,
+                "phase_state.phase": phase,
+                "phase_state.round": round_number,
+                "phase_state.pending": 0
+            },
+            update,
+            projection={"player_views": 0, "phase_state": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if room_doc is None:
+            logger.debug("Phase %s %d of room %s was already resolved", phase, round_number, room_code)
+            return
+        await MafiaEngine._announce(RoomService._room_from_doc(room_doc), outcome, investigations)
+
+    @staticmethod
+    async def remove_player(room_code: str, user_id: str):
+        """
+        Take a player who left the room out of its running game, resolving the
+        phase if it was only waiting for them or their leaving decided the game
+        """
+        if live_rooms.enabled:
+            live_room = await live_rooms.get(room_code)
+            if not live_room or not live_room.phase_state or user_id not in live_room.phase_state["alive"]:
+                return
+            game_state, phase_state = MafiaService.drop_player(live_room.game_state, live_room.phase_state, user_id)
+            live_rooms.update(room_code, lambda live: live.set(game_state=game_state, phase_state=phase_state))
+            if phase_state["pending"] == 0:
+                await MafiaEngine._resolve_live(room_code)
+            return
+
+        for _ in range(REMOVE_PLAYER_ATTEMPTS):
+            room_doc = await mongodb.db.rooms.find_one({"code": room_code}, {"game_state": 1, "phase_state": 1})
+            phase_state = room_doc.get("phase_state") if room_doc else None
+            if not phase_state or user_id not in phase_state["alive"]:
+                return
+            game_state, next_state = MafiaService.drop_player(room_doc["game_state"], phase_state, user_id)
+            # Every action lowers pending, so an unchanged count means nobody acted since the read
+            updated = await mongodb.db.rooms.find_one_and_update(
+                {
+                    "code": room_code,
+                    "phase_state.phase": phase_state["phase"],
+                    "phase_state.round": phase_state["round"],
+                    "phase_state.pending": phase_state["pending"],
+                    f"phase_state.alive.{user_id}": {"$exists": True}
+                },
+                {"$set": {"game_state": game_state, "phase_state": next_state}, "$inc": {"version": 1}},
+                projection={"_id": 1}
+            )
+            if updated is None:
+                continue
+            if next_state["pending"] == 0:
+                await MafiaEngine._resolve_stored(room_code, phase_state["phase"], phase_state["round"])
+            return
+        logger.warning("Could not take player %s out of the game in room %s", user_id, room_code)
+
+    @staticmethod
+    async def _announce(room, outcome: dict, investigations: Dict[str, dict]):
+        logger.info(
+            "Room %s resolved %s %d: eliminated=%s winner=%s",
+            room.code, outcome["phase"], outcome["round"], outcome["eliminated"], outcome["winner"]
+        )
+        await manager.broadcast(room.code, MafiaEngine.outcome_frame(room.code, outcome))
+        await asyncio.gather(*(
+            manager.send_to_user(room.code, police_id, MafiaEngine.investigation_frame(room.code, police_id, result))
+            for police_id, result in investigations.items()
+        ))
+        await RoomService.broadcast_room_change(room)
@@ -1,4 +1,5 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from collections import Counter
 from random import shuffle
 from models.mafia import MafiaPlayer, MafiaRole, ROLE_DESCRIPTIONS
 from models.room import Room
@@ -6,6 +7,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Roles that act at night, and what their night action is
+NIGHT_ACTIONS = {
+    MafiaRole.MAFIA.value: "kill",
+    MafiaRole.DOCTOR.value: "protect",
+    MafiaRole.POLICE.value: "investigate",
+}
+
 class MafiaService:
     @staticmethod
     def assign_roles(room: Room) -> List[MafiaPlayer]:
@@ -68,10 +76,6 @@ class MafiaService:
                 # Create role info with base description
                 role_info = ROLE_DESCRIPTIONS[role].model_copy()
                 
-                # Add teammates for mafia members
-                if role == MafiaRole.MAFIA:
-                    role_info.teammates = [name for name in mafia_members if name != player.nickname]
-                
                 mafia_player = MafiaPlayer(
                     user_id=player.user_id,
                     nickname=player.nickname,
@@ -79,6 +83,13 @@ class MafiaService:
                 )
                 mafia_players.append(mafia_player)
             
+            # Add teammates for mafia members once every member is known
+            for mafia_player in mafia_players:
+                if mafia_player.role_info.role == MafiaRole.MAFIA:
+                    mafia_player.role_info.teammates = [
+                        name for name in mafia_members if name != mafia_player.nickname
+                    ]
+            
             logger.info("Role assignment complete. %d players assigned", len(mafia_players))
             return mafia_players
             
@@ -88,29 +99,204 @@ class MafiaService:
 
     @staticmethod
     def create_game_state(players: List[MafiaPlayer]) -> Dict:
-        """Create initial game state"""
+        """Create the initial public game state, without anyone's role"""
         try:
-            # Serialize players with proper role handling
-            serialized_players = []
-            for player in players:
-                player_data = player.model_dump()
-                if player_data.get('role_info') and player_data['role_info'].get('role'):
-                    # Only convert to value if it's an Enum
-                    if hasattr(player_data['role_info']['role'], 'value'):
-                        player_data['role_info']['role'] = player_data['role_info']['role'].value
-                serialized_players.append(player_data)
-
             game_state = {
                 "phase": "night",
                 "round": 1,
-                "players": serialized_players,
+                "players": [
+                    {
+                        "user_id": player.user_id,
+                        "nickname": player.nickname,
+                        "is_alive": player.is_alive
+                    }
+                    for player in players
+                ],
                 "eliminated_players": [],
-                "votes": {},
-                "night_actions": {}
+                "last_outcome": None,
+                "winner": None
             }
             logger.debug("Created game state: %s", game_state)
             return game_state
             
         except Exception as e:
             logger.error("Error creating game state: %s", str(e))
-            raise 
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def create_player_views(players: List[MafiaPlayer]) -> Dict[str, Dict]:
+        """Each player's private view (their own role and, for mafia, their teammates) by user id"""
+        return {
+            player.user_id: {"role_info": player.model_dump()["role_info"]}
+            for player in players
+        }
+
+    @staticmethod
+    def create_phase_state(players: List[MafiaPlayer]) -> Dict:
+        """Create the server-only state of the first night: who is alive as what, and who still has to act"""
+        alive = {player.user_id: MafiaRole(player.role_info.role).value for player in players}
+        return MafiaService.next_phase_state("night", 1, alive)
+
+    @staticmethod
+    def next_phase_state(phase: str, round_number: int, alive: Dict[str, str]) -> Dict:
+        """
+        Fresh tallies for a phase. `pending` counts the actors still to act:
+        every living player during the day, the mafia, doctors and police at night.
+        """
+        if phase == "day":
+            pending = len(alive)
+        else:
+            pending = sum(1 for role in alive.values() if role in NIGHT_ACTIONS)
+        return {
+            "phase": phase,
+            "round": round_number,
+            "alive": alive,
+            "acted": {},  # user id -> target, so nobody acts twice in a phase
+            "tally": {},  # target -> day votes, or mafia kill votes at night
+            "protected": [],
+            "investigations": {},  # police user id -> target
+            "pending": pending
+        }
+
+    @staticmethod
+    def check_action(phase_state: Dict, phase: str, user_id: str, target: str) -> str:
+        """Validate an action against the phase state, returning the acting player's night action or "vote" """
+        if phase_state is None or phase_state["phase"] == "ended":
+            raise ValueError("The game is over")
+        if phase_state["phase"] != phase:
+            raise ValueError(f"It is not {phase} time")
+        alive = phase_state["alive"]
+        role = alive.get(user_id)
+        if role is None:
+            raise ValueError("Eliminated players cannot act")
+        action = "vote" if phase == "day" else NIGHT_ACTIONS.get(role)
+        if action is None:
+            raise ValueError("Your role has no night action")
+        if user_id in phase_state["acted"]:
+            raise ValueError("You already acted this phase")
+        if target not in alive:
+            raise ValueError("Target is not a living player")
+        if action == "kill" and alive[target] == MafiaRole.MAFIA.value:
+            raise ValueError("The mafia cannot target their own")
+        if action in ("vote", "investigate") and target == user_id:
+            raise ValueError("You cannot target yourself")
+        return action
+
+    @staticmethod
+    def drop_player(game_state: Dict, phase_state: Dict, user_id: str) -> Tuple[Dict, Dict]:
+        """
+        Take a player who left the room out of a running game. Their action this
+        phase is withdrawn, actions against them stop counting and the phase no
+        longer waits for them. If that decides the game, nobody is pending any more.
+        """
+        if phase_state is None or phase_state["phase"] == "ended" or user_id not in phase_state["alive"]:
+            return game_state, phase_state
+        phase = phase_state["phase"]
+        role = phase_state["alive"][user_id]
+        action = "vote" if phase == "day" else NIGHT_ACTIONS.get(role)
+        alive = {uid: r for uid, r in phase_state["alive"].items() if uid != user_id}
+        acted = dict(phase_state["acted"])
+        tally = {target: votes for target, votes in phase_state["tally"].items() if target != user_id}
+        protected = [target for target in phase_state["protected"] if target != user_id]
+        investigations = {uid: target for uid, target in phase_state["investigations"].items() if uid != user_id}
+        pending = phase_state["pending"]
+
+        if user_id in acted:
+            target = acted.pop(user_id)
+            if action in ("vote", "kill") and target in tally:
+                tally[target] -= 1
+                if not tally[target]:
+                    del tally[target]
+            elif action == "protect" and target in protected:
+                protected.remove(target)
+        elif action is not None:
+            pending -= 1
+        if MafiaService.winner(alive) is not None:
+            pending = 0
+
+        new_phase_state = {
+            **phase_state,
+            "alive": alive,
+            "acted": acted,
+            "tally": tally,
+            "protected": protected,
+            "investigations": investigations,
+            "pending": pending
+        }
+        new_game_state = {
+            **game_state,
+            "players": [dict(p, is_alive=False) if p["user_id"] == user_id else p for p in game_state["players"]]
+        }
+        return new_game_state, new_phase_state
+
+    @staticmethod
+    def _plurality(tally: Dict[str, int]) -> Optional[str]:
+        """The target with the most votes, or None on a tie"""
+        ranked = Counter(tally).most_common(2)
+        if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+            return None
+        return ranked[0][0]
+
+    @staticmethod
+    def winner(alive: Dict[str, str]) -> Optional[str]:
+        mafia = sum(1 for role in alive.values() if role == MafiaRole.MAFIA.value)
+        if mafia == 0:
+            return "civilians"
+        if mafia >= len(alive) - mafia:
+            return "mafia"
+        return None
+
+    @staticmethod
+    def resolve_phase(game_state: Dict, phase_state: Dict, roles: Dict[str, str]) -> Tuple[Dict, Dict, Dict, Dict[str, Dict]]:
+        """
+        Resolve a phase everyone has acted in. Returns the public outcome, the new
+        public game state, the next phase state and each police officer's
+        investigation result. `roles` maps every player, alive or not, to their role.
+        """
+        phase, round_number = phase_state["phase"], phase_state["round"]
+        alive = dict(phase_state["alive"])
+        eliminated = MafiaService._plurality(phase_state["tally"])
+        if MafiaService.winner(alive) is not None:
+            # A player leaving already decided the game
+            eliminated = None
+        outcome = {"phase": phase, "round": round_number, "eliminated": None}
+        investigations = {}
+
+        if phase == "night":
+            saved = eliminated is not None and eliminated in phase_state["protected"]
+            outcome["saved"] = saved
+            if saved:
+                eliminated = None
+            investigations = {
+                police_id: {"round": round_number, "target": target, "is_mafia": roles[target] == MafiaRole.MAFIA.value}
+                for police_id, target in phase_state["investigations"].items()
+            }
+        else:
+            # Day votes are public once the day is over
+            outcome["votes"] = phase_state["tally"]
+
+        if eliminated is not None:
+            del alive[eliminated]
+            outcome["eliminated"] = eliminated
+            outcome["eliminated_role"] = roles[eliminated]
+
+        winner = MafiaService.winner(alive)
+        outcome["winner"] = winner
+        if winner is not None:
+            outcome["roles"] = roles
+            next_state = {**MafiaService.next_phase_state("ended", round_number, alive), "pending": 0}
+        elif phase == "night":
+            next_state = MafiaService.next_phase_state("day", round_number, alive)
+        else:
+            next_state = MafiaService.next_phase_state("night", round_number + 1, alive)
+
+        new_game_state = {
+            **game_state,
+            "phase": next_state["phase"],
+            "round": next_state["round"],
+            "players": [dict(p, is_alive=p["user_id"] in alive) for p in game_state["players"]],
+            "eliminated_players": game_state["eliminated_players"] + ([eliminated] if eliminated else []),
+            "last_outcome": outcome,
+            "winner": winner
+        }
+        return outcome, new_game_state, next_state, investigations
@@ -0,0 +1,144 @@
+from typing import Dict, Optional, Tuple
+from core.config import settings
+from core.serialization import encode_frame
+from core.websocket import ConnectionManager, manager
+from services.room_service import RoomService
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+ONLINE = "online"  # has at least one open socket in the room
+AWAY = "away"  # lost its last socket; may still reconnect within the grace period
+GONE = "gone"  # did not come back in time
+
+
+class PresenceTracker:
+    """
+    In-memory presence of the players connected to the rooms, driven by
+    ConnectionManager's connect/disconnect notifications. The manager shares
+    them with the other workers through the backplane, so every worker sees
+    a player as online while they have a socket on any of them.
+
+    A player whose last socket goes away (closed, evicted or reaped by the
+    heartbeat) is "away" for `grace_seconds`. If they reconnect in that
+    window, on any worker, nothing else happens; otherwise they are
+    announced as "gone", no longer tracked and, while the room is still in
+    the lobby, removed from it as if they had left. Only the worker that held
+    their last socket removes them. Players who drop out mid-game stay in
+    the room's player list.
+
+    Changes are collected and sent as one presence frame per room every
+    `broadcast_interval` seconds, so a burst of reconnects costs one frame.
+    Every worker sends its own sockets its own copy.
+    """
+
+    def __init__(
+        self, grace_seconds: float, broadcast_interval: float, connection_manager: Optional[ConnectionManager] = None
+    ):
+        self.manager = connection_manager or manager
+        self.grace_seconds = grace_seconds
+        self.broadcast_interval = broadcast_interval
+        self.rooms: Dict[str, Dict[str, str]] = {}  # room -> user -> state
+        self.changed: Dict[str, Dict[str, str]] = {}  # same, for changes not broadcast yet
+        self._expiry: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.removed = 0
+        self.broadcasts = 0
+
+    async def start(self):
+        self.manager.add_presence_handler(self.on_connection_change)
+        self._task = asyncio.create_task(self._broadcast_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for handle in self._expiry.values():
+            handle.cancel()
+        self._expiry.clear()
+
+    def on_connection_change(self, room_id: str, user_id: str, online: bool, local: bool = True):
+        handle = self._expiry.pop((room_id, user_id), None)
+        if handle is not None:
+            handle.cancel()
+        if online:
+            self._set(room_id, user_id, ONLINE)
+        else:
+            self._set(room_id, user_id, AWAY)
+            self._expiry[(room_id, user_id)] = asyncio.get_running_loop().call_later(
+                self.grace_seconds, self._expire, room_id, user_id, local
+            )
+
+    def snapshot(self, room_id: str) -> Dict[str, str]:
+        return dict(self.rooms.get(room_id, {}))
+
+    @staticmethod
+    def presence_frame(room_id: str, players: Dict[str, str]) -> str:
+        return encode_frame({"type": "presence", "room_code": room_id, "players": players})
+
+    def _set(self, room_id: str, user_id: str, state: str):
+        users = self.rooms.setdefault(room_id, {})
+        if users.get(user_id) == state:
+            return
+        users[user_id] = state
+        self.changed.setdefault(room_id, {})[user_id] = state
+
+    def _expire(self, room_id: str, user_id: str, remove: bool):
+        self._expiry.pop((room_id, user_id), None)
+        users = self.rooms.get(room_id, {})
+        if users.get(user_id) == AWAY and not self.manager.is_online(room_id, user_id):
+            self.expired += 1
+            self._set(room_id, user_id, GONE)
+            # The change stays queued for the next broadcast; the player is no longer tracked
+            del users[user_id]
+            if not users:
+                del self.rooms[room_id]
+            if remove:
+                asyncio.create_task(self._remove_from_lobby(room_id, user_id))
+
+    async def _remove_from_lobby(self, room_id: str, user_id: str):
+        try:
+            await RoomService.remove_player(room_id, user_id, lobby_only=True)
+            self.removed += 1
+            logger.info("Removed player %s from room %s after the reconnect grace period", user_id, room_id)
+        except ValueError as e:
+            # Already left, room deleted, or a game is running: nothing to do
+            logger.debug("Not removing player %s from room %s: %s", user_id, room_id, str(e))
+        except Exception as e:
+            logger.error("Error removing gone player %s from room %s: %s", user_id, room_id, str(e))
+
+    async def _broadcast_loop(self):
+        while True:
+            await asyncio.sleep(self.broadcast_interval)
+            try:
+                await self.broadcast_changes()
+            except Exception as e:
+                logger.error("Error broadcasting presence: %s", str(e))
+
+    async def broadcast_changes(self):
+        changed, self.changed = self.changed, {}
+        for room_id, players in changed.items():
+            # Every worker tracks every room's presence, so each one only tells its own sockets
+            if self.manager.registry.has_room(room_id):
+                self.broadcasts += 1
+                self.manager.broadcast_local(room_id, self.presence_frame(room_id, players))
+
+    def stats(self) -> dict:
+        states = [state for users in self.rooms.values() for state in users.values()]
+        return {
+            "rooms": len(self.rooms),
+            ONLINE: states.count(ONLINE),
+            AWAY: states.count(AWAY),
+            "expired": self.expired,
+            "removed": self.removed,
+            "broadcasts": self.broadcasts
+        }
+
+
+presence_tracker = PresenceTracker(settings.PRESENCE_GRACE_SECONDS, settings.PRESENCE_BROADCAST_INTERVAL_SECONDS)
@@ -0,0 +1,151 @@
+from typing import Dict, Optional
+from pymongo.errors import DuplicateKeyError
+from core.mongodb import mongodb
+from core.config import settings
+import asyncio
+import random
+import string
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Use only uppercase letters and numbers to avoid confusion
+CODE_CHARACTERS = string.ascii_uppercase + string.digits
+MIN_CODE_LENGTH = 4
+MAX_CODE_LENGTH = 8
+
+
+def code_space_size(length: int) -> int:
+    """Number of codes of this length with at least one letter and one number"""
+    return 36 ** length - 26 ** length - 10 ** length
+
+
+class RoomCodeAllocator:
+    """
+    Hands out room codes by inserting the room and retrying on a duplicate key,
+    relying on the unique rooms.code index instead of check-then-insert.
+    Deleted rooms free their code immediately. Once the share of codes in use
+    at the current length passes ROOM_CODE_MAX_FILL_RATIO, new rooms get a
+    code one character longer.
+
+    Rooms per code length are counted as this worker allocates and releases
+    codes. Every `refresh_seconds` a background task reconciles the counts
+    with the collection's estimated size (other workers' rooms, rooms from
+    before a restart), so allocating never waits on a count.
+    """
+
+    def __init__(self, max_fill_ratio: float, refresh_seconds: float = 30.0, max_attempts: int = 8):
+        self.max_fill_ratio = max_fill_ratio
+        self.refresh_seconds = refresh_seconds
+        self.max_attempts = max_attempts
+        self.occupancy: Dict[int, int] = {}
+        self.allocated = 0
+        self.collisions = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            await self.refresh_occupancy()
+        except Exception as e:
+            logger.warning("Could not count rooms for code allocation: %s", str(e))
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    def generate_code(length: int = MIN_CODE_LENGTH) -> str:
+        """
+        Generate a room code with mix of uppercase letters and numbers.
+        Example outputs: 'A2B5', 'X9Y3', 'M4K7'
+        """
+        while True:
+            # Ensure at least one letter and one number
+            code = ''.join(random.choices(CODE_CHARACTERS, k=length))
+            if (any(c.isdigit() for c in code) and
+                any(c.isalpha() for c in code)):
+                return code
+
+    async def refresh_occupancy(self):
+        """Reconcile the counts with the number of rooms, read from collection metadata rather than a scan"""
+        total = await mongodb.db.rooms.estimated_document_count()
+        drift = total - sum(self.occupancy.values())
+        length = self.current_length()
+        # Rooms this worker did not count most likely have the length new rooms get;
+        # rooms it did not see deleted come off that length first, then shorter ones
+        while drift and length >= MIN_CODE_LENGTH:
+            count = self.occupancy.get(length, 0)
+            change = drift if drift > 0 else max(drift, -count)
+            self.occupancy[length] = count + change
+            drift -= change
+            length -= 1
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh_occupancy()
+            except Exception as e:
+                # Stale counts only delay the switch to longer codes
+                logger.warning("Could not refresh room code occupancy: %s", str(e))
+
+    def fill_ratio(self, length: int) -> float:
+        return self.occupancy.get(length, 0) / code_space_size(length)
+
+    def current_length(self) -> int:
+        length = MIN_CODE_LENGTH
+        while length < MAX_CODE_LENGTH and self.fill_ratio(length) >= self.max_fill_ratio:
+            length += 1
+        return length
+
+    async def insert_room(self, room_dict: dict) -> dict:
+        """Insert a room under a fresh code, setting room_dict's code and _id"""
+        length = self.current_length()
+        attempts = 0
+        while True:
+            room_dict["code"] = self.generate_code(length)
+            room_dict.pop("_id", None)
+            try:
+                result = await mongodb.db.rooms.insert_one(room_dict)
+            except DuplicateKeyError:
+                self.collisions += 1
+                attempts += 1
+                if attempts >= self.max_attempts and length < MAX_CODE_LENGTH:
+                    # This length is denser than the counts say; move on rather than spin
+                    logger.warning("Room codes of length %d look exhausted, using %d", length, length + 1)
+                    length += 1
+                    attempts = 0
+                continue
+            self.allocated += 1
+            self.occupancy[length] = self.occupancy.get(length, 0) + 1
+            room_dict["_id"] = result.inserted_id
+            return room_dict
+
+    def release(self, code: str):
+        """Account for a deleted room; its code can be handed out again right away"""
+        length = len(code)
+        if self.occupancy.get(length):
+            self.occupancy[length] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "code_length": self.current_length(),
+            "allocated": self.allocated,
+            "collisions": self.collisions,
+            "occupancy": {
+                length: {"rooms": count, "fill_ratio": self.fill_ratio(length)}
+                for length, count in sorted(
+                    (length, count) for length, count in self.occupancy.items()
+                    if length and length >= MIN_CODE_LENGTH
+                )
+            }
+        }
+
+
+room_code_allocator = RoomCodeAllocator(settings.ROOM_CODE_MAX_FILL_RATIO)
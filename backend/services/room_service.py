@@ -1,46 +1,126 @@
 from typing import Optional, List
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from core.mongodb import mongodb
 from models.room import Room, RoomCreate, PlayerState
 from models.user import User
-import random
-import string
-from core.websocket import manager
+from core.websocket import manager, OutboundFrame, ROOM_PATCH, ROOM_SNAPSHOT
+from core.serialization import encode_frame
+from core.cache import TTLCache
+from core.config import settings
+from core.patch import diff
 from datetime import datetime
 from services.mafia_service import MafiaService
 from models.mafia import MafiaRole
 from services.spyfall_service import SpyfallService
+from services.room_code_allocator import room_code_allocator
+from services.live_room_store import live_rooms
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Last room state broadcast from this worker, keyed by room code, as (version, room dict)
+room_snapshots = TTLCache(settings.ROOM_SNAPSHOT_CACHE_SIZE, settings.LIVE_ROOM_IDLE_SECONDS)
+
+# Pipeline-update stage fragment that bumps the room version
+BUMP_VERSION = {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}}
+
 class RoomService:
     @staticmethod
-    def generate_room_code(length: int = 4) -> str:
+    def room_update_frame(room: Room) -> str:
+        """Encode a full room_update snapshot, sent on connect and when a client asks to sync"""
+        return encode_frame({
+            "type": "room_update",
+            "room": room.model_dump(),
+            "version": room.version,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    @staticmethod
+    def room_changes_frame(rooms: List[Room]) -> Optional[OutboundFrame]:
         """
-        Generate a room code with mix of uppercase letters and numbers.
-        Example outputs: 'A2B5', 'X9Y3', 'M4K7'
+        Encode one message for a batch of room changes, in the order they were made:
+        a room_patch from the last broadcast version to the newest one when every
+        version in between came through this worker, a full room_update otherwise,
+        tagged so a backed-up socket can shed what a newer snapshot supersedes.
+        Returns None if no change is newer than what was already broadcast.
         """
-        # Use only uppercase letters and numbers to avoid confusion
-        characters = string.ascii_uppercase + string.digits
-        while True:
-            # Ensure at least one letter and one number
-            code = ''.join(random.choices(characters, k=length))
-            if (any(c.isdigit() for c in code) and 
-                any(c.isalpha() for c in code)):
-                return code
+        code = rooms[0].code
+        previous = room_snapshots.get(code)
+        version = previous[0] if previous is not None else None
+        contiguous = previous is not None
+        latest = None
+        for room in rooms:
+            if version is not None and room.version <= version:
+                continue
+            contiguous = contiguous and room.version == version + 1
+            version = room.version
+            latest = room
+        if latest is None:
+            return None
+
+        snapshot = latest.model_dump()
+        room_snapshots.set(code, (latest.version, snapshot))
+        if not contiguous:
+            return OutboundFrame(RoomService.room_update_frame(latest), ROOM_SNAPSHOT)
+        return OutboundFrame(encode_frame({
+            "type": "room_patch",
+            "room_code": code,
+            "base_version": previous[0],
+            "version": latest.version,
+            "ops": diff(previous[1], snapshot)
+        }), ROOM_PATCH)
+
+    @staticmethod
+    async def broadcast_room_change(room: Room):
+        """Queue a room change; changes made within the coalescing window go out as one frame"""
+        manager.broadcast_coalesced(room.code, "room", room, RoomService.room_changes_frame)
+
+    @staticmethod
+    def game_started_frame(room: Room, game_state: dict) -> str:
+        """Encode a game_started message once so the same frame can go to every socket"""
+        return encode_frame({
+            "type": "game_started",
+            "game_type": room.game_type,
+            "room_code": room.code,
+            "game_state": game_state
+        })
+
+    @staticmethod
+    def role_assigned_frame(room_code: str, user_id: str, view: dict) -> str:
+        """Encode one player's private view of the game, sent to that player's sockets only"""
+        return encode_frame({
+            "type": "game_update",
+            "event": "role_assigned",
+            "room_code": room_code,
+            "player_id": user_id,
+            **view
+        })
+
+    @staticmethod
+    async def send_player_views(room_code: str, player_views: dict):
+        """Send every player their own private view; each frame holds one player's data"""
+        await asyncio.gather(*(
+            manager.send_to_user(room_code, user_id, RoomService.role_assigned_frame(room_code, user_id, view))
+            for user_id, view in player_views.items()
+        ))
+
+    @staticmethod
+    async def get_player_view(room_code: str, user_id: str) -> Optional[dict]:
+        """One player's private view of the running game, reading only that player's entry"""
+        if live_rooms.enabled:
+            live_room = await live_rooms.get(room_code)
+            return (live_room.player_views or {}).get(user_id) if live_room else None
+        room_doc = await mongodb.db.rooms.find_one({"code": room_code}, {f"player_views.{user_id}": 1})
+        if not room_doc:
+            return None
+        return (room_doc.get("player_views") or {}).get(user_id)
 
     @staticmethod
     async def create_room(room_data: RoomCreate, user: User) -> Room:
         """Create a new room"""
         try:
-            # Generate a unique room code
-            while True:
-                room_code = RoomService.generate_room_code()
-                existing_room = await mongodb.db.rooms.find_one({"code": room_code})
-                if not existing_room:
-                    break
-
             # Create the host player with user details
             host_player = PlayerState(
                 user_id=str(user.id),
@@ -51,113 +131,139 @@ class RoomService:
             )
             
             room_dict = {
-                "code": room_code,
                 "game_type": room_data.game_type,
                 "room_state": "lobby",
                 "num_players": room_data.num_players,
                 "players": [host_player.model_dump()],
                 "game_config": room_data.game_config,
                 "host": str(user.id),
-                "chat_history": [],
                 "can_start": False,
+                "player_views": None,
+                "phase_state": None,
+                "version": 0,
             }
             
-            result = await mongodb.db.rooms.insert_one(room_dict)
-            if not result.inserted_id:
-                raise ValueError("Failed to create room")
+            # Insert under a fresh code; the unique index settles any collision
+            created_room = await room_code_allocator.insert_room(room_dict)
+            if live_rooms.enabled:
+                live_rooms.put(created_room)
+            created_room = {**created_room, "_id": str(created_room["_id"])}
             
-            created_room = await mongodb.db.rooms.find_one({"_id": result.inserted_id})
-            if not created_room:
-                raise ValueError("Failed to fetch created room")
-            
-            created_room["_id"] = str(created_room["_id"])
-            
-            logger.info("Created room %s", room_code)
+            logger.info("Created room %s", created_room["code"])
             return Room(**created_room)
         except Exception as e:
             logger.error("Error creating room: %s", str(e))
             raise
 
     @staticmethod
-    async def _enrich_player_data(player_state: dict) -> dict:
-        """Helper method to add user details to player state"""
+    async def _enrich_players(players: List[dict]) -> List[dict]:
+        """Helper method to add user details to player states with a single users query"""
+        if not players:
+            return players
         try:
-            # Don't convert to ObjectId, use the UUID string directly
-            user = await mongodb.db.users.find_one({"_id": player_state['user_id']})
-            if user:
-                player_state['nickname'] = user.get('nickname')
-                player_state['full_name'] = user.get('full_name')
-                player_state['email'] = user.get('email')
-            return player_state
+            # Don't convert to ObjectId, use the UUID strings directly
+            user_ids = [player['user_id'] for player in players]
+            users = {
+                user['_id']: user
+                async for user in mongodb.db.users.find(
+                    {"_id": {"$in": user_ids}},
+                    {"nickname": 1, "full_name": 1, "email": 1}
+                )
+            }
+            for player in players:
+                user = users.get(player['user_id'])
+                if user:
+                    player['nickname'] = user.get('nickname')
+                    player['full_name'] = user.get('full_name')
+                    player['email'] = user.get('email')
         except Exception as e:
             logger.error("Error enriching player data: %s", str(e))
-            return player_state
+        return players
 
     @staticmethod
-    async def get_room(room_code: str) -> Optional[Room]:
-        """Get room by code"""
+    def _room_from_doc(room_doc: dict) -> Room:
+        """Build the Room model from a raw rooms document"""
+        # Ensure players exists and is a list
+        if 'players' not in room_doc or room_doc['players'] is None:
+            room_doc['players'] = []
+        
+        # Convert _id to string
+        room_doc['_id'] = str(room_doc['_id'])
+        
+        # Handle game state if it exists
+        if 'game_state' in room_doc and room_doc['game_state']:
+            game_state = room_doc['game_state']
+            # Ensure players exists in game state
+            if 'players' in game_state:
+                for player in game_state['players']:
+                    if player.get('role_info') and isinstance(player['role_info'].get('role'), dict):
+                        player['role_info']['role'] = player['role_info']['role'].get('value')
+            room_doc['game_state'] = game_state
+        else:
+            room_doc['game_state'] = None
+        
+        logger.debug("Room data before creating model: %s", room_doc)
+        return Room(**room_doc)
+
+    @staticmethod
+    async def get_room(room_code: str, enrich: bool = True) -> Optional[Room]:
+        """
+        Get room by code.
+        Internal callers that only check room state can pass enrich=False
+        to skip refreshing player details from the users collection.
+        """
         try:
-            room_doc = await mongodb.db.rooms.find_one({"code": room_code})
+            if live_rooms.enabled:
+                live_room = await live_rooms.get(room_code)
+                room_doc = live_room.to_doc() if live_room else None
+                # Live players keep the details captured when they joined
+                enrich = False
+            else:
+                room_doc = await mongodb.db.rooms.find_one({"code": room_code})
             if room_doc:
-                # Ensure players exists and is a list
-                if 'players' not in room_doc or room_doc['players'] is None:
-                    room_doc['players'] = []
-                
-                # Enrich each player with user data
-                enriched_players = []
-                for player in room_doc['players']:
-                    try:
-                        enriched_player = await RoomService._enrich_player_data(player)
-                        enriched_players.append(enriched_player)
-                    except Exception as e:
-                        logger.error("Error enriching player data: %s", str(e))
-                        continue
-                    
-                room_doc['players'] = enriched_players
-                
-                # Convert _id to string
-                room_doc['_id'] = str(room_doc['_id'])
-                
-                # Handle game state if it exists
-                if 'game_state' in room_doc and room_doc['game_state']:
-                    game_state = room_doc['game_state']
-                    # Ensure players exists in game state
-                    if 'players' in game_state:
-                        for player in game_state['players']:
-                            if player.get('role_info') and isinstance(player['role_info'].get('role'), dict):
-                                player['role_info']['role'] = player['role_info']['role'].get('value')
-                    room_doc['game_state'] = game_state
-                else:
-                    room_doc['game_state'] = None
-                
-                logger.debug("Room data before creating model: %s", room_doc)
-                return Room(**room_doc)
+                # Enrich all players with user data in one lookup
+                if enrich and room_doc.get('players'):
+                    room_doc['players'] = await RoomService._enrich_players(room_doc['players'])
+                return RoomService._room_from_doc(room_doc)
             return None
         except Exception as e:
             logger.error("Error getting room: %s", str(e))
             logger.debug("Room document: %s", room_doc if 'room_doc' in locals() else 'Not found')
             raise
     
+    @staticmethod
+    async def get_room_version(room_code: str) -> Optional[tuple]:
+        """(room id, version) without loading the room: from memory in live mode, else a projected read"""
+        if live_rooms.enabled:
+            live_room = await live_rooms.get(room_code)
+            return (str(live_room.id), live_room.version) if live_room else None
+        room_doc = await mongodb.db.rooms.find_one({"code": room_code}, {"version": 1})
+        return (str(room_doc["_id"]), room_doc.get("version", 0)) if room_doc else None
+
+    @staticmethod
+    async def _explain_failed_update(room_code: str, user_id: str) -> dict:
+        """
+        Read back a room after a conditional update matched nothing,
+        raising the usual errors for a missing room or a non-member.
+        Only runs on the failure path, so successful mutations stay at one round trip.
+        """
+        room_doc = await mongodb.db.rooms.find_one(
+            {"code": room_code},
+            {"players.user_id": 1, "num_players": 1, "host": 1, "room_state": 1}
+        )
+        if not room_doc:
+            raise ValueError("Room not found")
+        room_doc["is_member"] = any(p["user_id"] == user_id for p in room_doc.get("players") or [])
+        return room_doc
+
     @staticmethod
     async def join_room(room_code: str, user: User) -> Room:
         try:
-            # Check if room exists
-            room = await RoomService.get_room(room_code)
-            if not room:
-                raise ValueError("Room not found")
-            
-            # Check if user is already in the room
-            if any(p.user_id == str(user.id) for p in room.players):
-                logger.debug("User %s already in room %s", user.id, room_code)
-                return room
-            
-            # Check if room is full
-            if len(room.players) >= room.num_players:
-                raise ValueError("Room is full")
+            user_id = str(user.id)
             
             # Add player to room with additional user info
             new_player = PlayerState(
-                user_id=str(user.id),
+                user_id=user_id,
                 nickname=user.nickname,
                 full_name=user.full_name,
                 email=user.email,
@@ -166,26 +272,40 @@ class RoomService:
             
             logger.debug("Adding player to room: %s", new_player.model_dump())
             
-            result = await mongodb.db.rooms.update_one(
-                {"code": room_code},
-                {"$push": {"players": new_player.model_dump()}}
-            )
-            
-            if result.modified_count == 0:
-                raise ValueError("Failed to join room")
+            if live_rooms.enabled:
+                room = await RoomService.get_room(room_code)
+                if not room:
+                    raise ValueError("Room not found")
+                if any(p.user_id == user_id for p in room.players):
+                    logger.debug("User %s already in room %s", user.id, room_code)
+                    return room
+                if len(room.players) >= room.num_players:
+                    raise ValueError("Room is full")
+                live_rooms.update(room_code, lambda live: live.players.append(new_player.model_dump()))
+                updated_room = await RoomService.get_room(room_code)
+            else:
+                # Membership and capacity are checked by the filter, so concurrent joins cannot overfill
+                room_doc = await mongodb.db.rooms.find_one_and_update(
+                    {
+                        "code": room_code,
+                        "players.user_id": {"$ne": user_id},
+                        "$expr": {"$lt": [{"$size": "$players"}, "$num_players"]}
+                    },
+                    {"$push": {"players": new_player.model_dump()}, "$inc": {"version": 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if room_doc is None:
+                    existing = await RoomService._explain_failed_update(room_code, user_id)
+                    if existing["is_member"]:
+                        logger.debug("User %s already in room %s", user.id, room_code)
+                        return await RoomService.get_room(room_code)
+                    raise ValueError("Room is full")
+                updated_room = RoomService._room_from_doc(room_doc)
             
-            updated_room = await RoomService.get_room(room_code)
             logger.debug("Room after join: %s", updated_room.model_dump())
             
             # Broadcast update after successful join using unified broadcast
-            await manager.broadcast(
-                room_code,
-                {
-                    "type": "room_update",
-                    "room": updated_room.model_dump(),
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            await RoomService.broadcast_room_change(updated_room)
             return updated_room
             
         except Exception as e:
@@ -195,43 +315,43 @@ class RoomService:
     @staticmethod
     async def toggle_ready(room_code: str, user: User) -> Room:
         try:
-            # Get current player state
-            room = await RoomService.get_room(room_code)
-            if not room:
-                raise ValueError("Room not found")
-            
-            player = next((p for p in room.players if p.user_id == str(user.id)), None)
-            if not player:
-                raise ValueError("User not in room")
-            
-            # Toggle ready state
-            new_state = "not_ready" if player.state == "ready" else "ready"
-            logger.debug("Toggling player %s state to: %s", user.nickname, new_state)
-            
-            # Update in database
-            result = await mongodb.db.rooms.update_one(
-                {
-                    "code": room_code,
-                    "players.user_id": str(user.id)
-                },
-                {"$set": {"players.$.state": new_state}}
-            )
-            
-            if result.modified_count == 0:
-                raise ValueError("Failed to update ready state")
-            
-            # Get updated room
-            updated_room = await RoomService.get_room(room_code)
+            user_id = str(user.id)
+            logger.debug("Toggling ready state of player %s", user.nickname)
+            
+            if live_rooms.enabled:
+                live_room = await live_rooms.get(room_code)
+                if not live_room:
+                    raise ValueError("Room not found")
+                player = live_room.find_player(user_id)
+                if not player:
+                    raise ValueError("User not in room")
+                new_state = "not_ready" if player["state"] == "ready" else "ready"
+                live_rooms.update(room_code, lambda live: player.update(state=new_state))
+                updated_room = await RoomService.get_room(room_code)
+            else:
+                # Flip the state inside the update so a double click can't race a stale read
+                room_doc = await mongodb.db.rooms.find_one_and_update(
+                    {"code": room_code, "players.user_id": user_id},
+                    [{"$set": {**BUMP_VERSION, "players": {"$map": {
+                        "input": "$players",
+                        "as": "p",
+                        "in": {"$cond": [
+                            {"$eq": ["$$p.user_id", user_id]},
+                            {"$mergeObjects": ["$$p", {"state": {"$cond": [
+                                {"$eq": ["$$p.state", "ready"]}, "not_ready", "ready"
+                            ]}}]},
+                            "$$p"
+                        ]}
+                    }}}}],
+                    return_document=ReturnDocument.AFTER
+                )
+                if room_doc is None:
+                    await RoomService._explain_failed_update(room_code, user_id)
+                    raise ValueError("User not in room")
+                updated_room = RoomService._room_from_doc(room_doc)
             
             # Broadcast using unified system
-            await manager.broadcast(
-                room_code,
-                {
-                    "type": "room_update",
-                    "room": updated_room.model_dump(),
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            await RoomService.broadcast_room_change(updated_room)
             
             return updated_room
             
@@ -239,37 +359,105 @@ class RoomService:
             logger.error("Error in toggle_ready: %s", str(e))
             raise
 
+    @staticmethod
+    async def update_player_profile(user_id: str, profile: dict):
+        """Copy a user's new nickname or full name into every room they play in, and tell those rooms"""
+        changed = []
+        if live_rooms.enabled:
+            def rename(live):
+                live.players = [dict(p, **profile) if p["user_id"] == user_id else p for p in live.players]
+            for code, live_room in list(live_rooms.rooms.items()):
+                if live_room.find_player(user_id):
+                    live_rooms.update(code, rename)
+                    changed.append(code)
+
+        # Rooms this worker does not hold in memory (all of them without live rooms) are renamed in Mongo
+        query = {"players.user_id": user_id}
+        if live_rooms.enabled:
+            query["code"] = {"$nin": list(live_rooms.rooms) + list(live_rooms.deleted)}
+        stored = await mongodb.db.rooms.distinct("code", query)
+        if stored:
+            await mongodb.db.rooms.update_many(
+                {"players.user_id": user_id, "code": {"$in": stored}},
+                {
+                    "$set": {f"players.$.{key}": value for key, value in profile.items()},
+                    "$inc": {"version": 1}
+                }
+            )
+            changed.extend(stored)
+
+        for code in changed:
+            room = await RoomService.get_room(code)
+            if room:
+                await RoomService.broadcast_room_change(room)
+
     @staticmethod
     async def leave_room(room_code: str, user: User) -> Room:
+        return await RoomService.remove_player(room_code, str(user.id))
+
+    @staticmethod
+    async def remove_player(room_code: str, user_id: str, lobby_only: bool = False) -> Room:
+        """
+        Take a player out of a room, handing over the host role and deleting the
+        room once it is empty. With lobby_only, rooms with a game running are
+        left alone (ValueError), checked in the same write.
+        """
         try:
-            # Check if room exists
-            room = await RoomService.get_room(room_code)
-            if not room:
-                raise ValueError("Room not found")
-            
-            # Check if user is in the room
-            if not any(p.user_id == str(user.id) for p in room.players):
-                raise ValueError("User not in room")
-            
-            # Store if user was host before removing
-            was_host = room.host == str(user.id)
-            
-            # Remove player from room
-            result = await mongodb.db.rooms.update_one(
-                {"code": room_code},
-                {"$pull": {"players": {"user_id": str(user.id)}}}
-            )
-            
-            if result.modified_count == 0:
-                raise ValueError("Failed to leave room")
-            
-            # Get updated room state
-            updated_room = await RoomService.get_room(room_code)
-            
-            # If room is empty or user was host
+            if live_rooms.enabled:
+                live_room = await live_rooms.get(room_code)
+                if not live_room:
+                    raise ValueError("Room not found")
+                if not live_room.find_player(user_id):
+                    raise ValueError("User not in room")
+                if lobby_only and live_room.room_state != "lobby":
+                    raise ValueError("Game in progress")
+                
+                def remove_player(live):
+                    live.players = [p for p in live.players if p["user_id"] != user_id]
+                    # Assign new host if previous host left
+                    if live.host == user_id and live.players:
+                        live.host = live.players[0]["user_id"]
+                live_rooms.update(room_code, remove_player)
+                updated_room = await RoomService.get_room(room_code)
+            else:
+                # Remove the player and hand the host role to the next player in one update
+                query = {"code": room_code, "players.user_id": user_id}
+                if lobby_only:
+                    query["room_state"] = "lobby"
+                room_doc = await mongodb.db.rooms.find_one_and_update(
+                    query,
+                    [
+                        {"$set": {**BUMP_VERSION, "players": {"$filter": {
+                            "input": "$players",
+                            "cond": {"$ne": ["$$this.user_id", user_id]}
+                        }}}},
+                        {"$set": {"host": {"$cond": [
+                            {"$and": [{"$eq": ["$host", user_id]}, {"$gt": [{"$size": "$players"}, 0]}]},
+                            {"$arrayElemAt": ["$players.user_id", 0]},
+                            "$host"
+                        ]}}}
+                    ],
+                    return_document=ReturnDocument.AFTER
+                )
+                if room_doc is None:
+                    state = await RoomService._explain_failed_update(room_code, user_id)
+                    if state["is_member"] and lobby_only:
+                        raise ValueError("Game in progress")
+                    raise ValueError("User not in room")
+                updated_room = RoomService._room_from_doc(room_doc)
+            
+            # If room is empty
             if not updated_room.players:
                 # Delete room if empty
-                await mongodb.db.rooms.delete_one({"code": room_code})
+                if live_rooms.enabled:
+                    live_rooms.delete(room_code)
+                else:
+                    # Only if nobody joined in the meantime; if someone did, the room lives on
+                    result = await mongodb.db.rooms.delete_one({"code": room_code, "players": {"$size": 0}})
+                    if result.deleted_count != 1:
+                        logger.debug("Room %s was joined before it could be deleted", room_code)
+                        return updated_room
+                room_code_allocator.release(room_code)
                 # Broadcast room deletion
                 await manager.broadcast(
                     room_code,
@@ -279,37 +467,31 @@ class RoomService:
                         "room_code": room_code
                     }
                 )
+                manager.drop_room(room_code)
+                room_snapshots.pop(room_code)
                 return updated_room
-            elif was_host:
-                # Assign new host if previous host left
-                new_host = updated_room.players[0].user_id
-                await mongodb.db.rooms.update_one(
-                    {"code": room_code},
-                    {"$set": {"host": new_host}}
-                )
-                updated_room = await RoomService.get_room(room_code)
             
+            if updated_room.room_state == "in_game" and updated_room.game_type == "mafia":
+                # Imported here: the engine itself builds on RoomService
+                from services.mafia_engine import MafiaEngine
+                await MafiaEngine.remove_player(room_code, user_id)
+                updated_room = await RoomService.get_room(room_code)
+
             # Broadcast using unified system
-            await manager.broadcast(
-                room_code,
-                {
-                    "type": "room_update",
-                    "room": updated_room.model_dump(),
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            await RoomService.broadcast_room_change(updated_room)
             
             return updated_room
             
         except Exception as e:
-            logger.error("Error in leave_room: %s", str(e))
+            logger.error("Error removing player from room %s: %s", room_code, str(e))
             raise
     
     @staticmethod
     async def start_game(room_code: str, user: User) -> Room:
         try:
             logger.info("Starting game in room %s", room_code)
-            room = await RoomService.get_room(room_code)
+            # Stored player details are kept current, so no users lookup is needed
+            room = await RoomService.get_room(room_code, enrich=False)
             if not room:
                 raise ValueError("Room not found")
             
@@ -324,12 +506,14 @@ class RoomService:
             if len(room.players) != room.num_players:
                 raise ValueError("Not all players have joined")
             
-            # Initialize game state based on game type
+            # Initialize the public game state and each player's private view based on game type
             if room.game_type == "mafia":
                 logger.info("Initializing Mafia game")
                 try:
                     mafia_players = MafiaService.assign_roles(room)
                     game_state = MafiaService.create_game_state(mafia_players)
+                    player_views = MafiaService.create_player_views(mafia_players)
+                    phase_state = MafiaService.create_phase_state(mafia_players)
                 except Exception as e:
                     logger.error("Error in Mafia game initialization: %s", str(e))
                     raise ValueError(f"Failed to initialize Mafia game: {str(e)}")
@@ -342,6 +526,8 @@ class RoomService:
                         location,
                         room.game_config.get("roundMinutes", 8)
                     )
+                    player_views = SpyfallService.create_player_views(spyfall_players)
+                    phase_state = None
                 except Exception as e:
                     logger.error("Error in Spyfall game initialization: %s", str(e))
                     raise ValueError(f"Failed to initialize Spyfall game: {str(e)}")
@@ -349,30 +535,49 @@ class RoomService:
                 raise ValueError(f"Unsupported game type: {room.game_type}")
             
             # Update room with game state
-            result = await mongodb.db.rooms.update_one(
-                {"code": room_code},
-                {"$set": {
-                    "room_state": "in_game",
-                    "game_state": game_state
-                }}
-            )
-            
-            if result.modified_count == 0:
-                raise ValueError("Failed to update room state")
+            if live_rooms.enabled:
+                # Assigning roles may have awaited; every change since the read bumped the version
+                live_room = live_rooms.rooms.get(room_code)
+                if live_room is None or live_room.version != room.version or live_room.room_state != "lobby":
+                    raise ValueError("Room changed before the game could start")
+                live_rooms.update(room_code, lambda live: live.set(
+                    room_state="in_game", game_state=game_state, player_views=player_views, phase_state=phase_state
+                ))
+                updated_room = await RoomService.get_room(room_code)
+            else:
+                # Re-check the lobby conditions in the write itself: a player who left or
+                # un-readied since the read above makes the update match nothing
+                player_ids = [p.user_id for p in room.players]
+                room_doc = await mongodb.db.rooms.find_one_and_update(
+                    {
+                        "code": room_code,
+                        "host": str(user.id),
+                        "room_state": "lobby",
+                        "players": {"$size": len(player_ids), "$not": {"$elemMatch": {"state": {"$ne": "ready"}}}},
+                        "players.user_id": {"$all": player_ids}
+                    },
+                    {"$set": {
+                        "room_state": "in_game",
+                        "game_state": game_state,
+                        "player_views": player_views,
+                        "phase_state": phase_state
+                    }, "$inc": {"version": 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+                
+                if room_doc is None:
+                    raise ValueError("Room changed before the game could start")
+                updated_room = RoomService._room_from_doc(room_doc)
             
             logger.info("Broadcasting game start for room %s", room_code)
-            # Broadcast game started to all players with game state
+            # One public frame for the whole room, then each player's own role
             await manager.broadcast(
                 room_code,
-                {
-                    "type": "game_started",
-                    "game_type": room.game_type,
-                    "room_code": room.code,
-                    "game_state": game_state
-                }
+                RoomService.game_started_frame(room, game_state)
             )
+            await RoomService.send_player_views(room_code, player_views)
             
-            return await RoomService.get_room(room_code)
+            return updated_room
             
         except Exception as e:
             logger.error("Error in start_game: %s", str(e))
@@ -382,59 +587,62 @@ class RoomService:
     async def restart_game(room_code: str, user: User) -> Room:
         try:
             logger.info("Attempting to restart game for room: %s", room_code)
-            room = await RoomService.get_room(room_code)
-            if not room:
-                raise ValueError("Room not found")
-            
-            if room.host != str(user.id):
-                raise ValueError("Only the host can restart the game")
-            
-            # Get current players before resetting
-            current_players = []
-            if hasattr(room, 'players') and room.players:
-                for player in room.players:
-                    try:
-                        player_data = {
-                            "user_id": str(player.user_id),  # Ensure user_id is string
-                            "nickname": player.nickname,
-                            "full_name": getattr(player, 'full_name', None),
-                            "email": getattr(player, 'email', None),
-                            "state": "not_ready"
-                        }
-                        current_players.append(player_data)
-                        logger.debug("Processed player: %s", player_data)
-                    except Exception as e:
-                        logger.error("Error processing player %s: %s", player, str(e))
-                        continue
-            
-            logger.info("Resetting room with %d players", len(current_players))
-            
-            # Reset room state
-            update_data = {
-                "room_state": "lobby",
-                "game_state": None,
-                "players": current_players
-            }
-            
-            # Update the room
-            result = await mongodb.db.rooms.update_one(
-                {"code": room_code},
-                {"$set": update_data}
-            )
-            
-            if result.modified_count == 0:
-                logger.warning("No modifications made to room")
-                # Get the current room state to verify
-                current_room = await mongodb.db.rooms.find_one({"code": room_code})
-                logger.debug("Current room state: %s", current_room)
-                raise ValueError("Failed to restart game")
-            
-            # Get and return updated room
-            updated_room = await RoomService.get_room(room_code)
-            if not updated_room:
-                raise ValueError("Failed to get updated room state")
+            user_id = str(user.id)
+            
+            if live_rooms.enabled:
+                live_room = await live_rooms.get(room_code)
+                if not live_room:
+                    raise ValueError("Room not found")
+                if live_room.host != user_id:
+                    raise ValueError("Only the host can restart the game")
+                
+                logger.info("Resetting room with %d players", len(live_room.players))
+                
+                def reset(live):
+                    # Reset room state
+                    live.set(
+                        room_state="lobby",
+                        game_state=None,
+                        player_views=None,
+                        phase_state=None,
+                        players=[dict(p, state="not_ready") for p in live.players]
+                    )
+                live_rooms.update(room_code, reset)
+                updated_room = await RoomService.get_room(room_code)
+            else:
+                # Reset room state and every player's ready flag in one host-only update
+                room_doc = await mongodb.db.rooms.find_one_and_update(
+                    {"code": room_code, "host": user_id},
+                    [{"$set": {
+                        **BUMP_VERSION,
+                        "room_state": "lobby",
+                        "game_state": None,
+                        "player_views": None,
+                        "phase_state": None,
+                        "players": {"$map": {
+                            "input": "$players",
+                            "as": "p",
+                            "in": {"$mergeObjects": ["$$p", {"state": "not_ready"}]}
+                        }}
+                    }}],
+                    return_document=ReturnDocument.AFTER
+                )
+                if room_doc is None:
+                    await RoomService._explain_failed_update(room_code, user_id)
+                    raise ValueError("Only the host can restart the game")
+                updated_room = RoomService._room_from_doc(room_doc)
             
             logger.info("Room %s successfully restarted", room_code)
+            # Send players back to the lobby, then show them the reset room
+            await manager.broadcast(
+                room_code,
+                {
+                    "type": "game_ended",
+                    "event": "restart",
+                    "room_code": updated_room.code
+                }
+            )
+            await RoomService.broadcast_room_change(updated_room)
             return updated_room
             
         except Exception as e:
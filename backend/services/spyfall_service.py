@@ -3,7 +3,7 @@ from random import choice, shuffle
 from models.spyfall import SpyfallPlayer, SpyfallRole, SpyfallRoleInfo
 from models.room import Room
 from datetime import datetime, timedelta
-from services.game_service import GameService
+from services.game_catalog import game_catalog
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,12 +15,11 @@ class SpyfallService:
         try:
             logger.info("Assigning roles for room %s", room.code)
             
-            # Get game data for location images
-            game = await GameService.get_game("spyfall")
+            # Get game data for location images (served from the catalog snapshot)
+            catalog = await game_catalog.get()
+            game = catalog.by_id.get("spyfall")
             if not game:
                 raise ValueError("Spyfall game configuration not found")
-                
-            logger.info("🎮 Game data received:", game.model_dump())
             
             # Get game configuration
             spy_count = room.game_config.get("spyCount", 1)
@@ -33,13 +32,14 @@ class SpyfallService:
             selected_location = choice(locations)
             logger.debug("Selected location: %s", selected_location)
             
-            # Get location image if available
-            location_image = game.locations.get(selected_location) if game.locations else None
+            # Get location image if available, as the full URL the catalog resolved once per game
+            location_image = catalog.location_urls[game.id].get(selected_location)
             logger.info(f"🎯 Selected location image: {location_image}")
             
             if not location_image:
                 logger.warning(f"⚠️ No image found for location {selected_location}")
                 logger.warning(f"⚠️ Available locations: {available_locations}")
+            location_image_variants = (game.location_variants or {}).get(selected_location, [])
             
             # Prepare player list
             players = list(room.players)
@@ -70,6 +70,7 @@ class SpyfallService:
                         role=SpyfallRole.REGULAR,
                         location=selected_location,
                         location_image=location_image,
+                        location_image_variants=location_image_variants,
                         description=f"You are at the {selected_location}. Find the spy!"
                     )
                 ))
@@ -91,22 +92,18 @@ class SpyfallService:
 
     @staticmethod
     def create_game_state(players: List[SpyfallPlayer], location: str, round_minutes: int) -> Dict:
-        """Create initial game state"""
+        """Create the initial public game state; the location stays in the regular players' views"""
         try:
             # Calculate round end time
             # Ensure we're using UTC time
             current_time = datetime.utcnow()
             round_end_time = (current_time + timedelta(minutes=2)).isoformat() + 'Z'
             
-            # Serialize players with proper role handling
-            serialized_players = []
-            for player in players:
-                player_data = player.model_dump()
-                serialized_players.append(player_data)
-
             game_state = {
-                "players": serialized_players,
-                "location": location,
+                "players": [
+                    {"user_id": player.user_id, "nickname": player.nickname}
+                    for player in players
+                ],
                 "round_end_time": round_end_time
             }
             
@@ -115,4 +112,12 @@ class SpyfallService:
             
         except Exception as e:
             logger.error("Error creating game state: %s", str(e))
-            raise 
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def create_player_views(players: List[SpyfallPlayer]) -> Dict[str, Dict]:
+        """Each player's private view (spy or location) by user id"""
+        return {
+            player.user_id: {"role_info": player.role_info.model_dump(mode="json")}
+            for player in players
+        }
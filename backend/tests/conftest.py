@@ -0,0 +1,140 @@
+import os
+
+# The settings are read on import and refuse to load without these
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DB", "buzz_test")
+
+from typing import Dict, List  # noqa: E402
+import asyncio  # noqa: E402
+import uuid  # noqa: E402
+import pytest  # noqa: E402
+import mongomock.aggregate  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+from core.backplane import Backplane  # noqa: E402
+from core.mongodb import mongodb  # noqa: E402
+from core.serialization import loads  # noqa: E402
+from core.websocket import ConnectionManager, manager  # noqa: E402
+from models.user import User  # noqa: E402
+from services.live_room_store import live_rooms  # noqa: E402
+
+
+# mongomock does not know $mergeObjects, which the room updates use in pipeline updates
+_parse = mongomock.aggregate._Parser.parse
+
+
+def _parse_merge_objects(self, expression):
+    if isinstance(expression, dict) and list(expression) == ["$mergeObjects"]:
+        merged = {}
+        for part in expression["$mergeObjects"]:
+            merged.update(self.parse(part) or {})
+        return merged
+    return _parse(self, expression)
+
+
+mongomock.aggregate._Parser.parse = _parse_merge_objects
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeWebSocket:
+    """Records what the server sends; `delay` makes every send take that long"""
+
+    def __init__(self, user_id: str = "", delay: float = 0.0):
+        self.user_id = user_id
+        self.delay = delay
+        self.sent: List[str] = []
+        self.closed_with = None
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text(data)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+    def messages(self) -> List[dict]:
+        return [loads(text) for text in self.sent]
+
+
+class LinkedBackplane(Backplane):
+    """In-process backplane: what one manager publishes reaches every other linked one"""
+
+    def __init__(self, network: List["LinkedBackplane"]):
+        super().__init__()
+        self.network = network
+        network.append(self)
+
+    async def publish(self, channel: str, payload: bytes):
+        for peer in self.network:
+            if peer is not self:
+                await peer._dispatch(channel, payload)
+
+
+async def drain():
+    """Let writer and publish tasks run"""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def linked_managers():
+    """Two managers, as on two workers, relaying through a LinkedBackplane"""
+    network: List[LinkedBackplane] = []
+    managers = [ConnectionManager(ping_interval=0, coalesce_window=0) for _ in range(2)]
+    for worker in managers:
+        await worker.start(LinkedBackplane(network))
+    yield managers
+    for worker in managers:
+        await worker.stop()
+
+
+@pytest.fixture
+async def db():
+    mongodb.client = AsyncMongoMockClient()
+    mongodb.db = mongodb.client["buzz_test"]
+    yield mongodb.db
+    mongodb.client = None
+    mongodb.db = None
+
+
+@pytest.fixture(params=[False, True], ids=["stored", "live"])
+async def rooms(request, db, monkeypatch):
+    """Run a test against Mongo-backed rooms and against the live room store"""
+    monkeypatch.setattr(live_rooms, "enabled", request.param)
+    live_rooms.rooms.clear()
+    live_rooms.dirty.clear()
+    live_rooms.deleted.clear()
+    yield request.param
+    live_rooms.rooms.clear()
+    live_rooms.dirty.clear()
+    live_rooms.deleted.clear()
+
+
+@pytest.fixture
+def sent(monkeypatch) -> Dict[str, List[dict]]:
+    """Capture what the global manager broadcasts and sends to single users"""
+    captured: Dict[str, List[dict]] = {"broadcast": [], "private": []}
+
+    async def broadcast_frame(room_id, frame, *args):
+        captured["broadcast"].append(loads(frame))
+
+    async def send_to_user(room_id, user_id, message, *args):
+        captured["private"].append({"user_id": user_id, **(loads(message) if isinstance(message, str) else message)})
+
+    monkeypatch.setattr(manager, "_broadcast_frame", broadcast_frame)
+    monkeypatch.setattr(manager, "send_to_user", send_to_user)
+    return captured
+
+
+def make_users(count: int) -> List[User]:
+    return [
+        User(id=uuid.uuid4(), email=f"player{i}@example.com", full_name=f"Player {i}", nickname=f"player{i}")
+        for i in range(count)
+    ]
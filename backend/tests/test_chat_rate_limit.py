@@ -0,0 +1,97 @@
+import pytest
+from core.cache import TTLCache
+from core.config import settings
+from services.chat_service import ChatRateLimited, ChatRateLimiter, ChatService, chat_rate_limiter, chat_writer
+from tests.conftest import make_users
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    """Stands in for time.monotonic, which both the limiter and its TTLCache read"""
+    clock = Clock()
+    monkeypatch.setattr("time.monotonic", clock)
+    return clock
+
+
+def test_burst_is_allowed_then_limited(clock):
+    limiter = ChatRateLimiter(burst=3, period=3.0)
+
+    assert [limiter.allow("1234", "a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.limited == 1
+
+
+def test_tokens_refill_over_the_period(clock):
+    limiter = ChatRateLimiter(burst=3, period=3.0)
+    for _ in range(3):
+        limiter.allow("1234", "a")
+
+    clock.now += 0.5
+    assert not limiter.allow("1234", "a")
+    clock.now += 0.5
+    assert limiter.allow("1234", "a")
+    assert not limiter.allow("1234", "a")
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    limiter = ChatRateLimiter(burst=2, period=2.0)
+    limiter.allow("1234", "a")
+
+    clock.now += 60
+    assert [limiter.allow("1234", "a") for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_per_room_and_user(clock):
+    limiter = ChatRateLimiter(burst=1, period=1.0)
+
+    assert limiter.allow("1234", "a")
+    assert not limiter.allow("1234", "a")
+    assert limiter.allow("1234", "b")
+    assert limiter.allow("5678", "a")
+
+
+def test_quiet_users_are_forgotten(clock):
+    limiter = ChatRateLimiter(burst=1, period=1.0)
+    limiter.allow("1234", "a")
+
+    clock.now += 1.0
+    assert limiter.buckets.get(("1234", "a")) is None
+
+
+@pytest.fixture
+def chat(clock, sent, monkeypatch):
+    monkeypatch.setattr(chat_rate_limiter, "buckets", TTLCache(1000, settings.CHAT_RATE_LIMIT_SECONDS))
+    monkeypatch.setattr(chat_writer, "pending", [])
+    return sent
+
+
+async def test_limited_messages_are_neither_sent_nor_stored(chat):
+    user, = make_users(1)
+    for i in range(settings.CHAT_RATE_LIMIT_MESSAGES):
+        await ChatService.post_message("1234", user, f"message {i}")
+
+    with pytest.raises(ChatRateLimited):
+        await ChatService.post_message("1234", user, "one too many")
+
+    assert len(chat["broadcast"]) == settings.CHAT_RATE_LIMIT_MESSAGES
+    assert [doc["text"] for doc in chat_writer.pending][-1] == f"message {settings.CHAT_RATE_LIMIT_MESSAGES - 1}"
+
+
+async def test_invalid_messages_do_not_use_up_the_limit(chat):
+    user, = make_users(1)
+    for text in ("", "   ", "x" * (settings.CHAT_MESSAGE_MAX_LENGTH + 1)):
+        with pytest.raises(ValueError):
+            await ChatService.post_message("1234", user, text)
+
+    for i in range(settings.CHAT_RATE_LIMIT_MESSAGES):
+        await ChatService.post_message("1234", user, f"message {i}")
+    assert len(chat_writer.pending) == settings.CHAT_RATE_LIMIT_MESSAGES
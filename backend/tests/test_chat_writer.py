@@ -0,0 +1,60 @@
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from services.chat_service import ChatWriter, DUPLICATE_KEY
+
+pytestmark = pytest.mark.anyio
+
+
+def messages(count: int):
+    return [{"_id": ObjectId(), "room_code": "1234", "text": f"message {i}"} for i in range(count)]
+
+
+async def test_batch_is_stored_in_one_insert(db):
+    writer = ChatWriter(flush_interval=60, batch_size=100)
+    for doc in messages(3):
+        writer.add(doc)
+
+    await writer.flush()
+
+    assert await db.chat_messages.count_documents({}) == 3
+    assert (writer.pending, writer.flushes, writer.written) == ([], 1, 3)
+
+
+async def test_failed_insert_keeps_the_batch_ahead_of_newer_messages(db, monkeypatch):
+    writer = ChatWriter(flush_interval=60, batch_size=100)
+    batch, newer = messages(2), messages(1)
+    for doc in batch:
+        writer.add(doc)
+
+    async def unreachable(collection, docs, ordered):
+        writer.add(newer[0])
+        raise ConnectionError("Mongo is unreachable")
+
+    monkeypatch.setattr(type(db.chat_messages), "insert_many", unreachable)
+    with pytest.raises(ConnectionError):
+        await writer.flush()
+
+    assert writer.pending == batch + newer
+
+
+async def test_only_the_messages_that_failed_are_requeued(db, monkeypatch):
+    writer = ChatWriter(flush_interval=60, batch_size=100)
+    batch = messages(3)
+    for doc in batch:
+        writer.add(doc)
+
+    async def partly_failing(collection, docs, ordered):
+        assert not ordered
+        # Unordered: the first one was stored by an earlier try, the second went in now
+        raise BulkWriteError({"writeErrors": [
+            {"index": 0, "code": DUPLICATE_KEY, "errmsg": "duplicate key"},
+            {"index": 2, "code": 91, "errmsg": "shutdown in progress"}
+        ]})
+
+    monkeypatch.setattr(type(db.chat_messages), "insert_many", partly_failing)
+    with pytest.raises(RuntimeError):
+        await writer.flush()
+
+    assert writer.pending == [batch[2]]
+    assert writer.written == 2
@@ -0,0 +1,94 @@
+import pytest
+from fastapi import Response
+from starlette.requests import Request
+from api import game as game_api
+from api import room as room_api
+from core.etag import RenderedJSON, etag_matches, make_etag
+from core.serialization import loads
+from models.room import RoomCreate
+from services.game_catalog import game_catalog
+from services.room_service import RoomService
+from tests.conftest import make_users
+from tests.test_spyfall import SPYFALL
+
+pytestmark = pytest.mark.anyio
+
+
+def request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"room-1"', True),
+    ('W/"room-1"', True),
+    ('"room-0", "room-1"', True),
+    ("*", True),
+    ('"room-2"', False),
+])
+def test_if_none_match(header, matches):
+    assert etag_matches(request(header), make_etag("room", 1)) is matches
+
+
+def test_rendered_json_answers_304_for_its_own_etag():
+    rendered = RenderedJSON.of({"name": "Mafia"})
+
+    fresh = rendered.respond(request())
+    assert fresh.status_code == 200
+    assert fresh.body == rendered.body
+    assert fresh.headers["etag"] == rendered.etag
+
+    revalidated = rendered.respond(request(rendered.etag))
+    assert revalidated.status_code == 304
+    assert revalidated.body == b""
+    assert revalidated.headers["etag"] == rendered.etag
+    assert revalidated.headers["cache-control"] == "no-cache"
+
+
+def test_etag_follows_the_content():
+    assert RenderedJSON.of({"a": 1}).etag == RenderedJSON.of({"a": 1}).etag
+    assert RenderedJSON.of({"a": 1}).etag != RenderedJSON.of({"a": 2}).etag
+
+
+async def test_catalog_etag_changes_when_the_catalog_does(db):
+    await db.games.insert_one(SPYFALL)
+    await game_catalog.reload()
+    try:
+        first = await game_api.get_games(request())
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert (await game_api.get_games(request(etag))).status_code == 304
+
+        await db.games.update_one({"_id": "spyfall"}, {"$set": {"max_players": 10}})
+        await game_catalog.reload()
+
+        changed = await game_api.get_games(request(etag))
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert loads(changed.body)[0]["max_players"] == 10
+    finally:
+        game_catalog.snapshot = None
+
+
+async def test_room_revalidates_until_it_changes(rooms, db):
+    host, guest = make_users(2)
+    room = await RoomService.create_room(
+        RoomCreate(game_type="mafia", num_players=6, game_config={"roles": {"mafia": 1, "civilian": 5}}), host
+    )
+
+    response = Response()
+    await room_api.get_room(room.code, request(), response, current_user=host)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == room_api.ROOM_CACHE_CONTROL
+
+    not_modified = await room_api.get_room(room.code, request(etag), Response(), current_user=host)
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+    await RoomService.join_room(room.code, guest)
+
+    response = Response()
+    changed = await room_api.get_room(room.code, request(etag), response, current_user=host)
+    assert len(changed.players) == 2
+    assert response.headers["etag"] != etag
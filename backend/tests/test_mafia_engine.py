@@ -0,0 +1,181 @@
+from typing import Dict, List
+import pytest
+from core.mongodb import mongodb
+from core.websocket import manager
+from models.room import RoomCreate
+from models.user import User
+from services.live_room_store import live_rooms
+from services.mafia_engine import MafiaEngine
+from services.mafia_service import MafiaService
+from services.room_service import RoomService
+from tests.conftest import make_users
+
+pytestmark = pytest.mark.anyio
+
+ROLES = {"mafia": 1, "doctor": 1, "police": 1, "civilian": 3}
+
+
+class Game:
+    """A started six-player Mafia room and who plays which role"""
+
+    def __init__(self, code: str, by_role: Dict[str, List[User]]):
+        self.code = code
+        self.mafia = by_role["mafia"][0]
+        self.doctor = by_role["doctor"][0]
+        self.police = by_role["police"][0]
+        self.civilians = by_role["civilian"]
+
+    async def act(self, user: User, phase: str, target: User) -> dict:
+        return await MafiaEngine.act(self.code, user, phase, str(target.id))
+
+    async def phase_state(self) -> dict:
+        if live_rooms.enabled:
+            return (await live_rooms.get(self.code)).phase_state
+        return (await mongodb.db.rooms.find_one({"code": self.code}))["phase_state"]
+
+    async def game_state(self) -> dict:
+        return (await RoomService.get_room(self.code)).game_state
+
+
+@pytest.fixture
+async def game(rooms, sent) -> Game:
+    users = make_users(6)
+    room = await RoomService.create_room(
+        RoomCreate(game_type="mafia", num_players=6, game_config={"roles": ROLES}), users[0]
+    )
+    for user in users[1:]:
+        await RoomService.join_room(room.code, user)
+    for user in users:
+        await RoomService.toggle_ready(room.code, user)
+    await RoomService.start_game(room.code, users[0])
+    await manager.flush_room(room.code)
+
+    roles = {m["user_id"]: m["role_info"]["role"] for m in sent["private"] if m.get("event") == "role_assigned"}
+    by_role: Dict[str, List[User]] = {}
+    for user in users:
+        by_role.setdefault(roles[str(user.id)], []).append(user)
+    sent["broadcast"].clear()
+    sent["private"].clear()
+    return Game(room.code, by_role)
+
+
+def outcomes(sent) -> List[dict]:
+    return [f for f in sent["broadcast"] if f.get("event") == "phase_resolved"]
+
+
+async def test_night_and_day_resolve_once_everyone_acted(game, sent):
+    victim = game.civilians[0]
+    await game.act(game.mafia, "night", victim)
+    await game.act(game.doctor, "night", game.civilians[1])
+    assert outcomes(sent) == []
+    await game.act(game.police, "night", game.mafia)
+
+    [night] = outcomes(sent)
+    assert night["eliminated"] == str(victim.id) and night["eliminated_role"] == "civilian"
+    assert night["saved"] is False and night["winner"] is None
+    [investigation] = [m for m in sent["private"] if m.get("event") == "investigation_result"]
+    assert investigation["user_id"] == str(game.police.id) and investigation["is_mafia"] is True
+    game_state = await game.game_state()
+    assert (game_state["phase"], game_state["round"]) == ("day", 1)
+    assert game_state["eliminated_players"] == [str(victim.id)]
+    view = await RoomService.get_player_view(game.code, str(game.police.id))
+    assert view["investigations"] == [{"round": 1, "target": str(game.mafia.id), "is_mafia": True}]
+
+    for voter in (game.doctor, game.police, game.civilians[1], game.civilians[2]):
+        await game.act(voter, "day", game.mafia)
+    await game.act(game.mafia, "day", game.civilians[1])
+
+    day = outcomes(sent)[-1]
+    assert day["winner"] == "civilians" and day["votes"][str(game.mafia.id)] == 4
+    assert len(day["roles"]) == 6
+    assert (await game.game_state())["winner"] == "civilians"
+    assert (await game.phase_state())["phase"] == "ended"
+
+
+async def test_doctor_saves_the_mafia_target(game, sent):
+    await game.act(game.mafia, "night", game.civilians[0])
+    await game.act(game.doctor, "night", game.civilians[0])
+    await game.act(game.police, "night", game.civilians[1])
+
+    [night] = outcomes(sent)
+    assert night["saved"] is True and night["eliminated"] is None
+    assert all(p["is_alive"] for p in (await game.game_state())["players"])
+
+
+@pytest.mark.parametrize("actor, phase, target, error", [
+    ("civilian", "night", "mafia", "Your role has no night action"),
+    ("mafia", "day", "civilian", "It is not day time"),
+    ("mafia", "night", "mafia", "The mafia cannot target their own"),
+    ("police", "night", "police", "You cannot target yourself"),
+])
+async def test_invalid_actions_are_refused(game, actor, phase, target, error):
+    players = {"mafia": game.mafia, "police": game.police, "civilian": game.civilians[0]}
+    with pytest.raises(ValueError, match=error):
+        await game.act(players[actor], phase, players[target])
+
+
+async def test_players_act_once_per_phase(game):
+    await game.act(game.mafia, "night", game.civilians[0])
+    with pytest.raises(ValueError, match="already acted"):
+        await game.act(game.mafia, "night", game.civilians[1])
+    assert (await game.phase_state())["pending"] == 2
+
+
+async def test_leaving_during_the_night_resolves_it(game, sent):
+    await game.act(game.mafia, "night", game.civilians[0])
+    await game.act(game.police, "night", game.civilians[1])
+    # The doctor was the last one the night waited for
+    await RoomService.leave_room(game.code, game.doctor)
+
+    [night] = outcomes(sent)
+    assert night["eliminated"] == str(game.civilians[0].id)
+    phase_state = await game.phase_state()
+    assert phase_state["phase"] == "day" and str(game.doctor.id) not in phase_state["alive"]
+    assert phase_state["pending"] == 4
+    players = {p["user_id"]: p["is_alive"] for p in (await game.game_state())["players"]}
+    assert players[str(game.doctor.id)] is False
+
+
+async def test_leaving_during_the_day_resolves_it(game, sent):
+    await game.act(game.mafia, "night", game.civilians[0])
+    await game.act(game.doctor, "night", game.civilians[0])
+    await game.act(game.police, "night", game.civilians[1])
+    target, leaver = game.civilians[1], game.civilians[2]
+    for voter in (game.mafia, game.doctor, game.police, game.civilians[0]):
+        await game.act(voter, "day", target)
+    assert (await game.phase_state())["pending"] == 2
+    await game.act(target, "day", game.mafia)
+    await RoomService.leave_room(game.code, leaver)
+
+    day = outcomes(sent)[-1]
+    assert day["phase"] == "day" and day["eliminated"] == str(target.id)
+    phase_state = await game.phase_state()
+    assert (phase_state["phase"], phase_state["round"]) == ("night", 2)
+    assert set(phase_state["alive"]) == {str(u.id) for u in (game.mafia, game.doctor, game.police, game.civilians[0])}
+
+
+async def test_leaving_withdraws_the_players_action(game, sent):
+    await game.act(game.mafia, "night", game.civilians[0])
+    await game.act(game.doctor, "night", game.civilians[1])
+    await RoomService.leave_room(game.code, game.doctor)
+
+    phase_state = await game.phase_state()
+    assert phase_state["protected"] == [] and str(game.doctor.id) not in phase_state["acted"]
+    assert phase_state["pending"] == 1 and outcomes(sent) == []
+
+
+async def test_mafia_leaving_ends_the_game(game, sent):
+    await game.act(game.mafia, "night", game.civilians[0])
+    await RoomService.leave_room(game.code, game.mafia)
+
+    [outcome] = outcomes(sent)
+    assert outcome["winner"] == "civilians" and outcome["eliminated"] is None
+    assert (await game.phase_state())["phase"] == "ended"
+    with pytest.raises(ValueError, match="The game is over"):
+        await game.act(game.police, "night", game.doctor)
+
+
+def test_drop_player_ignores_players_no_longer_alive():
+    phase_state = MafiaService.next_phase_state("day", 1, {"a": "mafia", "b": "civilian", "c": "civilian"})
+    game_state = {"players": []}
+    assert MafiaService.drop_player(game_state, phase_state, "z") == (game_state, phase_state)
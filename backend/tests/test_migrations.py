@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from core import migrations
+from core.migrations import MIGRATIONS_STATE_ID, MigrationLockLost, run_migrations
+
+pytestmark = pytest.mark.anyio
+
+
+def record(applied):
+    async def step(db):
+        applied.append(len(applied) + 1)
+    return step
+
+
+async def state(db) -> dict:
+    return await db.migrations.find_one({"_id": MIGRATIONS_STATE_ID})
+
+
+async def test_pending_steps_run_once(db, monkeypatch):
+    applied = []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "one", record(applied)), (2, "two", record(applied))])
+
+    await run_migrations()
+    await run_migrations()
+
+    assert applied == [1, 2]
+    current = await state(db)
+    assert (current["version"], current["locked_by"]) == (2, None)
+
+
+async def test_lock_is_renewed_during_a_long_step(db, monkeypatch):
+    renewals = []
+
+    async def long_step(db):
+        started = (await state(db))["locked_at"]
+        await asyncio.sleep(0.05)
+        renewals.append((await state(db))["locked_at"] > started)
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "long index build", long_step)])
+    monkeypatch.setattr(migrations, "LOCK_HEARTBEAT_SECONDS", 0.01)
+
+    await run_migrations()
+
+    assert renewals == [True]
+
+
+async def test_step_is_not_recorded_once_the_lock_was_taken_over(db, monkeypatch):
+    async def overtaken_step(db):
+        # Another worker judged the lock stale and took it while this step ran
+        await db.migrations.update_one({"_id": MIGRATIONS_STATE_ID}, {"$set": {"locked_by": "other:1"}})
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "slow", overtaken_step)])
+
+    with pytest.raises(MigrationLockLost):
+        await run_migrations()
+
+    current = await state(db)
+    assert current["version"] == 0
+    # Still held by the worker that took it over
+    assert current["locked_by"] == "other:1"
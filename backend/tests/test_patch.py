@@ -0,0 +1,128 @@
+import copy
+import pytest
+from core.patch import diff
+from core.serialization import loads
+from core.websocket import ROOM_PATCH, ROOM_SNAPSHOT
+from models.room import PlayerState, Room
+from services.room_service import RoomService, room_snapshots
+
+
+def apply_patch(document, ops):
+    """Apply add/remove/replace ops the way frontend/src/lib/patch.js does"""
+    result = copy.deepcopy(document)
+    for op in ops:
+        keys = [token.replace("~1", "/").replace("~0", "~") for token in op["path"].split("/")[1:]]
+        if not keys:
+            result = copy.deepcopy(op["value"])
+            continue
+        parent = result
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        last = keys[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if op["op"] == "add":
+                parent.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del parent[index]
+            else:
+                parent[index] = op["value"]
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = op["value"]
+    return result
+
+
+def players(*names):
+    return [{"user_id": name, "nickname": name, "state": "not_ready"} for name in names]
+
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": 1}, {"a": 1}),
+    ({"a": 1}, {"a": 2}),
+    ({"a": 1, "b": 2}, {"a": 1}),
+    ({"a": 1}, {"a": 1, "c": {"d": [1, 2]}}),
+    ({"list": [1, 2, 3]}, {"list": [1, 3]}),
+    ({"list": [1, 2, 3]}, {"list": [0, 1, 2, 3, 4]}),
+    ({"list": [1, 2, 3]}, {"list": []}),
+    ({"value": None}, {"value": {"nested": "x"}}),
+    ({"a/b": 1, "c~d": 2}, {"a/b": 3}),
+    ([1, 2], {"now": "a dict"}),
+])
+def test_patch_turns_old_into_new(old, new):
+    ops = diff(old, new)
+    assert apply_patch(old, ops) == new
+    assert all(op["op"] in ("add", "remove", "replace") for op in ops)
+
+
+def test_unchanged_document_has_an_empty_patch():
+    room = {"players": players("a", "b"), "version": 3}
+    assert diff(room, copy.deepcopy(room)) == []
+
+
+def test_patch_carries_only_what_changed():
+    old = {"players": players("a", "b", "c"), "room_state": "lobby"}
+    new = copy.deepcopy(old)
+    new["players"][1]["state"] = "ready"
+
+    assert diff(old, new) == [{"op": "replace", "path": "/players/1/state", "value": "ready"}]
+
+
+def test_removing_a_player_mid_list_is_one_op():
+    old = {"players": players("a", "b", "c", "d")}
+    new = {"players": players("a", "c", "d")}
+
+    assert diff(old, new) == [{"op": "remove", "path": "/players/1"}]
+
+
+def room(version, *names, room_state="lobby"):
+    return Room(
+        _id="room", code="1234", game_type="mafia", room_state=room_state, num_players=6,
+        players=[PlayerState(**player) for player in players(*names)], game_config={}, host="a",
+        can_start=False, version=version
+    )
+
+
+@pytest.fixture
+def snapshots():
+    room_snapshots.pop("1234")
+    yield
+    room_snapshots.pop("1234")
+
+
+def test_first_change_goes_out_as_a_snapshot(snapshots):
+    frame = RoomService.room_changes_frame([room(1, "a")])
+
+    assert frame.kind == ROOM_SNAPSHOT
+    message = loads(frame.message)
+    assert message["type"] == "room_update"
+    assert message["version"] == 1
+
+
+def test_contiguous_changes_go_out_as_one_patch(snapshots):
+    first = room(1, "a")
+    RoomService.room_changes_frame([first])
+
+    frame = RoomService.room_changes_frame([room(2, "a", "b"), room(3, "a", "b", "c")])
+
+    assert frame.kind == ROOM_PATCH
+    message = loads(frame.message)
+    assert (message["base_version"], message["version"]) == (1, 3)
+    patched = apply_patch(loads(RoomService.room_update_frame(first))["room"], message["ops"])
+    assert patched == loads(RoomService.room_update_frame(room(3, "a", "b", "c")))["room"]
+
+
+def test_a_version_gap_falls_back_to_a_snapshot(snapshots):
+    RoomService.room_changes_frame([room(1, "a")])
+
+    frame = RoomService.room_changes_frame([room(3, "a", "b", "c")])
+
+    assert frame.kind == ROOM_SNAPSHOT
+    assert loads(frame.message)["version"] == 3
+
+
+def test_changes_already_broadcast_are_skipped(snapshots):
+    RoomService.room_changes_frame([room(2, "a", "b")])
+
+    assert RoomService.room_changes_frame([room(1, "a"), room(2, "a", "b")]) is None
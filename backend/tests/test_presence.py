@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from services.presence_service import AWAY, GONE, ONLINE, PresenceTracker
+from services.room_service import RoomService
+from tests.conftest import FakeWebSocket, drain
+
+pytestmark = pytest.mark.anyio
+
+GRACE = 0.05
+
+
+@pytest.fixture
+async def trackers(linked_managers, monkeypatch):
+    removed = []
+
+    async def remove_player(room_id, user_id, lobby_only=False):
+        removed.append((room_id, user_id, lobby_only))
+
+    monkeypatch.setattr(RoomService, "remove_player", remove_player)
+    trackers = [PresenceTracker(GRACE, 60, worker) for worker in linked_managers]
+    for tracker in trackers:
+        await tracker.start()
+    yield trackers, removed
+    for tracker in trackers:
+        await tracker.stop()
+
+
+async def test_presence_is_shared_between_workers(linked_managers, trackers):
+    (tracker_a, tracker_b), _ = trackers
+    worker_a, _ = linked_managers
+    await worker_a.connect(FakeWebSocket("alice"), "1234")
+    await drain()
+
+    assert tracker_a.snapshot("1234") == {"alice": ONLINE}
+    assert tracker_b.snapshot("1234") == {"alice": ONLINE}
+
+
+async def test_reconnect_on_another_worker_keeps_the_player(linked_managers, trackers):
+    (tracker_a, tracker_b), removed = trackers
+    worker_a, worker_b = linked_managers
+    socket_a = FakeWebSocket("alice")
+    await worker_a.connect(socket_a, "1234")
+    await drain()
+
+    worker_a.disconnect(socket_a, "1234")
+    await drain()
+    assert tracker_a.snapshot("1234") == {"alice": AWAY}
+    await worker_b.connect(FakeWebSocket("alice"), "1234")
+    await drain()
+    await asyncio.sleep(GRACE * 2)
+
+    assert removed == []
+    assert tracker_a.snapshot("1234") == {"alice": ONLINE}
+    assert tracker_b.snapshot("1234") == {"alice": ONLINE}
+
+
+async def test_closing_one_of_two_workers_sockets_keeps_the_player_online(linked_managers, trackers):
+    (tracker_a, tracker_b), removed = trackers
+    worker_a, worker_b = linked_managers
+    socket_a = FakeWebSocket("alice")
+    await worker_a.connect(socket_a, "1234")
+    await worker_b.connect(FakeWebSocket("alice"), "1234")
+    await drain()
+
+    worker_a.disconnect(socket_a, "1234")
+    await drain()
+    await asyncio.sleep(GRACE * 2)
+
+    assert removed == []
+    assert tracker_a.snapshot("1234") == {"alice": ONLINE}
+    assert tracker_b.snapshot("1234") == {"alice": ONLINE}
+    assert tracker_b.changed["1234"] == {"alice": ONLINE}
+
+
+async def test_player_who_stays_away_is_removed_once(linked_managers, trackers):
+    (tracker_a, tracker_b), removed = trackers
+    worker_a, _ = linked_managers
+    socket_a = FakeWebSocket("alice")
+    await worker_a.connect(socket_a, "1234")
+    await drain()
+
+    worker_a.disconnect(socket_a, "1234")
+    await drain()
+    assert tracker_b.snapshot("1234") == {"alice": AWAY}
+    await asyncio.sleep(GRACE * 2)
+
+    # Only the worker that held the last socket removes the player
+    assert removed == [("1234", "alice", True)]
+    assert tracker_a.snapshot("1234") == {} and tracker_b.snapshot("1234") == {}
+    assert tracker_a.changed["1234"]["alice"] == GONE
+
+
+async def test_presence_frames_only_go_to_local_sockets(linked_managers, trackers):
+    (tracker_a, tracker_b), _ = trackers
+    worker_a, worker_b = linked_managers
+    socket_a, socket_b = FakeWebSocket("alice"), FakeWebSocket("bob")
+    await worker_a.connect(socket_a, "1234")
+    await worker_b.connect(socket_b, "1234")
+    await drain()
+
+    await tracker_a.broadcast_changes()
+    await tracker_b.broadcast_changes()
+    await drain()
+
+    for socket in (socket_a, socket_b):
+        frames = [m for m in socket.messages() if m["type"] == "presence"]
+        assert len(frames) == 1
+        assert frames[0]["players"] == {"alice": ONLINE, "bob": ONLINE}
@@ -0,0 +1,47 @@
+import pytest
+from services.room_code_allocator import MIN_CODE_LENGTH, RoomCodeAllocator, code_space_size
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rooms_are_counted_as_they_are_allocated_and_released(db):
+    allocator = RoomCodeAllocator(0.5)
+    rooms = [await allocator.insert_room({"players": []}) for _ in range(3)]
+
+    assert all(len(room["code"]) == MIN_CODE_LENGTH for room in rooms)
+    assert allocator.occupancy == {MIN_CODE_LENGTH: 3}
+    allocator.release(rooms[0]["code"])
+    assert allocator.occupancy == {MIN_CODE_LENGTH: 2}
+
+
+async def test_allocating_never_scans_the_rooms(db, monkeypatch):
+    def scan(*args, **kwargs):
+        raise AssertionError("rooms were scanned")
+
+    monkeypatch.setattr(type(db.rooms), "aggregate", scan)
+    monkeypatch.setattr(type(db.rooms), "count_documents", scan)
+    allocator = RoomCodeAllocator(0.5)
+    await allocator.insert_room({"players": []})
+    assert allocator.allocated == 1
+
+
+async def test_refresh_reconciles_rooms_counted_elsewhere(db):
+    allocator = RoomCodeAllocator(0.5)
+    await allocator.insert_room({"players": []})
+    # Created by another worker
+    await db.rooms.insert_many([{"code": f"B{i}C{i}"} for i in range(4)])
+
+    await allocator.refresh_occupancy()
+    assert allocator.occupancy == {MIN_CODE_LENGTH: 5}
+
+    await db.rooms.delete_many({"code": {"$regex": "^B"}})
+    await allocator.refresh_occupancy()
+    assert allocator.occupancy == {MIN_CODE_LENGTH: 1}
+
+
+async def test_codes_get_longer_once_the_current_length_fills_up(db):
+    allocator = RoomCodeAllocator(0.5)
+    allocator.occupancy[MIN_CODE_LENGTH] = code_space_size(MIN_CODE_LENGTH) // 2
+
+    room = await allocator.insert_room({"players": []})
+    assert len(room["code"]) == MIN_CODE_LENGTH + 1
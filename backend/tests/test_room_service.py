@@ -0,0 +1,90 @@
+import pytest
+from core.websocket import manager
+from models.room import RoomCreate
+from models.user import UserUpdate
+from services.auth_service import UserService
+from services.live_room_store import live_rooms
+from services.room_code_allocator import room_code_allocator
+from services.room_service import RoomService
+from services.spyfall_service import SpyfallService
+from tests.conftest import make_users
+from tests.test_spyfall import catalog  # noqa: F401 - fixture
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_renaming_a_user_updates_and_announces_their_rooms(rooms, db, sent):
+    host, guest = make_users(2)
+    for user in (host, guest):
+        await db.users.insert_one({
+            "_id": str(user.id), "email": user.email, "full_name": user.full_name,
+            "nickname": user.nickname, "hashed_password": "x"
+        })
+    room = await RoomService.create_room(
+        RoomCreate(game_type="mafia", num_players=6, game_config={"roles": {"mafia": 1, "civilian": 5}}), host
+    )
+    room = await RoomService.join_room(room.code, guest)
+    await manager.flush_room(room.code)
+    sent["broadcast"].clear()
+
+    await UserService.update_user(guest.id, UserUpdate(nickname="renamed"))
+    await manager.flush_room(room.code)
+
+    updated = await RoomService.get_room(room.code, enrich=False)
+    assert [p.nickname for p in updated.players] == [host.nickname, "renamed"]
+    assert updated.version == room.version + 1
+    [frame] = sent["broadcast"]
+    assert frame["version"] == updated.version
+    if live_rooms.enabled:
+        # What the next write-behind flush writes, rather than a Mongo copy it would overwrite
+        assert room.code in live_rooms.dirty
+        stored = live_rooms.rooms[room.code].to_doc()
+    else:
+        stored = await db.rooms.find_one({"code": room.code})
+    assert [p["nickname"] for p in stored["players"]] == [host.nickname, "renamed"]
+
+
+async def test_game_does_not_start_if_the_room_changed_meanwhile(rooms, catalog, sent, monkeypatch):  # noqa: F811
+    users = make_users(4)
+    room = await RoomService.create_room(
+        RoomCreate(game_type="spyfall", num_players=4, game_config={"spyCount": 1}), users[0]
+    )
+    for user in users[1:]:
+        await RoomService.join_room(room.code, user)
+    for user in users:
+        await RoomService.toggle_ready(room.code, user)
+    assign_roles = SpyfallService.assign_roles
+
+    async def assign_while_a_player_unreadies(room):
+        await RoomService.toggle_ready(room.code, users[3])
+        return await assign_roles(room)
+
+    monkeypatch.setattr(SpyfallService, "assign_roles", assign_while_a_player_unreadies)
+    with pytest.raises(ValueError, match="Room changed"):
+        await RoomService.start_game(room.code, users[0])
+
+    updated = await RoomService.get_room(room.code, enrich=False)
+    assert updated.room_state == "lobby"
+    assert updated.game_state is None
+
+
+async def test_room_joined_while_being_deleted_keeps_its_code(db, sent, monkeypatch):
+    monkeypatch.setattr(live_rooms, "enabled", False)
+    host, = make_users(1)
+    room = await RoomService.create_room(
+        RoomCreate(game_type="mafia", num_players=6, game_config={"roles": {"mafia": 1, "civilian": 5}}), host
+    )
+    occupancy = dict(room_code_allocator.occupancy)
+
+    class Joined:
+        deleted_count = 0
+
+    async def delete_one(collection, query):
+        return Joined()
+
+    monkeypatch.setattr(type(db.rooms), "delete_one", delete_one)
+    await RoomService.leave_room(room.code, host)
+
+    assert room_code_allocator.occupancy == occupancy
+    assert not any(frame["type"] == "room_deleted" for frame in sent["broadcast"])
+    assert await db.rooms.find_one({"code": room.code}) is not None
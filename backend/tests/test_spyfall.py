@@ -0,0 +1,47 @@
+import pytest
+from core.config import settings
+from models.room import PlayerState, Room
+from services.game_catalog import game_catalog
+from services.spyfall_service import SpyfallService
+
+pytestmark = pytest.mark.anyio
+
+SPYFALL = {
+    "_id": "spyfall",
+    "name": "Spyfall",
+    "description": "Find the spy",
+    "category": "party",
+    "min_players": 3,
+    "max_players": 8,
+    "duration_minutes": 8,
+    "settings": {},
+    "thumbnail_url": "/static/images/games/spyfall.webp",
+    "image_url": "/static/images/games/spyfall.webp",
+    "slug": "spyfall",
+    "locations": {"Bank": "/static/images/spyfall/bank.webp"}
+}
+
+
+@pytest.fixture
+async def catalog(db):
+    await db.games.insert_one(SPYFALL)
+    await game_catalog.reload()
+    yield game_catalog.snapshot
+    game_catalog.snapshot = None
+
+
+async def test_location_image_comes_from_the_catalog_urls(catalog):
+    players = [PlayerState(user_id=str(i), nickname=f"player{i}") for i in range(4)]
+    room = Room(
+        _id="room", code="1234", game_type="spyfall", room_state="lobby", num_players=4,
+        players=players, game_config={"spyCount": 1}, host="0", can_start=True
+    )
+
+    assigned, location = await SpyfallService.assign_roles(room)
+
+    assert location == "Bank"
+    regulars = [p.role_info for p in assigned if p.role_info.role == "regular"]
+    assert len(regulars) == 3
+    expected = catalog.location_urls["spyfall"]["Bank"]
+    assert expected.startswith(settings.API_URL)
+    assert all(info.location_image == expected for info in regulars)
@@ -0,0 +1,187 @@
+import asyncio
+import pytest
+from core.serialization import encode_frame
+from core.websocket import (
+    ConnectionManager, OutboundFrame, CRITICAL, DROPPABLE, ROOM_PATCH, ROOM_SNAPSHOT, WS_CLOSE_SLOW_CONSUMER
+)
+from tests.conftest import FakeWebSocket, drain
+
+pytestmark = pytest.mark.anyio
+
+STALLED = 60  # seconds a stalled socket takes over a send, far longer than any test
+
+
+def make_manager(policy: str = "drop", queue_size: int = 3) -> ConnectionManager:
+    return ConnectionManager(ping_interval=0, coalesce_window=0, queue_size=queue_size, overflow_policy=policy)
+
+
+def frame(n: int, kind: str = CRITICAL) -> OutboundFrame:
+    return OutboundFrame(encode_frame({"type": kind, "n": n}), kind)
+
+
+async def test_broadcast_reaches_every_socket_in_order():
+    manager = make_manager()
+    sockets = [FakeWebSocket(f"user{i}") for i in range(3)]
+    for socket in sockets:
+        await manager.connect(socket, "1234")
+
+    for n in range(3):
+        stats = await manager.broadcast("1234", frame(n))
+        assert (stats.sent, stats.failed) == (3, 0)
+    await drain()
+
+    for socket in sockets:
+        assert [m["n"] for m in socket.messages()] == [0, 1, 2]
+    await manager.stop()
+
+
+async def test_slow_sends_are_reported():
+    manager = make_manager()
+    await manager.connect(FakeWebSocket("alice", delay=0.02), "1234")
+
+    await manager.broadcast("1234", frame(0))
+    await asyncio.sleep(0.05)
+    stats = await manager.broadcast("1234", frame(1))
+
+    assert stats.slowest >= 0.02
+    assert manager.stats()["send_queues"]["slowest_send_seconds"] >= 0.02
+    await manager.stop()
+
+
+async def test_a_stalled_socket_does_not_hold_up_the_others():
+    manager = make_manager()
+    stalled, healthy = FakeWebSocket("alice", delay=STALLED), FakeWebSocket("bob")
+    await manager.connect(stalled, "1234")
+    await manager.connect(healthy, "1234")
+
+    for n in range(3):
+        await manager.broadcast("1234", frame(n))
+    await drain()
+
+    assert [m["n"] for m in healthy.messages()] == [0, 1, 2]
+    assert stalled.sent == []
+    await manager.stop()
+
+
+async def test_full_queue_sheds_patches_superseded_by_a_snapshot():
+    manager = make_manager()
+    socket = FakeWebSocket("alice", delay=STALLED)
+    await manager.connect(socket, "1234")
+    await manager.broadcast("1234", frame(0))
+    await drain()  # the writer is now stuck sending frame 0
+
+    for n, kind in enumerate([ROOM_PATCH, ROOM_PATCH, ROOM_SNAPSHOT, CRITICAL], start=1):
+        await manager.broadcast("1234", frame(n, kind))
+
+    connection = manager.connections[socket]
+    assert [kind for _, kind in connection.queue] == [ROOM_SNAPSHOT, CRITICAL]
+    assert manager.queue_stats.dropped == 2 and socket.closed_with is None
+    await manager.stop()
+
+
+async def test_full_queue_drops_the_oldest_droppable_frame():
+    manager = make_manager()
+    socket = FakeWebSocket("alice", delay=STALLED)
+    await manager.connect(socket, "1234")
+    await manager.broadcast("1234", frame(0))
+    await drain()
+
+    for n, kind in enumerate([DROPPABLE, CRITICAL, CRITICAL, CRITICAL], start=1):
+        await manager.broadcast("1234", frame(n, kind))
+
+    assert [item.text for item, _ in manager.connections[socket].queue] == [frame(n).message for n in (2, 3, 4)]
+    await manager.stop()
+
+
+async def test_socket_is_closed_when_only_critical_frames_are_queued():
+    manager = make_manager()
+    socket = FakeWebSocket("alice", delay=STALLED)
+    await manager.connect(socket, "1234")
+    await manager.broadcast("1234", frame(0))
+    await drain()
+
+    for n in range(1, 5):
+        await manager.broadcast("1234", frame(n))
+    await drain()
+
+    assert socket.closed_with == WS_CLOSE_SLOW_CONSUMER
+    assert socket not in manager.connections
+    assert manager.queue_stats.overflows == 1
+    await manager.stop()
+
+
+async def test_disconnect_policy_closes_on_the_first_overflow():
+    manager = make_manager("disconnect")
+    socket = FakeWebSocket("alice", delay=STALLED)
+    await manager.connect(socket, "1234")
+    await manager.broadcast("1234", frame(0))
+    await drain()
+
+    for n in range(1, 4):
+        await manager.broadcast("1234", frame(n, ROOM_PATCH))
+    assert socket.closed_with is None
+    await manager.broadcast("1234", frame(4, ROOM_PATCH))
+    await drain()
+
+    assert socket.closed_with == WS_CLOSE_SLOW_CONSUMER
+    await manager.stop()
+
+
+async def test_failed_send_evicts_the_socket():
+    class BrokenWebSocket(FakeWebSocket):
+        async def send_text(self, text: str):
+            raise ConnectionResetError("gone")
+
+    manager = make_manager()
+    socket = BrokenWebSocket("alice")
+    await manager.connect(socket, "1234")
+    await manager.broadcast("1234", frame(0))
+    await drain()
+
+    assert socket not in manager.connections and not manager.registry.has_room("1234")
+    assert manager.queue_stats.failed == 1
+    await manager.stop()
+
+
+async def test_dropping_a_room_delivers_queued_frames_and_forgets_its_sockets():
+    manager = make_manager()
+    sockets = [FakeWebSocket("alice"), FakeWebSocket("bob")]
+    for socket in sockets:
+        await manager.connect(socket, "1234")
+    await manager.broadcast("1234", encode_frame({"type": "room_deleted"}))
+    writers = [manager.connections[socket]._writer for socket in sockets]
+
+    manager.drop_room("1234")
+    await drain()
+
+    assert manager.connections == {} and manager.last_seen == {}
+    assert all(writer.done() for writer in writers)
+    for socket in sockets:
+        assert [m["type"] for m in socket.messages()] == ["room_deleted"]
+    assert not manager.send(sockets[0], {"type": "late"})
+    await manager.stop()
+
+
+async def test_coalesced_changes_go_out_once_per_window():
+    manager = make_manager()
+    socket = FakeWebSocket("alice")
+    await manager.connect(socket, "1234")
+    sent_versions = set()
+
+    def build(versions):
+        # Like RoomService.room_changes_frame: nothing to send for versions already sent
+        new = [v for v in versions if v not in sent_versions]
+        sent_versions.update(new)
+        return {"type": "room", "versions": new} if new else None
+
+    for version in (1, 2):
+        manager.broadcast_coalesced("1234", "room", version, build)
+    await manager.flush_room("1234")
+    manager.broadcast_coalesced("1234", "room", 2, build)
+    await manager.flush_room("1234")
+    await drain()
+
+    assert [m["versions"] for m in socket.messages()] == [[1, 2]]
+    stats = manager.coalesce_stats
+    assert (stats.submitted, stats.sent, stats.duplicates) == (3, 1, 1)
+    await manager.stop()
@@ -0,0 +1,177 @@
+import pytest
+from api import ws_commands
+from api.ws_commands import PROTOCOL_VERSION, RoomSession, handle_message, hello_frame
+from core.serialization import dumps, loads
+from core.websocket import ConnectionManager, manager
+from models.room import RoomCreate
+from services.chat_service import chat_rate_limiter, chat_writer
+from services.room_service import RoomService
+from tests.conftest import FakeWebSocket, drain, make_users
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def socket_manager(monkeypatch):
+    """The manager command replies go through; room broadcasts still use the global one"""
+    worker = ConnectionManager(ping_interval=0, coalesce_window=0)
+    monkeypatch.setattr(ws_commands, "manager", worker)
+    yield worker
+    await worker.stop()
+
+
+@pytest.fixture
+async def room(rooms):
+    host, guest = make_users(2)
+    room = await RoomService.create_room(
+        RoomCreate(game_type="mafia", num_players=6, game_config={"roles": {"mafia": 1, "civilian": 5}}), host
+    )
+    return room, host, guest
+
+
+async def open_session(socket_manager, room_code, user, is_member=True, binary=False) -> RoomSession:
+    websocket = FakeWebSocket(str(user.id))
+    await socket_manager.connect(websocket, room_code, binary=binary)
+    return RoomSession(websocket, room_code, user, is_member)
+
+
+async def command(session: RoomSession, **message) -> dict:
+    """Send one JSON command and return the single reply it got"""
+    before = len(session.websocket.sent)
+    await handle_message(session, dumps(message))
+    await drain()
+    replies = session.websocket.messages()[before:]
+    assert len(replies) == 1, replies
+    return replies[0]
+
+
+def test_hello_announces_the_protocol():
+    hello = loads(hello_frame())
+    assert hello["type"] == "hello"
+    assert hello["protocol"] == PROTOCOL_VERSION
+    assert set(hello["commands"]) == set(ws_commands.COMMANDS)
+
+
+async def test_command_is_acked_with_its_id(room, socket_manager):
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    reply = await command(session, type="ready", id="7", v=PROTOCOL_VERSION)
+
+    assert reply == {"type": "ack", "id": "7", "command": "ready", "version": room.version + 1}
+
+
+@pytest.mark.parametrize("message, code", [
+    ({"type": "ready", "id": "1", "v": PROTOCOL_VERSION + 1}, "unsupported_version"),
+    ({"type": "dance", "id": "1"}, "unknown_command"),
+    ({"type": "start", "id": "1"}, "invalid"),
+    ({"type": "chat", "id": "1", "text": "   "}, "invalid"),
+])
+async def test_failed_commands_get_an_error_code(room, socket_manager, message, code):
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    reply = await command(session, **message)
+
+    assert reply["type"] == "error"
+    assert (reply["id"], reply["command"], reply["code"]) == ("1", message["type"], code)
+    assert reply["detail"]
+
+
+@pytest.mark.parametrize("data", ["{not json", "[1, 2]", b"\xc1"])
+async def test_malformed_messages_are_bad_requests(room, socket_manager, data):
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    await handle_message(session, data)
+    await drain()
+
+    reply, = session.websocket.messages()
+    assert (reply["type"], reply["id"], reply["code"]) == ("error", None, "bad_request")
+
+
+async def test_pong_gets_no_reply(room, socket_manager):
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    await handle_message(session, dumps({"type": "pong"}))
+    await drain()
+
+    assert session.websocket.sent == []
+
+
+async def test_only_members_may_chat(room, socket_manager):
+    room, _, guest = room
+    session = await open_session(socket_manager, room.code, guest, is_member=False)
+
+    reply = await command(session, type="chat", id="1", text="hello")
+    assert reply["code"] == "not_member"
+
+    await RoomService.join_room(room.code, guest)
+    reply = await command(session, type="chat", id="2", text="hello")
+    assert reply["type"] == "ack"
+    chat_writer.pending.clear()
+
+
+async def test_chat_flood_is_rate_limited(room, socket_manager, monkeypatch):
+    monkeypatch.setattr(chat_rate_limiter, "allow", lambda room_code, user_id: False)
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    reply = await command(session, type="chat", id="1", text="hello")
+
+    assert reply["code"] == "rate_limited"
+
+
+async def test_sync_sends_the_snapshot_before_the_ack(room, socket_manager):
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    await handle_message(session, dumps({"type": "sync", "id": "1"}))
+    await drain()
+
+    snapshot, ack = session.websocket.messages()
+    assert (snapshot["type"], snapshot["version"]) == ("room_update", room.version)
+    assert snapshot["room"]["code"] == room.code
+    assert ack == {"type": "ack", "id": "1", "command": "sync", "version": room.version}
+
+
+async def test_unexpected_failures_are_internal_errors(room, socket_manager, monkeypatch):
+    async def broken(room_code, user):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(RoomService, "toggle_ready", broken)
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host)
+
+    reply = await command(session, type="ready", id="1")
+
+    assert (reply["code"], reply["detail"]) == ("internal", "Internal server error")
+
+
+async def test_msgpack_commands_get_msgpack_replies(room, socket_manager):
+    msgpack = pytest.importorskip("msgpack")
+    room, host, _ = room
+    session = await open_session(socket_manager, room.code, host, binary=True)
+
+    await handle_message(session, msgpack.packb({"type": "ready", "id": "1", "v": PROTOCOL_VERSION}))
+    await drain()
+
+    reply, = session.websocket.sent
+    assert isinstance(reply, bytes)
+    assert msgpack.unpackb(reply) == {"type": "ack", "id": "1", "command": "ready", "version": room.version + 1}
+
+
+async def test_last_member_leaving_gets_room_deleted(room, monkeypatch):
+    # The room deletion drops sockets from the global manager, so the session must live there
+    monkeypatch.setattr(ws_commands, "manager", manager)
+    room, host, _ = room
+    session = await open_session(manager, room.code, host)
+
+    await handle_message(session, dumps({"type": "leave", "id": "1"}))
+    await drain()
+
+    deleted, = session.websocket.messages()
+    assert (deleted["type"], deleted["room_code"]) == ("room_deleted", room.code)
+    assert session.websocket not in manager.connections
+    assert await RoomService.get_room(room.code) is None
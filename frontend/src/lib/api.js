@@ -118,6 +118,12 @@ export const api = {
     return response;
   },
 
+  // One page of chat, oldest message first; pass the returned next_cursor as `before` for older ones
+  getChatHistory: async (code, before = null) => {
+    const response = await fetchApi(`/rooms/${code}/chat${before ? `?before=${before}` : ''}`);
+    return response;
+  },
+
   joinRoom: async (code) => {
     const response = await fetchApi(`/rooms/${code}/join`, {
       method: 'POST',
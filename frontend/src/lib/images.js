@@ -0,0 +1,18 @@
+// Helpers for the srcset-ready image variant lists ({ url, width, type }) returned by the API
+
+// One <source> per format, best compression first, each with a width-descriptor srcset
+export function pictureSources(variants) {
+    if (!variants?.length) return [];
+    const byType = new Map();
+    for (const variant of variants) {
+        if (!byType.has(variant.type)) byType.set(variant.type, []);
+        byType.get(variant.type).push(`${variant.url} ${variant.width}w`);
+    }
+    const rank = (type) => {
+        const index = ['image/avif', 'image/webp'].indexOf(type);
+        return index === -1 ? Infinity : index;
+    };
+    return [...byType.entries()]
+        .sort(([a], [b]) => rank(a) - rank(b))
+        .map(([type, candidates]) => ({ type, srcset: candidates.join(', ') }));
+}
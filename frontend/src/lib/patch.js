@@ -0,0 +1,34 @@
+// Applies JSON Patch (RFC 6902) add/remove/replace operations, as sent in room_patch messages
+
+function parsePointer(path) {
+    return path.split('/').slice(1).map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+}
+
+export function applyPatch(document, ops) {
+    let result = structuredClone(document);
+    for (const { op, path, value } of ops) {
+        const keys = parsePointer(path);
+        if (keys.length === 0) {
+            result = structuredClone(value);
+            continue;
+        }
+        const last = keys.pop();
+        const parent = keys.reduce((node, key) => node[key], result);
+
+        if (Array.isArray(parent)) {
+            const index = last === '-' ? parent.length : Number(last);
+            if (op === 'add') {
+                parent.splice(index, 0, value);
+            } else if (op === 'remove') {
+                parent.splice(index, 1);
+            } else {
+                parent[index] = value;
+            }
+        } else if (op === 'remove') {
+            delete parent[last];
+        } else {
+            parent[last] = value;
+        }
+    }
+    return result;
+}
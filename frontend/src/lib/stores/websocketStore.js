@@ -1,6 +1,10 @@
 import { writable } from 'svelte/store';
 import { browser } from '$app/environment';
 import { api } from '$lib/api';
+import { applyPatch } from '$lib/patch';
+
+// Server close codes for sockets reaped as idle (4008) or closed as slow consumers (4009)
+const RECONNECT_CLOSE_CODES = [4008, 4009];
 
 function createWebsocketStore() {
     const { subscribe, set, update } = writable({
@@ -8,13 +12,65 @@ function createWebsocketStore() {
         error: null,
         lastUpdate: null,
         roomData: null,
-        gameState: null
+        roomVersion: null,
+        gameState: null,
+        presence: {}  // user id -> 'online' | 'away' | 'gone'
     });
 
     let ws = null;
     let reconnectTimer = null;
     let currentRoomId = null;
     let messageHandler = null;
+    // Latest room state and version, kept outside the store so patches apply synchronously
+    let roomData = null;
+    let roomVersion = null;
+    // The sync requested after a version gap, while it is waiting for its snapshot
+    let syncing = null;
+    // Commands sent over the socket and waiting for their ack/error, by request id
+    const PROTOCOL_VERSION = 1;
+    const COMMAND_TIMEOUT_MS = 10000;
+    const pending = new Map();
+    let nextRequestId = 1;
+
+    function commandError(code, detail) {
+        const err = new Error(detail);
+        err.code = code;
+        return err;
+    }
+
+    function rejectPending(code, detail) {
+        for (const { reject, timer } of pending.values()) {
+            clearTimeout(timer);
+            reject(commandError(code, detail));
+        }
+        pending.clear();
+    }
+
+    // The server deletes a room when its last player leaves and closes its sockets with it,
+    // so that player's leave is answered by room_deleted rather than an ack
+    function settleLeave(data) {
+        for (const [id, request] of pending) {
+            if (request.command === 'leave') {
+                pending.delete(id);
+                clearTimeout(request.timer);
+                request.resolve({ type: 'ack', id, command: 'leave', room_deleted: true, room_code: data.room_code });
+            }
+        }
+    }
+
+    // Resolve or reject the command a server ack/error answers; true if it was one of ours
+    function settle(data) {
+        const request = pending.get(data.id);
+        if (!request) return false;
+        pending.delete(data.id);
+        clearTimeout(request.timer);
+        if (data.type === 'ack') {
+            request.resolve(data);
+        } else {
+            request.reject(commandError(data.code, data.detail));
+        }
+        return true;
+    }
 
     const store = {
         subscribe,
@@ -77,9 +133,11 @@ function createWebsocketStore() {
                         });
                         
                         update(store => ({ ...store, connected: false }));
+                        rejectPending('disconnected', 'Connection lost');
                         
-                        // Only attempt reconnection if we have a room ID and it wasn't a clean close
-                        if (currentRoomId && !event.wasClean) {
+                        // Only attempt reconnection if we have a room ID and it wasn't a clean close,
+                        // or the server closed us for going idle or falling behind on messages
+                        if (currentRoomId && (!event.wasClean || RECONNECT_CLOSE_CODES.includes(event.code))) {
                             console.log('🔄 Scheduling reconnection attempt...');
                             if (reconnectTimer) {
                                 clearTimeout(reconnectTimer);
@@ -111,19 +169,88 @@ function createWebsocketStore() {
                 ws.close();
                 ws = null;
             }
+            rejectPending('disconnected', 'Connection closed');
+            roomData = null;
+            roomVersion = null;
             update(store => ({ 
                 ...store, 
                 roomData: null,
+                roomVersion: null,
                 gameState: null,
+                presence: {},
                 connected: false 
             }));
         },
         
+        // Send a command ('ready', 'leave', 'start', 'restart', 'chat', 'vote', 'night_action', 'sync') over the socket.
+        // Resolves with the ack, rejects with an Error carrying the server's error code.
+        send: (type, payload = {}) => {
+            if (!ws || ws.readyState !== WebSocket.OPEN) {
+                return Promise.reject(commandError('not_connected', 'Not connected'));
+            }
+            const id = String(nextRequestId++);
+            return new Promise((resolve, reject) => {
+                const timer = setTimeout(() => {
+                    pending.delete(id);
+                    reject(commandError('timeout', 'The server did not answer in time'));
+                }, COMMAND_TIMEOUT_MS);
+                pending.set(id, { command: type, resolve, reject, timer });
+                ws.send(JSON.stringify({ ...payload, type, id, v: PROTOCOL_VERSION }));
+            });
+        },
+
+        // Like send(), but falls back to the HTTP request when there is no open socket
+        request: async (type, payload = {}, fallback = null) => {
+            try {
+                return await store.send(type, payload);
+            } catch (err) {
+                if (err.code === 'not_connected' && fallback) {
+                    return fallback();
+                }
+                throw err;
+            }
+        },
+        
         setMessageHandler: (handler) => {
             messageHandler = (event) => {
                 try {
-                    const data = JSON.parse(event.data);
+                    let data = JSON.parse(event.data);
                     console.log('📨 WebSocket message received:', data);
+
+                    if ((data.type === 'ack' || data.type === 'error') && settle(data)) {
+                        return;
+                    }
+                    if (data.type === 'room_deleted') {
+                        settleLeave(data);
+                    }
+                    if (data.type === 'ping') {
+                        // Heartbeat: the server closes sockets that stop answering
+                        ws?.send(JSON.stringify({ type: 'pong' }));
+                        return;
+                    }
+
+                    if (data.type === 'room_patch') {
+                        if (roomData && data.version <= roomVersion) {
+                            // Queued before the snapshot we already hold
+                            return;
+                        }
+                        if (!roomData || roomVersion !== data.base_version) {
+                            // Missed a version: ask for a full snapshot instead, once
+                            if (!syncing) {
+                                console.log('🔄 Room version gap, requesting sync');
+                                syncing = store.send('sync')
+                                    .catch(err => console.error('Sync failed:', err))
+                                    .finally(() => { syncing = null; });
+                            }
+                            return;
+                        }
+                        // Hand the patched room to pages as a regular room_update
+                        data = {
+                            type: 'room_update',
+                            room: applyPatch(roomData, data.ops),
+                            version: data.version
+                        };
+                    }
                     
                     switch (data.type) {
                         case 'game_started':
@@ -135,16 +262,36 @@ function createWebsocketStore() {
                             window.location.href = `/games/${data.game_type}/${data.room_code}`;
                             break;
                             
+                        case 'presence':
+                            // Only changed players are listed; the first frame after connecting has everyone
+                            update(store => ({
+                                ...store,
+                                presence: { ...store.presence, ...data.players }
+                            }));
+                            break;
+
                         case 'room_update':
                             console.log('📦 Room update received:', data.room);
+                            roomData = data.room;
+                            roomVersion = data.version;
                             update(store => ({
                                 ...store,
                                 lastUpdate: Date.now(),
-                                roomData: data.room
+                                roomData: data.room,
+                                roomVersion: data.version
                             }));
                             break;
                             
                         case 'game_update':
+                            if (data.event === 'role_assigned') {
+                                // Private to this user; kept so the game page can show it right after navigating
+                                sessionStorage.setItem('roleInfo', JSON.stringify(data.role_info));
+                                break;
+                            }
+                            if (!data.game_state) {
+                                // Mafia phase outcomes and investigation results; the page shows them
+                                break;
+                            }
                             update(store => ({
                                 ...store,
                                 gameState: {
@@ -158,6 +305,7 @@ function createWebsocketStore() {
                             console.log('🔚 Game ended:', data);
                             // Clear game state
                             sessionStorage.removeItem('gameState');
+                            sessionStorage.removeItem('roleInfo');
                             update(store => ({
                                 ...store,
                                 gameState: null